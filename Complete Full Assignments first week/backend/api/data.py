@@ -8,6 +8,8 @@ from backend.middleware.auth_middleware import get_current_user
 from backend.models.user import User
 from backend.schemas.auth import APIResponse
 from backend.services.data_service import DataService
+from backend.services.market_data import MarketDataService
+from backend.services.market_data_warmer import market_data_warmer
 import json
 
 router = APIRouter(prefix="/data", tags=["Data Management"])
@@ -166,3 +168,22 @@ async def validate_data(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error validating data: {str(e)}"
         )
+
+
+@router.get("/market-data/stats", response_model=APIResponse)
+async def market_data_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Request coalescing, cache and warmer counters for market data fetches
+    """
+    return APIResponse(
+        status="success",
+        message="Market data stats retrieved",
+        data={
+            "coalescing": MarketDataService.coalescing_stats(),
+            "cache": MarketDataService.cache_stats(),
+            "warmer": market_data_warmer.last_run,
+            "warmer_local": market_data_warmer.last_local_run
+        }
+    )
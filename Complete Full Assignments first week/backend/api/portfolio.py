@@ -2,15 +2,25 @@
 Portfolio API endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from backend.config import settings
 from backend.database.connection import get_db
 from backend.middleware.auth_middleware import get_current_user
 from backend.models.user import User
 from backend.schemas.auth import APIResponse
+from backend.schemas.portfolio import BatchOptimizeRequest
 from backend.services.portfolio_service import PortfolioService
-from typing import List
+from backend.services.portfolio_optimizer import solve_spec
+from backend.services.monte_carlo_engine import default_workers
+from backend.services.async_market_data import async_market_data
+from typing import List, Optional
 import pandas as pd
+import asyncio
 import io
+import itertools
+import json
+import time
 
 router = APIRouter(prefix="/portfolio", tags=["Portfolio Management"])
 
@@ -21,10 +31,17 @@ portfolio_service = PortfolioService()
 async def optimize_portfolio(
     tickers: List[str],
     period: str = "1y",
+    objective: str = "max_sharpe",
+    solver: str = "qp",
+    cov_method: str = "sample",
     current_user: User = Depends(get_current_user)
 ):
     """
     Optimize portfolio allocation using Modern Portfolio Theory
+
+    objective: max_sharpe or min_variance; solver: qp (projected gradient)
+    or slsqp; cov_method: sample, ledoit_wolf, constant_correlation or ewma.
+    The response reports solver iterations and time.
     """
     try:
         if len(tickers) < 2:
@@ -33,7 +50,10 @@ async def optimize_portfolio(
                 detail="Need at least 2 tickers for optimization"
             )
         
-        result = portfolio_service.optimize_portfolio(tickers, period)
+        result = await async_market_data.run_blocking(
+            portfolio_service.optimize_portfolio, tickers, period,
+            objective=objective, solver=solver, cov_method=cov_method
+        )
         
         return APIResponse(
             status="success",
@@ -41,6 +61,13 @@ async def optimize_portfolio(
             data=result
         )
     
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -48,18 +75,117 @@ async def optimize_portfolio(
         )
 
 
+@router.post("/optimize/batch")
+async def batch_optimize(
+    request: BatchOptimizeRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Optimize many portfolios over one shared universe.
+    Statistics are estimated once for the union of all specs' tickers, the
+    solves run on the process pool, and each result is streamed back as one
+    NDJSON line as soon as it completes, followed by a summary line.
+    Only a small window of specs is queued at a time, so a large batch
+    neither buffers every spec's covariance in the pool's queue nor holds
+    the pool against Monte Carlo requests. Specs still queued are
+    cancelled when the client disconnects.
+    """
+    if len(request.specs) > settings.BATCH_OPTIMIZE_MAX_SPECS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_OPTIMIZE_MAX_SPECS} specs per batch"
+        )
+    
+    started = time.perf_counter()
+    try:
+        universe, problems = await async_market_data.run_blocking(
+            portfolio_service.batch_problems,
+            [spec.model_dump() for spec in request.specs],
+            request.period, request.cov_method, request.risk_free_rate
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error preparing batch optimization: {str(e)}"
+        )
+    
+    async def solve(problem, pending):
+        try:
+            return await pending
+        except Exception as e:
+            return {"id": problem["spec_id"], "status": "error", "detail": str(e)}
+    
+    use_pool = default_workers() > 1 and len(problems) > 1
+    window = settings.BATCH_OPTIMIZE_MAX_IN_FLIGHT or 2 * default_workers()
+    
+    def submit(problem):
+        if use_pool:
+            return asyncio.wrap_future(portfolio_service.submit_problem(problem))
+        return async_market_data.run_blocking(solve_spec, **problem)
+    
+    async def results():
+        queued = iter(problems)
+        in_flight = set()
+        errors = 0
+        try:
+            while True:
+                for problem in itertools.islice(queued, window - len(in_flight)):
+                    in_flight.add(asyncio.ensure_future(solve(problem, submit(problem))))
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    errors += result["status"] != "success"
+                    yield json.dumps(result) + "\n"
+        finally:
+            # Client gone (or generator closed): drop what has not started yet
+            for task in in_flight:
+                task.cancel()
+        
+        yield json.dumps({
+            "status": "done",
+            "count": len(problems),
+            "errors": errors,
+            "universe": universe,
+            "cov_method": request.cov_method,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.post("/efficient-frontier", response_model=APIResponse)
 async def get_efficient_frontier(
     tickers: List[str],
     period: str = "1y",
     num_portfolios: int = 100,
+    max_points: Optional[int] = None,
+    output: str = "records",
+    seed: Optional[int] = None,
+    mode: str = "random",
+    cov_method: str = "sample",
     current_user: User = Depends(get_current_user)
 ):
     """
     Generate efficient frontier for portfolio visualization
+
+    mode=random: up to FRONTIER_MAX_PORTFOLIOS random portfolios, and
+    max_points downsamples the returned cloud. mode=exact: num_portfolios
+    evenly spaced points on the true frontier, with weights.
+    output=arrays returns parallel lists.
     """
     try:
-        result = portfolio_service.efficient_frontier(tickers, period, num_portfolios)
+        result = await async_market_data.run_blocking(
+            portfolio_service.efficient_frontier, tickers, period, num_portfolios,
+            max_points=max_points, output=output, seed=seed, mode=mode,
+            cov_method=cov_method
+        )
         
         return APIResponse(
             status="success",
@@ -67,6 +193,11 @@ async def get_efficient_frontier(
             data=result
         )
     
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -79,6 +210,7 @@ async def calculate_performance(
     tickers: List[str],
     weights: List[float],
     period: str = "1y",
+    cov_method: str = "sample",
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -97,7 +229,9 @@ async def calculate_performance(
                 detail="Weights must sum to 1.0"
             )
         
-        metrics = portfolio_service.portfolio_metrics(tickers, weights, period)
+        metrics = await async_market_data.run_blocking(
+            portfolio_service.portfolio_metrics, tickers, weights, period, cov_method
+        )
         
         return APIResponse(
             status="success",
@@ -105,6 +239,13 @@ async def calculate_performance(
             data={"metrics": metrics, "tickers": tickers, "weights": weights}
         )
     
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -134,7 +275,7 @@ async def analyze_portfolio(
                 detail="Uploaded CSV is empty"
             )
         
-        result = portfolio_service.analyze_portfolio_csv(df)
+        result = await async_market_data.run_blocking(portfolio_service.analyze_portfolio_csv, df)
         
         return APIResponse(
             status="success",
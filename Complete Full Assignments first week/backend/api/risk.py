@@ -1,15 +1,25 @@
 """
 Risk Management API endpoints
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from backend.database.connection import get_db
 from backend.middleware.auth_middleware import get_current_user
 from backend.models.user import User
+from backend.models.portfolio import Portfolio
+from backend.models.risk_report import RiskReport
 from backend.schemas.auth import APIResponse
+from backend.schemas.risk import StressTestRequest
+from backend.config import settings
 from backend.services.var_calculator import VaRCalculator
+from backend.services.monte_carlo_engine import SAMPLING_METHODS
+from backend.services.var_backtest import VaRBacktester
+from backend.services.stress_testing import stress_tester
+from backend.services.volatility_models import MODELS as VOLATILITY_MODELS
 from backend.services.data_service import DataService
-from typing import List
+from backend.services.async_market_data import async_market_data
+from typing import List, Optional
 import pandas as pd
 
 router = APIRouter(prefix="/risk", tags=["Risk Management"])
@@ -45,7 +55,9 @@ async def calculate_var(
         else:
             returns = df[returns_column].dropna()
         
-        var_results = var_calculator.calculate_all_methods(returns, confidence_level, portfolio_value)
+        var_results = await async_market_data.run_blocking(
+            var_calculator.calculate_all_methods, returns, confidence_level, portfolio_value
+        )
         
         # Add expected shortfall
         es = var_calculator.expected_shortfall(returns, confidence_level)
@@ -72,10 +84,10 @@ async def calculate_var(
 async def dual_stock_var(
     ticker1: str,
     ticker2: str,
-    weight1: float,
-    weight2: float,
-    confidence_level: float = 0.95,
-    portfolio_value: float = 100000,
+    weight1: float = Query(..., ge=0, le=1),
+    weight2: float = Query(..., ge=0, le=1),
+    confidence_level: float = Query(0.95, gt=0, lt=1),
+    portfolio_value: float = Query(100000, gt=0),
     period: str = "1y",
     current_user: User = Depends(get_current_user)
 ):
@@ -89,7 +101,8 @@ async def dual_stock_var(
                 detail="Weights must sum to 1.0"
             )
         
-        result = var_calculator.dual_stock_var(
+        result = await async_market_data.run_blocking(
+            var_calculator.dual_stock_var,
             ticker1, ticker2, [weight1, weight2],
             confidence_level, period, portfolio_value
         )
@@ -100,6 +113,13 @@ async def dual_stock_var(
             data=result
         )
     
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -107,17 +127,330 @@ async def dual_stock_var(
         )
 
 
+@router.post("/rolling-var", response_model=APIResponse)
+async def rolling_var(
+    file: UploadFile = File(...),
+    returns_column: str = "returns",
+    window: int = 250,
+    confidence_level: float = 0.95,
+    portfolio_value: float = 100000,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Rolling historical VaR/ES series over a sliding window
+    """
+    try:
+        content = await file.read()
+        df = data_service.load_csv(content)
+        
+        if returns_column not in df.columns:
+            if 'Close' in df.columns:
+                returns = df['Close'].pct_change().dropna()
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Column '{returns_column}' not found"
+                )
+        else:
+            returns = df[returns_column].dropna()
+        
+        if len(returns) < window:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Need at least {window} returns for a {window}-observation window"
+            )
+        
+        series = await async_market_data.run_blocking(
+            var_calculator.rolling_var, returns, window, confidence_level
+        )
+        
+        return APIResponse(
+            status="success",
+            message="Rolling VaR calculated",
+            data={
+                "window": window,
+                "confidence_level": confidence_level,
+                "portfolio_value": portfolio_value,
+                "index": [str(i) for i in series.index],
+                "var_pct": (series["var"] * 100).tolist(),
+                "var_dollar": (series["var"] * portfolio_value).tolist(),
+                "es_pct": (series["expected_shortfall"] * 100).tolist(),
+                "es_dollar": (series["expected_shortfall"] * portfolio_value).tolist()
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error calculating rolling VaR: {str(e)}"
+        )
+
+
+@router.post("/attribution", response_model=APIResponse)
+async def var_attribution(
+    tickers: List[str] = Query(...),
+    weights: List[float] = Query(...),
+    confidence_level: float = 0.95,
+    portfolio_value: float = 100000,
+    period: str = "1y",
+    methods: List[str] = Query(default=None),
+    cov_method: str = "sample",
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Marginal, component and incremental VaR for every holding
+    """
+    try:
+        if len(tickers) != len(weights):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Number of tickers must match number of weights"
+            )
+        
+        result = await async_market_data.run_blocking(
+            var_calculator.var_attribution,
+            tickers, weights, confidence_level, period, portfolio_value, methods,
+            cov_method=cov_method
+        )
+        
+        return APIResponse(
+            status="success",
+            message="VaR attribution calculated",
+            data=result
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error calculating VaR attribution: {str(e)}"
+        )
+
+
+@router.get("/scenarios", response_model=APIResponse)
+async def list_stress_scenarios(current_user: User = Depends(get_current_user)):
+    """
+    Stress scenario library
+    """
+    return APIResponse(
+        status="success",
+        message="Stress scenarios retrieved",
+        data={"scenarios": stress_tester.list_scenarios()}
+    )
+
+
+@router.post("/stress-test", response_model=APIResponse)
+async def stress_test(
+    request: StressTestRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Revalue portfolios under stress scenarios.
+    Uses the given portfolios, or all of the user's saved portfolios.
+    """
+    try:
+        if request.portfolios:
+            portfolios = {
+                p.name: {ticker.upper(): weight * p.value for ticker, weight in p.holdings.items()}
+                for p in request.portfolios
+            }
+        else:
+            portfolios = await async_market_data.run_blocking(
+                stress_tester.portfolios_from_db, db, current_user.id
+            )
+        if not portfolios:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No portfolios to stress test"
+            )
+        
+        custom = {name: s.model_dump(exclude_none=True) for name, s in request.custom_scenarios.items()}
+        result = await async_market_data.run_blocking(
+            stress_tester.run, portfolios, request.scenarios, custom
+        )
+        pnl, pnl_pct = result["pnl"], result["pnl_pct"]
+        
+        return APIResponse(
+            status="success",
+            message=f"Stress tested {len(pnl)} portfolios under {len(pnl.columns)} scenarios",
+            data={
+                "scenarios": list(pnl.columns),
+                "portfolios": [
+                    {
+                        "name": str(name),
+                        "value": float(result["values"][name]),
+                        "pnl": pnl.loc[name].round(2).to_dict(),
+                        "pnl_pct": pnl_pct.loc[name].round(4).fillna(0.0).to_dict(),
+                        "worst_scenario": pnl.loc[name].idxmin(),
+                        "worst_pnl": float(pnl.loc[name].min())
+                    }
+                    for name in pnl.index
+                ],
+                "shocks": result["shocks"].round(6).to_dict(orient="index")
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error running stress test: {str(e)}"
+        )
+
+
+@router.post("/backtest", response_model=APIResponse)
+async def backtest_var(
+    tickers: List[str] = Query(...),
+    period: str = "5y",
+    window: int = 250,
+    confidence_level: float = 0.99,
+    significance: float = 0.05,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Backtest all VaR methods per ticker (Kupiec and Christoffersen tests)
+    """
+    try:
+        scorecard = await async_market_data.run_blocking(
+            VaRBacktester.run_universe, tickers, period, window, confidence_level, None, significance
+        )
+        summary = scorecard.groupby("method").agg(
+            tickers=("ticker", "count"),
+            passed=("passed", "sum"),
+            exception_rate=("exception_rate", "mean")
+        )
+        
+        return APIResponse(
+            status="success",
+            message=f"VaR backtest completed for {len(tickers)} tickers",
+            data={
+                "window": window,
+                "confidence_level": confidence_level,
+                "significance": significance,
+                "summary": summary.reset_index().to_dict(orient="records"),
+                "scorecard": scorecard.to_dict(orient="records")
+            }
+        )
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error backtesting VaR: {str(e)}"
+        )
+
+
+@router.post("/portfolio-monte-carlo", response_model=APIResponse)
+async def portfolio_monte_carlo(
+    tickers: List[str] = Query(...),
+    weights: List[float] = Query(...),
+    confidence_level: float = Query(0.95, gt=0, lt=1),
+    portfolio_value: float = Query(100000, gt=0),
+    num_simulations: int = 100000,
+    horizon: int = Query(1, ge=1),
+    period: str = "1y",
+    workers: int = Query(1, ge=1),
+    seed: Optional[int] = None,
+    cov_method: str = "sample",
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Correlated Monte Carlo VaR/ES for an N-stock portfolio with per-stock contributions
+    """
+    if not 0 < num_simulations <= settings.MONTE_CARLO_MAX_SIMULATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"num_simulations must be between 1 and {settings.MONTE_CARLO_MAX_SIMULATIONS}"
+        )
+    
+    try:
+        if len(tickers) != len(weights):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Number of tickers must match number of weights"
+            )
+        if abs(sum(weights) - 1.0) > 0.01:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Weights must sum to 1.0"
+            )
+        
+        result = await async_market_data.run_blocking(
+            var_calculator.portfolio_monte_carlo_var,
+            tickers, weights, confidence_level, period, portfolio_value,
+            num_simulations, horizon, workers, seed, cov_method=cov_method
+        )
+        
+        return APIResponse(
+            status="success",
+            message="Portfolio Monte Carlo VaR calculated",
+            data=result
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error running portfolio Monte Carlo: {str(e)}"
+        )
+
+
 @router.post("/monte-carlo", response_model=APIResponse)
 async def monte_carlo_simulation(
     file: UploadFile = File(...),
     returns_column: str = "returns",
     confidence_level: float = 0.95,
     num_simulations: int = 10000,
+    workers: int = 1,
+    seed: Optional[int] = None,
+    sampling: str = "pseudo",
+    control_variate: bool = False,
+    tolerance: Optional[float] = None,
     current_user: User = Depends(get_current_user)
 ):
     """
     Run Monte Carlo simulation for VaR
+    
+    sampling: pseudo, antithetic, sobol or halton. With a tolerance the
+    simulation stops once the VaR standard error reaches it, and
+    num_simulations is the upper bound.
     """
+    if not 0 < num_simulations <= settings.MONTE_CARLO_MAX_SIMULATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"num_simulations must be between 1 and {settings.MONTE_CARLO_MAX_SIMULATIONS}"
+        )
+    if sampling not in SAMPLING_METHODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sampling must be one of {', '.join(SAMPLING_METHODS)}"
+        )
+    
     try:
         content = await file.read()
         df = data_service.load_csv(content)
@@ -133,14 +466,24 @@ async def monte_carlo_simulation(
         else:
             returns = df[returns_column].dropna()
         
-        result = var_calculator.monte_carlo_var(returns, confidence_level, num_simulations)
+        result = await async_market_data.run_blocking(
+            var_calculator.monte_carlo_var, returns, confidence_level, num_simulations,
+            workers, seed, sampling, control_variate, tolerance
+        )
         
         return APIResponse(
             status="success",
-            message=f"Monte Carlo simulation completed ({num_simulations} runs)",
+            message=f"Monte Carlo simulation completed ({result['simulations']} runs)",
             data=result
         )
     
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -148,20 +491,154 @@ async def monte_carlo_simulation(
         )
 
 
+@router.post("/filtered-var", response_model=APIResponse)
+async def filtered_var(
+    ticker: str,
+    confidence_level: float = 0.95,
+    model: str = "garch",
+    period: str = "2y",
+    portfolio_value: float = 100000,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Filtered historical simulation VaR (EWMA or GARCH(1,1) volatility)
+    """
+    if model not in VOLATILITY_MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"model must be one of {', '.join(VOLATILITY_MODELS)}"
+        )
+    
+    try:
+        result = await async_market_data.run_blocking(
+            var_calculator.filtered_var_for_ticker,
+            ticker, confidence_level, model, period, portfolio_value
+        )
+        
+        return APIResponse(
+            status="success",
+            message="Filtered historical simulation VaR calculated",
+            data=result
+        )
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error calculating filtered VaR: {str(e)}"
+        )
+
+
+@router.post("/var-grid", response_model=APIResponse)
+async def calculate_var_grid(
+    file: UploadFile = File(...),
+    returns_column: str = "returns",
+    confidence_levels: List[float] = Query(default=None),
+    horizons: List[int] = Query(default=None),
+    portfolio_value: float = 100000,
+    seed: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    VaR and Expected Shortfall for every method x confidence level x horizon.
+    Pass seed to repeat the Monte Carlo column exactly.
+    """
+    try:
+        content = await file.read()
+        df = data_service.load_csv(content)
+        
+        if returns_column not in df.columns:
+            if 'Close' in df.columns:
+                returns = df['Close'].pct_change().dropna()
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Column '{returns_column}' not found"
+                )
+        else:
+            returns = df[returns_column].dropna()
+        
+        grid = await async_market_data.run_blocking(
+            var_calculator.var_grid, returns, confidence_levels, horizons, seed=seed
+        )
+        
+        return APIResponse(
+            status="success",
+            message="VaR grid calculated",
+            data={
+                "methods": grid["methods"],
+                "confidence_levels": grid["confidence_levels"],
+                "horizons": grid["horizons"],
+                "seed": grid["seed"],
+                "portfolio_value": portfolio_value,
+                "var_pct": (grid["var"] * 100).tolist(),
+                "var_dollar": (grid["var"] * portfolio_value).tolist(),
+                "es_pct": (grid["es"] * 100).tolist(),
+                "es_dollar": (grid["es"] * portfolio_value).tolist()
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error calculating VaR grid: {str(e)}"
+        )
+
+
 @router.get("/report", response_model=APIResponse)
 async def generate_risk_report(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Generate comprehensive risk report for user's portfolios
+    Latest precomputed risk report for each of the user's portfolios
+    (materialized nightly by the risk report job)
     """
-    # This would pull data from user's portfolios in the database
+    latest_date = (
+        select(func.max(RiskReport.report_date))
+        .where(RiskReport.portfolio_id == Portfolio.id)
+        .correlate(Portfolio)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(Portfolio.id, Portfolio.name, RiskReport)
+        .join(RiskReport, RiskReport.portfolio_id == Portfolio.id)
+        .filter(Portfolio.user_id == current_user.id, RiskReport.report_date == latest_date)
+        .order_by(Portfolio.id, RiskReport.method)
+        .all()
+    )
+    
+    portfolios = {}
+    for portfolio_id, name, report in rows:
+        entry = portfolios.setdefault(portfolio_id, {
+            "portfolio_id": portfolio_id,
+            "name": name,
+            "report_date": str(report.report_date),
+            "timeframe": report.timeframe,
+            "methods": {}
+        })
+        entry["methods"][report.method] = {
+            "var_95": float(report.var_95) if report.var_95 is not None else None,
+            "var_99": float(report.var_99) if report.var_99 is not None else None,
+            "expected_shortfall": float(report.expected_shortfall) if report.expected_shortfall is not None else None
+        }
+    
     return APIResponse(
         status="success",
         message="Risk report generated",
         data={
             "summary": "Comprehensive risk analysis",
-            "portfolios": []
+            "portfolios": list(portfolios.values())
         }
     )
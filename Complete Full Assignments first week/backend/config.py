@@ -30,6 +30,16 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_ENABLED: bool = False
     
+    # Caching
+    CACHE_MAX_ENTRIES: int = 2048
+    CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    CACHE_TTL_QUOTES_SECONDS: int = 30
+    CACHE_TTL_DIVIDENDS_SECONDS: int = 24 * 3600
+    CACHE_TTL_FINANCIALS_SECONDS: int = 7 * 24 * 3600
+    CACHE_TTL_RECOMMENDATIONS_SECONDS: int = 24 * 3600
+    RETURNS_STATS_CACHE_ENTRIES: int = 256
+    RETURNS_STATS_TTL_SECONDS: int = 3600
+    
     # AWS
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
@@ -46,6 +56,48 @@ class Settings(BaseSettings):
     MODEL_PATH: str = "./models"
     RETRAIN_INTERVAL_DAYS: int = 30
     
+    # Market Data
+    MARKET_DATA_PROVIDER: str = "yfinance"  # "yfinance" or "replay"
+    MARKET_DATA_REPLAY_PATH: str = "./data/replay"
+    MARKET_DATA_REPLAY_SYNTHETIC: bool = True
+    PRICE_STORE_ENABLED: bool = True
+    PRICE_STORE_PATH: str = "./data/prices"
+    PRICE_STORE_REFRESH_SECONDS: int = 300
+    INTRADAY_RESAMPLE_ENABLED: bool = True
+    MARKET_DATA_MAX_WORKERS: int = 8
+    MARKET_DATA_COALESCE_TTL_SECONDS: float = 2.0
+    MARKET_DATA_ASYNC_CONCURRENCY: int = 16
+    PRICE_PANEL_ENABLED: bool = True
+    PRICE_PANEL_PATH: str = "./data/panel"
+    PRICE_PANEL_MAX_AGE_DAYS: int = 3
+    
+    # Risk Engine
+    MONTE_CARLO_WORKERS: int = 0  # processes for parallel simulations, 0 = one per CPU
+    MONTE_CARLO_CHUNK_SIZE: int = 100_000
+    MONTE_CARLO_MAX_SIMULATIONS: int = 5_000_000
+    VOL_MODEL_CACHE_ENTRIES: int = 4096
+    VOL_MODEL_REFIT_DAYS: int = 5
+    RISK_REPORT_ENABLED: bool = True
+    RISK_REPORT_HOUR: int = 2
+    RISK_REPORT_PERIOD: str = "1y"
+    
+    # Portfolio Optimization
+    FRONTIER_MAX_PORTFOLIOS: int = 1_000_000
+    FRONTIER_MAX_RECORDS: int = 10_000  # larger clouds are downsampled unless output=arrays
+    FRONTIER_CHUNK_ELEMENTS: int = 4_000_000  # portfolios x assets per weight block (~32 MB)
+    BATCH_OPTIMIZE_MAX_SPECS: int = 1000
+    BATCH_OPTIMIZE_MAX_IN_FLIGHT: int = 0  # specs queued on the shared pool at once, 0 = two per worker
+    
+    # Scheduled Jobs (run only in the worker holding the job's lock file)
+    SCHEDULER_LOCK_DIR: str = "./data/locks"
+    WARMER_ENABLED: bool = True  # market data warmer, runs every SCRAPING_INTERVAL_HOURS
+    WARMER_START_DELAY_SECONDS: int = 60
+    WARMER_BATCH_SIZE: int = 50
+    WARMER_BATCH_PAUSE_SECONDS: float = 2.0
+    WARMER_PERIOD: str = "5y"
+    WARMER_STATS_PERIOD: str = "1y"
+    WARMER_LOCAL_POLL_SECONDS: int = 60  # how often each worker checks for a finished warm-up
+    
     # Scraping
     SCRAPING_INTERVAL_HOURS: int = 24
     SELENIUM_HEADLESS: bool = True
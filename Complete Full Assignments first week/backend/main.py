@@ -12,6 +12,9 @@ import os
 
 from backend.config import settings
 from backend.api import auth, data, transactions, ml, predictions, portfolio, risk, robo_advisory, tax, compliance, resume
+from backend.services.async_market_data import async_market_data
+from backend.services.market_data_warmer import market_data_warmer
+from backend.services.risk_report_job import risk_report_job
 
 # Create FastAPI app
 app = FastAPI(
@@ -49,6 +52,36 @@ async def add_process_time_header(request: Request, call_next):
     return response
 
 
+# Background market data warmer (scheduled in every worker, run by the lock holder)
+@app.on_event("startup")
+async def start_market_data_warmer():
+    if settings.WARMER_ENABLED:
+        market_data_warmer.start()
+
+
+@app.on_event("shutdown")
+async def stop_market_data_warmer():
+    market_data_warmer.stop()
+
+
+# Nightly risk reports (scheduled in every worker, run by the lock holder)
+@app.on_event("startup")
+async def start_risk_report_job():
+    if settings.RISK_REPORT_ENABLED:
+        risk_report_job.start()
+
+
+@app.on_event("shutdown")
+async def stop_risk_report_job():
+    risk_report_job.stop()
+
+
+# Blocking market data calls run on a per-worker thread pool
+@app.on_event("shutdown")
+async def stop_async_market_data():
+    async_market_data.shutdown()
+
+
 # Include routers
 app.include_router(auth.router, prefix=settings.API_V1_PREFIX)
 app.include_router(data.router, prefix=settings.API_V1_PREFIX)
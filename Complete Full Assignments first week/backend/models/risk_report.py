@@ -1,7 +1,7 @@
 """
 Risk report model
 """
-from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend.database.connection import Base
@@ -9,6 +9,10 @@ from backend.database.connection import Base
 
 class RiskReport(Base):
     __tablename__ = "risk_reports"
+    __table_args__ = (
+        # One report per portfolio, date and method; the nightly job upserts on it
+        Index("uq_risk_reports_portfolio_date_method", "portfolio_id", "report_date", "method", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     portfolio_id = Column(Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,24 @@
+"""
+Pydantic schemas for portfolio API requests
+"""
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, List, Optional, Tuple
+
+
+# Batch optimization schemas
+Weight = Annotated[float, Field(ge=0, le=1)]
+
+class OptimizationSpec(BaseModel):
+    id: Optional[str] = None
+    tickers: List[str] = Field(..., min_length=2)
+    risk_aversion: float = Field(1.0, gt=0, description="gamma in mu'w - (gamma / 2) w'Sigma w")
+    min_weight: float = Field(0.0, ge=0, le=1)
+    max_weight: float = Field(1.0, gt=0, le=1)
+    bounds: Dict[str, Tuple[Weight, Weight]] = Field({}, description="Ticker -> (min, max) weight overrides")
+
+
+class BatchOptimizeRequest(BaseModel):
+    specs: List[OptimizationSpec] = Field(..., min_length=1)
+    period: str = "1y"
+    cov_method: str = "sample"
+    risk_free_rate: float = 0.02
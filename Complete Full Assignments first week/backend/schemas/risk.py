@@ -0,0 +1,25 @@
+"""
+Pydantic schemas for risk API requests
+"""
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+# Stress testing schemas
+class StressPortfolio(BaseModel):
+    name: str
+    holdings: Dict[str, float] = Field(..., description="Ticker -> weight (fractions of value)")
+    value: float = 100000
+
+
+class CustomScenario(BaseModel):
+    market: float = 0.0
+    sectors: Dict[str, float] = {}
+    tickers: Dict[str, float] = {}
+    description: Optional[str] = None
+
+
+class StressTestRequest(BaseModel):
+    portfolios: Optional[List[StressPortfolio]] = None
+    scenarios: Optional[List[str]] = None
+    custom_scenarios: Dict[str, CustomScenario] = {}
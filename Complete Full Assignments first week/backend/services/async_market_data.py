@@ -0,0 +1,61 @@
+"""
+Async market data service
+
+Awaitable front end for MarketDataService. Blocking yfinance/requests work
+runs on a bounded thread pool so async route handlers never stall the
+event loop while a slow ticker is fetched.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+import pandas as pd
+
+from backend.config import settings
+from backend.services.market_data import MarketDataService
+
+
+class AsyncMarketDataService:
+    """Awaitable market data access with bounded concurrency"""
+
+    def __init__(self, max_concurrency: int = settings.MARKET_DATA_ASYNC_CONCURRENCY):
+        self.market_data = MarketDataService()
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix="market-data")
+
+    async def run_blocking(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking call (a fetch, or a service method that fetches) on the
+        bounded pool and await its result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get_historical_data(self, ticker: str, period: str = "1y",
+                                  interval: str = "1d") -> pd.DataFrame:
+        """Awaitable MarketDataService.get_historical_data"""
+        return await self.run_blocking(self.market_data.get_historical_data, ticker, period, interval)
+
+    async def get_multiple_stocks(self, tickers: List[str], period: str = "1y") -> pd.DataFrame:
+        """Awaitable MarketDataService.get_multiple_stocks"""
+        return await self.run_blocking(self.market_data.get_multiple_stocks, tickers, period)
+
+    async def get_quotes(self, tickers: List[str]) -> pd.DataFrame:
+        """
+        Awaitable MarketDataService.get_quotes; each ticker is looked up as its
+        own task so the pool bound applies across all concurrent requests
+        """
+        unique = list(dict.fromkeys(tickers))
+        rows = await asyncio.gather(
+            *(self.run_blocking(self.market_data.try_stock_info, ticker) for ticker in unique)
+        )
+        return self.market_data.quote_frame(unique, list(rows))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# Shared by the routers so the concurrency bound is per worker process
+async_market_data = AsyncMarketDataService()
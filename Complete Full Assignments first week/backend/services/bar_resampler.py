@@ -0,0 +1,78 @@
+"""
+Vectorized OHLCV resampling
+
+Derives coarser bars (5m, 15m, 1h, 1d, ...) from stored minute bars with
+NumPy reduceat, so intraday requests at several intervals never go back to
+the network once the minutes are cached. Buckets are anchored on the
+session open, which matches how yfinance aligns intraday bars (e.g. 1h
+bars at 9:30, 10:30, ... for US equities). The open is each session's first
+bar time floored to the quarter hour, taking the most common value across
+the sessions in the frame, so a session missing its opening minutes (or
+opening late after a halt) still gets bars at the usual boundaries.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Intervals that can be built from minute bars, in minutes ("1d" is one bucket per session)
+RESAMPLE_MINUTES = {"2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60}
+DERIVABLE_INTERVALS = set(RESAMPLE_MINUTES) | {"1d"}
+
+# Exchanges open on a quarter hour (9:30 New York, 8:00 London, 9:15 Mumbai)
+SESSION_OPEN_GRID = 15
+
+
+def resample_ohlcv(bars: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Aggregate minute bars into interval bars (first/max/min/last/sum)"""
+    if interval not in DERIVABLE_INTERVALS:
+        raise ValueError(f"Cannot derive {interval} bars from minutes")
+
+    bars = bars.dropna(subset=["Close"]).sort_index()
+    if bars.empty:
+        return bars
+
+    index = bars.index
+    local = index.tz_localize(None) if index.tz is not None else index
+    days = local.normalize().asi8
+    minute_of_day = (local.asi8 - days) // 60_000_000_000
+
+    # Row positions where a new session starts, and the session open they share
+    new_day = np.r_[True, days[1:] != days[:-1]]
+    opens, counts = np.unique(minute_of_day[new_day] // SESSION_OPEN_GRID * SESSION_OPEN_GRID,
+                              return_counts=True)
+    anchor = np.full(len(days), opens[np.argmax(counts)])
+
+    if interval == "1d":
+        bucket = np.zeros(len(days), dtype=np.int64)
+    else:
+        bucket = (minute_of_day - anchor) // RESAMPLE_MINUTES[interval]
+
+    starts = np.flatnonzero(new_day | np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+
+    result = {}
+    for col in bars.columns:
+        values = bars[col].to_numpy(dtype=np.float64)
+        if col == "Open":
+            result[col] = values[starts]
+        elif col == "High":
+            result[col] = np.maximum.reduceat(values, starts)
+        elif col == "Low":
+            result[col] = np.minimum.reduceat(values, starts)
+        elif col in ("Close", "Adj Close"):
+            result[col] = values[ends]
+        else:
+            # Volume, Dividends, Stock Splits: totals over the bucket
+            result[col] = np.add.reduceat(np.nan_to_num(values), starts)
+
+    if interval == "1d":
+        bucket_start = days[starts]
+        name = "Date"
+    else:
+        offset_minutes = anchor[starts] + bucket[starts] * RESAMPLE_MINUTES[interval]
+        bucket_start = days[starts] + offset_minutes * 60_000_000_000
+        name = index.name
+    new_index = pd.DatetimeIndex(bucket_start.astype("datetime64[ns]"), name=name)
+    if index.tz is not None:
+        new_index = new_index.tz_localize(index.tz)
+    return pd.DataFrame(result, index=new_index, columns=bars.columns)
@@ -0,0 +1,220 @@
+"""
+In-process TTL + LRU cache with an optional Redis tier
+"""
+import io
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+from backend.config import settings
+
+try:
+    import redis
+except ImportError:  # redis is optional; the local tier works without it
+    redis = None
+
+
+MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Rough in-memory size of a cached value in bytes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Bounded cache with per-entry TTL and LRU eviction by entry count and bytes"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value, or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return MISSING
+            expires, size, value = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        return stats
+
+
+def _encode(value: Any) -> Any:
+    """JSON-safe form of a cached value; frames and series are tagged so they round-trip"""
+    if isinstance(value, pd.DataFrame):
+        return {"__frame__": value.to_json(orient="split", date_format="iso")}
+    if isinstance(value, pd.Series):
+        return {"__series__": value.to_json(orient="split", date_format="iso")}
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__frame__" in value:
+            return pd.read_json(io.StringIO(value["__frame__"]), orient="split", dtype=False)
+        if "__series__" in value:
+            return pd.read_json(io.StringIO(value["__series__"]), orient="split",
+                                typ="series", dtype=False)
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _json_scalar(value: Any) -> Any:
+    """numpy scalars and timestamps that json cannot serialize natively"""
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(_encode(value), default=_json_scalar)
+
+
+def loads(raw) -> Any:
+    return _decode(json.loads(raw))
+
+
+class RedisCache:
+    """
+    Shared cache tier backed by Redis. Values are stored as JSON, never
+    pickled, so whoever can write to Redis cannot run code in the workers.
+    """
+
+    def __init__(self, client, prefix: str = "finsight:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return self.prefix + ":".join(str(part) for part in parts)
+
+    def get(self, key: Hashable) -> Tuple[Any, float]:
+        """Return (value, remaining TTL in seconds), or (MISSING, 0)"""
+        try:
+            pipe = self.client.pipeline()
+            pipe.get(self._key(key))
+            pipe.ttl(self._key(key))
+            raw, remaining = pipe.execute()
+        except Exception:
+            return MISSING, 0
+        if raw is None:
+            return MISSING, 0
+        try:
+            value = loads(raw)
+        except ValueError:
+            return MISSING, 0
+        return value, max(1, remaining or 1)
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        try:
+            self.client.set(self._key(key), dumps(value), ex=max(1, int(ttl)))
+        except Exception:
+            pass
+
+
+class TieredCache:
+    """Local TTL/LRU tier in front of an optional Redis tier"""
+
+    def __init__(self, local: TTLCache, remote: Optional[RedisCache] = None):
+        self.local = local
+        self.remote = remote
+
+    def get(self, key: Hashable) -> Any:
+        value = self.local.get(key)
+        if value is MISSING and self.remote is not None:
+            value, remaining = self.remote.get(key)
+            if value is not MISSING:
+                self.local.set(key, value, ttl=remaining)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self.local.set(key, value, ttl)
+        if self.remote is not None:
+            self.remote.set(key, value, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"local": self.local.stats(), "redis_enabled": self.remote is not None}
+
+
+def build_cache() -> TieredCache:
+    """Create the market data cache from settings"""
+    local = TTLCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES)
+    remote = None
+    if settings.REDIS_ENABLED and redis is not None:
+        client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT,
+                             db=settings.REDIS_DB, socket_timeout=1)
+        remote = RedisCache(client)
+    return TieredCache(local, remote)
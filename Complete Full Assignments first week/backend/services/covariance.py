@@ -0,0 +1,188 @@
+"""
+Covariance estimators
+
+The sample covariance of a 1y window is noisy for large universes and
+singular once there are more assets than days. The alternatives here are:
+
+- ledoit_wolf: shrinkage towards a scaled identity (Ledoit & Wolf, 2004)
+- constant_correlation: shrinkage towards a constant-correlation target
+  (Ledoit & Wolf, "Honey, I Shrunk the Sample Covariance Matrix")
+- ewma: RiskMetrics exponentially weighted covariance
+
+Shrinkage estimators only need the window's raw cross moments up to fourth
+order (sum x, sum x x', sum x_i^2 x_j, sum x_i^2 x_j^2, sum x_i^3 x_j).
+These are kept as accumulators. A new day is a rank-one update and a day
+leaving the window a rank-one downdate, so rolling the window forward
+costs O(N^2) per day instead of a refit over the whole window. EWMA is a
+rank-one recursion by construction. Estimates are daily and use 1/T
+normalization, as in the papers.
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services.volatility_models import EWMA_LAMBDA
+
+
+COV_METHODS = ["sample", "ledoit_wolf", "constant_correlation", "ewma"]
+
+
+class MomentAccumulator:
+    """Raw cross moments of a window of return vectors, updatable by rows"""
+
+    def __init__(self, n: int):
+        self.count = 0
+        self.s1 = np.zeros(n)           # sum x_i
+        self.s2 = np.zeros((n, n))      # sum x_i x_j
+        self.s3 = np.zeros((n, n))      # sum x_i^2 x_j
+        self.s4 = np.zeros((n, n))      # sum x_i^2 x_j^2
+        self.s31 = np.zeros((n, n))     # sum x_i^3 x_j
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.s1.nbytes + 4 * self.s2.nbytes)
+
+    def add(self, rows: np.ndarray, sign: float = 1.0) -> None:
+        """Add (or with sign=-1 remove) rows; k rows are k rank-one updates in one product"""
+        if len(rows) == 0:
+            return
+        squared = rows * rows
+        self.count += int(sign) * len(rows)
+        self.s1 += sign * rows.sum(axis=0)
+        self.s2 += sign * (rows.T @ rows)
+        self.s3 += sign * (squared.T @ rows)
+        self.s4 += sign * (squared.T @ squared)
+        self.s31 += sign * ((squared * rows).T @ rows)
+
+    def remove(self, rows: np.ndarray) -> None:
+        self.add(rows, -1.0)
+
+    def moments(self):
+        """Mean, 1/T covariance and the per-entry variance of x_i x_j (pi) and theta"""
+        t = self.count
+        m = self.s1 / t
+        q = np.diag(self.s2)
+        cube = np.diag(self.s3)
+        sample = self.s2 / t - np.outer(m, m)
+        mm = np.outer(m, m)
+        m2 = m * m
+
+        # sum_t (x_i - m_i)^2 (x_j - m_j)^2
+        fourth = (self.s4 - 2 * self.s3 * m[None, :] - 2 * m[:, None] * self.s3.T
+                  + np.outer(q, m2) + np.outer(m2, q) + 4 * mm * self.s2 - 3 * t * np.outer(m2, m2))
+        pi = fourth / t - sample ** 2
+        # sum_t (x_i - m_i)^3 (x_j - m_j)
+        third = (self.s31 - np.outer(cube, m) - 3 * m[:, None] * self.s3
+                 + 3 * mm * q[:, None] + 3 * m2[:, None] * self.s2 - 3 * t * np.outer(m2 * m, m))
+        theta = third / t - np.diag(sample)[:, None] * sample
+        return m, sample, pi, theta
+
+    def ledoit_wolf(self) -> np.ndarray:
+        _, sample, pi, _ = self.moments()
+        n = len(sample)
+        mu = np.trace(sample) / n
+        target = mu * np.eye(n)
+        d2 = np.sum((sample - target) ** 2)
+        b2 = min(pi.sum() / self.count, d2)
+        shrinkage = b2 / d2 if d2 > 0 else 1.0
+        return shrinkage * target + (1 - shrinkage) * sample
+
+    def constant_correlation(self) -> np.ndarray:
+        _, sample, pi, theta = self.moments()
+        n = len(sample)
+        variance = np.maximum(np.diag(sample), 1e-300)
+        sd = np.sqrt(variance)
+        off_diagonal = ~np.eye(n, dtype=bool)
+        correlation = sample / np.outer(sd, sd)
+        r_bar = correlation[off_diagonal].mean() if n > 1 else 0.0
+        target = r_bar * np.outer(sd, sd)
+        np.fill_diagonal(target, variance)
+
+        ratio = np.sqrt(np.outer(1 / variance, variance))  # sqrt(var_j / var_i)
+        rho = np.trace(pi) + (r_bar / 2) * np.sum((ratio * theta + ratio.T * theta.T)[off_diagonal])
+        gamma = np.sum((target - sample) ** 2)
+        kappa = (pi.sum() - rho) / gamma if gamma > 0 else 0.0
+        shrinkage = max(0.0, min(1.0, kappa / self.count))
+        return shrinkage * target + (1 - shrinkage) * sample
+
+
+class CovarianceEstimator:
+    """
+    One estimator over a rolling returns window. roll() moves it to a new
+    window, dropping and adding only the rows that changed when the new
+    window overlaps the old one with identical values, and refitting
+    otherwise (or once a full window of updates has accumulated).
+    """
+
+    def __init__(self, method: str, lam: float = EWMA_LAMBDA):
+        if method not in COV_METHODS or method == "sample":
+            raise ValueError(f"Unknown covariance estimator: {method}")
+        self.method = method
+        self.lam = lam
+        self.columns = None
+        self.index = None
+        self.window: Optional[np.ndarray] = None
+        self._moments: Optional[MomentAccumulator] = None
+        self._ewma: Optional[np.ndarray] = None
+        self._updates = 0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        held = self.window.nbytes if self.window is not None else 0
+        if self._moments is not None:
+            held += self._moments.nbytes
+        if self._ewma is not None:
+            held += self._ewma.nbytes
+        return int(held)
+
+    def roll(self, returns: pd.DataFrame) -> str:
+        """Bring the estimator to this window; returns "current", "updated" or "fitted" """
+        values = returns.to_numpy(dtype=float)
+        if self.index is not None and list(returns.columns) == self.columns:
+            if self.index.equals(returns.index) and np.array_equal(self.window, values):
+                return "current"
+            start = self.index.get_indexer(returns.index[:1])[0]
+            overlap = len(self.index) - start
+            if (start >= 0 and overlap <= len(values)
+                    and self._updates + len(values) - overlap < len(values)
+                    and self.index[start:].equals(returns.index[:overlap])
+                    and np.array_equal(self.window[start:], values[:overlap])):
+                self._update(self.window[:start], values[overlap:])
+                self._updates += len(values) - overlap
+                self.index, self.window = returns.index, values
+                return "updated"
+        self._fit(values)
+        self.columns, self.index, self.window = list(returns.columns), returns.index, values
+        self._updates = 0
+        return "fitted"
+
+    def _fit(self, values: np.ndarray) -> None:
+        if self.method == "ewma":
+            seed = values[:min(len(values), 30)]
+            self._ewma = seed.T @ seed / len(seed)
+            self._update(values[:0], values[len(seed):])
+        else:
+            self._moments = MomentAccumulator(values.shape[1])
+            self._moments.add(values)
+
+    def _update(self, dropped: np.ndarray, added: np.ndarray) -> None:
+        if self.method == "ewma":
+            # k rank-one steps S = lam S + (1 - lam) r r' in one weighted product;
+            # the recursion has no window, old days just decay
+            k = len(added)
+            decay = (1 - self.lam) * self.lam ** np.arange(k - 1, -1, -1)
+            self._ewma = self.lam ** k * self._ewma + (added * decay[:, None]).T @ added
+        else:
+            self._moments.remove(dropped)
+            self._moments.add(added)
+
+    def covariance(self) -> np.ndarray:
+        """Daily covariance for the current window"""
+        if self.method == "ewma":
+            return self._ewma.copy()
+        if self.method == "ledoit_wolf":
+            return self._moments.ledoit_wolf()
+        return self._moments.constant_correlation()
@@ -0,0 +1,246 @@
+"""
+Efficient frontier
+
+random_cloud scores K random long-only portfolios without a Python loop.
+Weights are drawn as blocks of a K x N matrix sized by
+FRONTIER_CHUNK_ELEMENTS. Each block's returns come from one matrix-vector
+product and its variances from one einsum over (W Sigma) and W. Only three
+floats per portfolio are kept, plus the weights of the best portfolios seen,
+so a 1M-portfolio cloud needs tens of megabytes whatever the universe size.
+downsample thins a cloud for plotting. It keeps the highest-Sharpe
+portfolio in each cell of a volatility x return grid, which preserves the
+cloud's outline and its frontier edge.
+
+exact_frontier traces the true long-only frontier. The target-return QPs
+share one parametric solution, min 1/2 w' Sigma w - lambda mu' w over the
+simplex. Between corner portfolios the optimal weights are linear in lambda,
+and therefore in the target return. The sweep starts at the highest-return
+asset (lambda = infinity), or at the minimum-variance mix of the assets
+tied for the highest return, and runs to the minimum-variance portfolio
+(lambda = 0). Each segment is warm-started from the previous corner's
+active set and costs one small KKT solve, then every target return is read
+off its segment exactly. The sweep needs a positive definite covariance: a
+singular one (more assets than observations under the sample estimator)
+is rejected, and a shrinkage cov_method fixes it.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import settings
+from backend.services.portfolio_optimizer import min_variance
+
+# Smallest eigenvalue, relative to the largest, for a covariance to count as positive definite
+MIN_RELATIVE_EIGENVALUE = 1e-10
+
+
+def random_cloud(mean: np.ndarray, cov: np.ndarray, num_portfolios: int,
+                 risk_free_rate: float = 0.0, seed: Optional[int] = None,
+                 chunk_elements: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Expected return, volatility and Sharpe ratio of num_portfolios random
+    weight vectors, plus the max-Sharpe and min-volatility weights found
+    """
+    mean = np.asarray(mean, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    n = len(mean)
+    rng = np.random.default_rng(seed)
+    chunk = max(1, (chunk_elements or settings.FRONTIER_CHUNK_ELEMENTS) // n)
+
+    returns = np.empty(num_portfolios)
+    volatility = np.empty(num_portfolios)
+    best_sharpe = (-np.inf, None)
+    least_volatile = (np.inf, None)
+    for start in range(0, num_portfolios, chunk):
+        stop = min(start + chunk, num_portfolios)
+        weights = rng.random((stop - start, n))
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        block_returns = weights @ mean
+        block_volatility = np.sqrt(np.maximum(np.einsum("ij,ij->i", weights @ cov, weights), 0.0))
+        returns[start:stop] = block_returns
+        volatility[start:stop] = block_volatility
+
+        block_sharpe = _sharpe(block_returns, block_volatility, risk_free_rate)
+        i, j = int(np.argmax(block_sharpe)), int(np.argmin(block_volatility))
+        if block_sharpe[i] > best_sharpe[0]:
+            best_sharpe = (block_sharpe[i], weights[i].copy())
+        if block_volatility[j] < least_volatile[0]:
+            least_volatile = (block_volatility[j], weights[j].copy())
+
+    return {
+        "returns": returns,
+        "volatility": volatility,
+        "sharpe": _sharpe(returns, volatility, risk_free_rate),
+        "max_sharpe_weights": best_sharpe[1],
+        "min_volatility_weights": least_volatile[1]
+    }
+
+
+def _sharpe(returns: np.ndarray, volatility: np.ndarray, risk_free_rate: float) -> np.ndarray:
+    return np.divide(returns - risk_free_rate, volatility,
+                     out=np.zeros_like(returns), where=volatility > 0)
+
+
+def downsample(volatility: np.ndarray, returns: np.ndarray, sharpe: np.ndarray,
+               max_points: int) -> np.ndarray:
+    """
+    Indices of at most max_points portfolios: the highest-Sharpe one per
+    cell of a volatility x return grid, in ascending volatility
+    """
+    if len(volatility) <= max_points:
+        return np.argsort(volatility, kind="stable")
+    bins = max(1, math.isqrt(max_points))
+
+    def cell(values):
+        low, high = values.min(), values.max()
+        scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+        return np.minimum((scaled * bins).astype(np.int64), bins - 1)
+
+    cells = cell(volatility) * bins + cell(returns)
+    order = np.lexsort((-sharpe, cells))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cells[order][1:] != cells[order][:-1]
+    keep = order[first]
+    return keep[np.argsort(volatility[keep], kind="stable")]
+
+
+def _segment(cov: np.ndarray, mean: np.ndarray, active: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    On the active set S, w_S = w0 + lambda w1 and gamma = g0 + lambda g1
+    solve Sigma_SS w_S - gamma 1 = lambda mu_S, 1' w_S = 1
+    """
+    k = len(active)
+    kkt = np.zeros((k + 1, k + 1))
+    kkt[:k, :k] = cov[np.ix_(active, active)]
+    kkt[:k, k] = -1.0
+    kkt[k, :k] = 1.0
+    rhs = np.zeros((k + 1, 2))
+    rhs[k, 0] = 1.0
+    rhs[:k, 1] = mean[active]
+    try:
+        solution = np.linalg.solve(kkt, rhs)
+    except np.linalg.LinAlgError:
+        raise ValueError("Covariance is singular on the frontier's active set")
+    return solution[:k, 0], solution[:k, 1], solution[k, 0], solution[k, 1]
+
+
+def _top_corner(mean: np.ndarray, cov: np.ndarray, tolerance: float) -> Tuple[List[int], np.ndarray]:
+    """
+    Active set and weights at lambda = infinity: the highest-return asset, or
+    the long-only minimum-variance mix of every asset tied for that return
+    """
+    n = len(mean)
+    tied = np.flatnonzero(mean >= mean.max() - tolerance)
+    if len(tied) == 1:
+        return [int(tied[0])], np.eye(n)[tied[0]]
+    mix = min_variance(cov[np.ix_(tied, tied)])["weights"]
+    active = [int(i) for i in tied[mix > 1e-9]]
+    w0, _, _, _ = _segment(cov, mean, np.array(active))
+    weights = np.zeros(n)
+    weights[active] = w0
+    return active, np.maximum(weights, 0.0)
+
+
+def check_positive_definite(cov: np.ndarray) -> None:
+    eigenvalues = np.linalg.eigvalsh(cov)
+    if eigenvalues[0] <= MIN_RELATIVE_EIGENVALUE * max(eigenvalues[-1], 0.0):
+        raise ValueError("mode=exact needs a positive definite covariance; this one is singular "
+                         "(more assets than observations?). Use cov_method=ledoit_wolf or "
+                         "constant_correlation")
+
+
+def critical_line(mean: np.ndarray, cov: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Corner portfolios of the long-only frontier, from the highest-return
+    asset down to the minimum-variance portfolio. Returns the corner
+    lambdas, a corners x assets weight matrix and the number of solves.
+    """
+    mean = np.asarray(mean, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    n = len(mean)
+    tolerance = 1e-12 * max(1.0, float(np.abs(mean).max()))
+    active, start = _top_corner(mean, cov, tolerance)
+    lam = np.inf
+    lambdas, corners = [lam], [start]
+    last_changed = active[0] if len(active) == 1 else -1
+    solves = 0
+
+    for _ in range(4 * n + 10):
+        idx = np.array(active)
+        w0, w1, g0, g1 = _segment(cov, mean, idx)
+        solves += 1
+
+        # Leaving: an active weight falls to zero as lambda decreases
+        with np.errstate(divide="ignore", invalid="ignore"):
+            leave = np.where(w1 > 0, -w0 / w1, -np.inf)
+        # Entering: an inactive asset's KKT gradient falls to zero
+        inactive = np.setdiff1d(np.arange(n), idx)
+        cov_is = cov[np.ix_(inactive, idx)]
+        grad0 = cov_is @ w0 - g0
+        grad1 = cov_is @ w1 - mean[inactive] - g1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            enter = np.where(grad1 > 0, -grad0 / grad1, -np.inf)
+
+        # The asset that just changed sits exactly at its boundary
+        leave[idx == last_changed] = -np.inf
+        enter[inactive == last_changed] = -np.inf
+        limit = lam - tolerance if np.isfinite(lam) else np.inf
+        leave[~(leave < limit)] = -np.inf
+        enter[~(enter < limit)] = -np.inf
+
+        best_leave = int(np.argmax(leave)) if len(leave) else -1
+        best_enter = int(np.argmax(enter)) if len(enter) else -1
+        next_lam = max(leave[best_leave] if best_leave >= 0 else -np.inf,
+                       enter[best_enter] if best_enter >= 0 else -np.inf, 0.0)
+
+        weights = np.zeros(n)
+        weights[idx] = w0 + next_lam * w1
+        lam = next_lam
+        lambdas.append(lam)
+        corners.append(np.maximum(weights, 0.0))
+        if lam <= 0.0:
+            break
+        if best_leave >= 0 and leave[best_leave] == lam:
+            last_changed = int(idx[best_leave])
+            active.remove(last_changed)
+        else:
+            last_changed = int(inactive[best_enter])
+            active.append(last_changed)
+
+    return np.array(lambdas), np.vstack(corners), solves
+
+
+def exact_frontier(mean: np.ndarray, cov: np.ndarray, num_points: int = 100) -> Dict[str, Any]:
+    """
+    num_points frontier portfolios at evenly spaced target returns between
+    the minimum-variance portfolio and the highest-return asset
+    """
+    started = time.perf_counter()
+    mean = np.asarray(mean, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    check_positive_definite(cov)
+    lambdas, corners, solves = critical_line(mean, cov)
+
+    # Corner returns fall from the top asset to the minimum-variance portfolio;
+    # targets are matched to their segment in ascending order
+    corner_returns = (corners @ mean)[::-1]
+    corners = corners[::-1]
+    targets = np.linspace(corner_returns[0], corner_returns[-1], num_points)
+    segment = np.clip(np.searchsorted(corner_returns, targets, side="right") - 1, 0, len(corners) - 2)
+    low, high = corner_returns[segment], corner_returns[segment + 1]
+    fraction = np.divide(targets - low, high - low, out=np.zeros_like(targets), where=high > low)
+    weights = corners[segment] + fraction[:, None] * (corners[segment + 1] - corners[segment])
+
+    returns = weights @ mean
+    volatility = np.sqrt(np.maximum(np.einsum("ij,ij->i", weights @ cov, weights), 0.0))
+    return {
+        "returns": returns,
+        "volatility": volatility,
+        "weights": weights,
+        "corners": len(corners),
+        "solves": solves,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
@@ -0,0 +1,65 @@
+"""
+Cross-process leadership for scheduled jobs
+
+Every gunicorn worker imports the app and starts its own scheduler, so a
+scheduled job would otherwise run once per worker. The process that first
+takes an exclusive flock on <SCHEDULER_LOCK_DIR>/<name>.lock leads that job
+and keeps the lock for its lifetime; the other workers' triggers still fire
+but skip the run. The OS drops the lock when the leader exits, and the next
+worker whose trigger fires takes over. Where fcntl is unavailable (local
+development on Windows) every process leads.
+"""
+import os
+import threading
+from typing import Optional
+
+from backend.config import settings
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX; single-process development only
+    fcntl = None
+
+
+class LeaderLock:
+    """Non-blocking, process-lifetime file lock naming one job's leader"""
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.path = os.path.join(directory or settings.SCHEDULER_LOCK_DIR, f"{name}.lock")
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return fcntl is None or self._file is not None
+
+    def acquire(self) -> bool:
+        """True if this process leads, taking the lock when it is free"""
+        if fcntl is None:
+            return True
+        with self._lock:
+            if self._file is not None:
+                return True
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            handle = open(self.path, "a+")
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            # Record the leader's pid for operators; the lock itself is the flock
+            handle.seek(0)
+            handle.truncate()
+            handle.write(f"{os.getpid()}\n")
+            handle.flush()
+            self._file = handle
+            return True
+
+    def release(self) -> None:
+        if fcntl is None:
+            return
+        with self._lock:
+            if self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
@@ -1,10 +1,35 @@
 """
-Market data service using YFinance
+Market data service (YFinance by default, see market_providers)
 """
-import yfinance as yf
+import copy
 import pandas as pd
 from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from backend.config import settings
+from backend.services.cache import MISSING, build_cache
+from backend.services.market_providers import get_provider
+from backend.services.bar_resampler import DERIVABLE_INTERVALS, resample_ohlcv
+from backend.services.price_store import SESSION_PERIODS, PriceStore, slice_period
+from backend.services.request_coalescer import RequestCoalescer
+
+
+price_store = PriceStore(settings.PRICE_STORE_PATH)
+coalescer = RequestCoalescer(result_ttl=settings.MARKET_DATA_COALESCE_TTL_SECONDS)
+cache = build_cache()
+
+# Seconds each kind of data stays cached
+CACHE_TTLS = {
+    "quote": settings.CACHE_TTL_QUOTES_SECONDS,
+    "dividends": settings.CACHE_TTL_DIVIDENDS_SECONDS,
+    "financials": settings.CACHE_TTL_FINANCIALS_SECONDS,
+    "recommendations": settings.CACHE_TTL_RECOMMENDATIONS_SECONDS,
+}
+
+QUOTE_COLUMNS = [
+    "name", "sector", "industry", "current_price", "market_cap", "pe_ratio",
+    "dividend_yield", "52_week_high", "52_week_low"
+]
 
 
 class MarketDataService:
@@ -14,24 +39,65 @@ class MarketDataService:
     def get_stock_info(ticker: str) -> Dict[str, Any]:
         """Get comprehensive stock information"""
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            
-            return {
-                "ticker": ticker,
-                "name": info.get('longName', ''),
-                "sector": info.get('sector', ''),
-                "industry": info.get('industry', ''),
-                "current_price": info.get('currentPrice'),
-                "market_cap": info.get('marketCap'),
-                "pe_ratio": info.get('trailingPE'),
-                "dividend_yield": info.get('dividendYield'),
-                "52_week_high": info.get('fiftyTwoWeekHigh'),
-                "52_week_low": info.get('fiftyTwoWeekLow')
-            }
+            return MarketDataService._cached(
+                "quote", ticker,
+                lambda: MarketDataService._normalize_info(ticker, get_provider().info(ticker))
+            )
         except Exception as e:
             raise ValueError(f"Error fetching stock info for {ticker}: {str(e)}")
     
+    @staticmethod
+    def get_quotes(tickers: List[str], max_workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Get normalized quotes for many tickers in one batched operation
+        
+        Lookups run concurrently (bounded by max_workers, default
+        MARKET_DATA_MAX_WORKERS). Returns a
+        DataFrame indexed by ticker with the get_stock_info fields as columns;
+        tickers that could not be fetched have an all-NaN row.
+        """
+        unique = list(dict.fromkeys(tickers))
+        if not unique:
+            return MarketDataService.quote_frame([], [])
+        
+        workers = max(1, min(max_workers or settings.MARKET_DATA_MAX_WORKERS, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(MarketDataService.try_stock_info, unique))
+        return MarketDataService.quote_frame(unique, rows)
+    
+    @staticmethod
+    def try_stock_info(ticker: str) -> Optional[Dict[str, Any]]:
+        """get_stock_info that returns None instead of raising"""
+        try:
+            return MarketDataService.get_stock_info(ticker)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def quote_frame(tickers: List[str], rows: List[Optional[Dict[str, Any]]]) -> pd.DataFrame:
+        """Assemble normalized quote rows into a DataFrame indexed by ticker"""
+        records = [row for row in rows if row is not None]
+        quotes = pd.DataFrame.from_records(records, columns=["ticker"] + QUOTE_COLUMNS)
+        quotes = quotes.set_index("ticker").reindex(tickers)
+        quotes["current_price"] = pd.to_numeric(quotes["current_price"], errors="coerce")
+        return quotes
+    
+    @staticmethod
+    def _normalize_info(ticker: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a raw yfinance info blob onto our quote fields"""
+        return {
+            "ticker": ticker,
+            "name": info.get('longName', ''),
+            "sector": info.get('sector', ''),
+            "industry": info.get('industry', ''),
+            "current_price": info.get('currentPrice'),
+            "market_cap": info.get('marketCap'),
+            "pe_ratio": info.get('trailingPE'),
+            "dividend_yield": info.get('dividendYield'),
+            "52_week_high": info.get('fiftyTwoWeekHigh'),
+            "52_week_low": info.get('fiftyTwoWeekLow')
+        }
+    
     @staticmethod
     def get_historical_data(ticker: str, period: str = "1y", 
                            interval: str = "1d") -> pd.DataFrame:
@@ -42,27 +108,137 @@ class MarketDataService:
         Intervals: 1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo
         """
         try:
-            stock = yf.Ticker(ticker)
-            df = stock.history(period=period, interval=interval)
-            return df
+            # Identical concurrent requests share one fetch; callers get their own copy
+            df = coalescer.run(("history", ticker, period, interval),
+                               MarketDataService._fetch_historical_data, ticker, period, interval)
+            return df.copy()
         except Exception as e:
             raise ValueError(f"Error fetching historical data for {ticker}: {str(e)}")
     
+    @staticmethod
+    def _fetch_historical_data(ticker: str, period: str, interval: str) -> pd.DataFrame:
+        if interval in DERIVABLE_INTERVALS:
+            minutes = MarketDataService._stored_minute_bars(ticker, period)
+            if minutes is not None and not minutes.empty:
+                return resample_ohlcv(minutes, interval)
+        
+        provider = get_provider()
+        if not settings.PRICE_STORE_ENABLED or provider.is_local:
+            return provider.history(ticker, period=period, interval=interval)
+        return MarketDataService.get_stored_history([ticker], period, interval)[ticker]
+    
+    @staticmethod
+    def _stored_minute_bars(ticker: str, period: str) -> Optional[pd.DataFrame]:
+        """
+        Minute bars from the store when they can serve the period, else None.
+        Upstream only keeps a few days of 1m history, so short periods are
+        always served from minutes while longer ones need the store to have
+        accumulated enough of them; coverage is recorded from the first
+        minute actually stored, not from the period that was asked for.
+        """
+        if not (settings.PRICE_STORE_ENABLED and settings.INTRADAY_RESAMPLE_ENABLED):
+            return None
+        if get_provider().is_local:
+            return None
+        if period not in SESSION_PERIODS and not price_store.covers(ticker, "1m", period):
+            return None
+        return MarketDataService.get_stored_history([ticker], period, "1m")[ticker]
+    
     @staticmethod
     def get_multiple_stocks(tickers: List[str], period: str = "1y") -> pd.DataFrame:
         """Get historical data for multiple stocks"""
         try:
-            data = yf.download(tickers, period=period, group_by='ticker')
-            return data
+            data = coalescer.run(("multiple", tuple(tickers), period),
+                                 MarketDataService._fetch_multiple_stocks, tickers, period)
+            return data.copy()
         except Exception as e:
             raise ValueError(f"Error fetching multiple stocks: {str(e)}")
     
+    @staticmethod
+    def _fetch_multiple_stocks(tickers: List[str], period: str) -> pd.DataFrame:
+        provider = get_provider()
+        if not settings.PRICE_STORE_ENABLED or provider.is_local:
+            bars = provider.download(tickers, interval="1d", period=period)
+        else:
+            bars = MarketDataService.get_stored_history(tickers, period, "1d")
+        bars = {ticker: bars.get(ticker, pd.DataFrame()) for ticker in tickers}
+        if len(tickers) == 1:
+            return bars[tickers[0]]
+        # An empty frame's index would turn the joined date index into unsorted objects
+        available = {ticker: bars[ticker] for ticker in tickers if not bars[ticker].empty}
+        return pd.concat(available, axis=1) if available else pd.DataFrame()
+    
+    @staticmethod
+    def get_close_prices(tickers: List[str], period: str = "1y") -> pd.DataFrame:
+        """Close prices with one column per ticker; all NaN for a ticker without data"""
+        data = MarketDataService.get_multiple_stocks(tickers, period)
+        if len(tickers) == 1:
+            frames = {tickers[0]: data}
+        else:
+            # Tickers without data have no columns
+            available = set(data.columns.get_level_values(0))
+            frames = {ticker: data[ticker] for ticker in tickers if ticker in available}
+        closes = {ticker: frame['Close'] for ticker, frame in frames.items() if 'Close' in frame}
+        return pd.DataFrame(closes, columns=tickers, dtype=float)
+    
+    @staticmethod
+    def coalescing_stats() -> Dict[str, int]:
+        """Hit / coalesced-wait / miss counters for historical data fetches"""
+        return coalescer.stats()
+    
+    @staticmethod
+    def get_stored_history(tickers: List[str], period: str = "1y",
+                           interval: str = "1d") -> Dict[str, pd.DataFrame]:
+        """
+        Read bars from the local price store, going upstream only for what is missing.
+        
+        Tickers whose stored history does not reach back far enough are downloaded
+        in full; stale tickers only fetch the bars after their last stored bar.
+        """
+        missing = [t for t in tickers if not price_store.covers(t, interval, period)]
+        stale = [
+            t for t in tickers
+            if t not in missing
+            and not price_store.is_fresh(t, interval, settings.PRICE_STORE_REFRESH_SECONDS)
+        ]
+        
+        if missing:
+            fetched = get_provider().download(missing, interval, period=period)
+            for ticker, df in fetched.items():
+                if not df.empty:
+                    price_store.extend(ticker, interval, df,
+                                       fetched_from=PriceStore.coverage_start(period, df, interval))
+        
+        if stale:
+            last_bars = {t: price_store.read(t, interval) for t in stale}
+            ends = [df.index[-1] for df in last_bars.values() if df is not None and not df.empty]
+            fetched = {}
+            # Nothing read back (e.g. a concurrent directory swap): just touch them below
+            if ends:
+                try:
+                    fetched = get_provider().download(stale, interval, start=min(ends).strftime("%Y-%m-%d"))
+                except Exception:
+                    # Serve what is stored rather than fail on an incremental refresh
+                    fetched = {}
+            for ticker in stale:
+                new_bars = fetched.get(ticker)
+                if new_bars is None or new_bars.empty:
+                    price_store.touch(ticker, interval)
+                else:
+                    price_store.append(ticker, interval, new_bars)
+        
+        result = {}
+        for ticker in tickers:
+            df = price_store.read(ticker, interval)
+            result[ticker] = slice_period(df, period) if df is not None else pd.DataFrame()
+        return result
+    
     @staticmethod
     def get_dividends(ticker: str) -> pd.DataFrame:
         """Get dividend history"""
         try:
-            stock = yf.Ticker(ticker)
-            return stock.dividends
+            return MarketDataService._cached("dividends", ticker,
+                                             lambda: get_provider().dividends(ticker))
         except Exception as e:
             raise ValueError(f"Error fetching dividends for {ticker}: {str(e)}")
     
@@ -70,12 +246,8 @@ class MarketDataService:
     def get_financials(ticker: str) -> Dict[str, pd.DataFrame]:
         """Get financial statements"""
         try:
-            stock = yf.Ticker(ticker)
-            return {
-                "income_statement": stock.financials,
-                "balance_sheet": stock.balance_sheet,
-                "cash_flow": stock.cashflow
-            }
+            return MarketDataService._cached("financials", ticker,
+                                             lambda: get_provider().financials(ticker))
         except Exception as e:
             raise ValueError(f"Error fetching financials for {ticker}: {str(e)}")
     
@@ -83,11 +255,28 @@ class MarketDataService:
     def get_recommendations(ticker: str) -> pd.DataFrame:
         """Get analyst recommendations"""
         try:
-            stock = yf.Ticker(ticker)
-            return stock.recommendations
+            return MarketDataService._cached(
+                "recommendations", ticker, lambda: get_provider().recommendations(ticker)
+            )
         except Exception as e:
             return pd.DataFrame()
     
+    @staticmethod
+    def _cached(kind: str, ticker: str, loader):
+        """Serve from the tiered cache, loading and storing on a miss"""
+        key = (kind, ticker)
+        value = cache.get(key)
+        if value is MISSING:
+            value = loader()
+            cache.set(key, value, CACHE_TTLS[kind])
+        # Callers may mutate what they get back, so never hand out the cached object
+        return copy.deepcopy(value)
+    
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        """Entry, byte and hit/miss counters for the quote and fundamentals cache"""
+        return cache.stats()
+    
     @staticmethod
     def calculate_returns(ticker: str, period: str = "1y") -> Dict[str, float]:
         """Calculate various return metrics"""
@@ -0,0 +1,183 @@
+"""
+Background market data warmer
+
+Prefetches histories for every ticker we track (the stocks and
+portfolio_holdings tables) and rebuilds the universe price panel, so the
+first request of the day hits warm caches. Quotes are not prefetched: they
+expire after CACHE_TTL_QUOTES_SECONDS, long before anyone would read them.
+Work is done in small batches with a pause in between so the upstream
+provider is never saturated.
+
+Only the worker holding the warmer's leader lock fills these shared layers
+(the price store, the panel and Redis). It then touches a marker file next
+to its lock. The returns statistics are an in-process cache, so every
+worker polls that marker every WARMER_LOCAL_POLL_SECONDS and, when it has
+moved, drops and rebuilds its own statistics for each portfolio's ticker
+set from the freshly warmed store.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.database.connection import SessionLocal
+from backend.services.leader_lock import LeaderLock
+from backend.services.market_data import MarketDataService
+from backend.services.price_panel import PricePanel
+from backend.services.returns_stats import returns_stats_service
+
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+except ImportError:  # scheduling is optional; run_once still works
+    BackgroundScheduler = None
+
+
+class MarketDataWarmer:
+    """Throttled, scheduled prefetch of market data for tracked tickers"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.batch_size = settings.WARMER_BATCH_SIZE
+        self.pause_seconds = settings.WARMER_BATCH_PAUSE_SECONDS
+        self.period = settings.WARMER_PERIOD
+        self.stats_period = settings.WARMER_STATS_PERIOD
+        self._scheduler = None
+        self._run_lock = threading.Lock()
+        self.leader = LeaderLock("market_data_warmer")
+        self.marker = os.path.join(settings.SCHEDULER_LOCK_DIR, "market_data_warmer.done")
+        self._local_lock = threading.Lock()
+        self._local_generation = 0.0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_local_run: Optional[Dict[str, Any]] = None
+
+    def collect_universe(self) -> Tuple[List[str], List[List[str]]]:
+        """All tracked tickers, plus each portfolio's ticker set"""
+        from backend.models import PortfolioHolding, Stock
+
+        db = self.session_factory()
+        try:
+            tickers = [row[0] for row in db.query(Stock.ticker_symbol).order_by(Stock.ticker_symbol)]
+            holdings = (
+                db.query(PortfolioHolding.portfolio_id, Stock.ticker_symbol)
+                .join(Stock, PortfolioHolding.stock_id == Stock.id)
+                .all()
+            )
+        finally:
+            db.close()
+
+        by_portfolio = defaultdict(set)
+        for portfolio_id, ticker in holdings:
+            by_portfolio[portfolio_id].add(ticker)
+        ticker_sets = {tuple(sorted(held)) for held in by_portfolio.values()}
+        return tickers, [list(held) for held in sorted(ticker_sets)]
+
+    def run_once(self) -> Dict[str, Any]:
+        """Warm the shared layers once; concurrent calls are skipped, not queued"""
+        if not self._run_lock.acquire(blocking=False):
+            return {"skipped": True}
+        try:
+            return self._run()
+        finally:
+            self._run_lock.release()
+
+    def _run(self) -> Dict[str, Any]:
+        started = time.time()
+        tickers, portfolio_sets = self.collect_universe()
+        summary = {"tickers": len(tickers), "portfolios": len(portfolio_sets), "history_errors": 0}
+
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        for n, batch in enumerate(batches):
+            try:
+                MarketDataService.get_multiple_stocks(batch, self.period)
+            except Exception:
+                summary["history_errors"] += len(batch)
+            if n < len(batches) - 1:
+                time.sleep(self.pause_seconds)
+
+        if settings.PRICE_PANEL_ENABLED and tickers:
+            try:
+                # Histories are fresh in the store now, so this is a local rebuild
+                panel = PricePanel.build(settings.PRICE_PANEL_PATH, tickers, self.period,
+                                         batch_size=self.batch_size)
+                summary["panel_tickers"] = len(panel.tickers)
+            except Exception:
+                summary["panel_tickers"] = 0
+
+        # Tell every worker (this one included) to rebuild its returns statistics
+        os.makedirs(os.path.dirname(self.marker) or ".", exist_ok=True)
+        with open(self.marker, "w") as f:
+            f.write(f"{os.getpid()}\n")
+
+        summary["elapsed_seconds"] = round(time.time() - started, 2)
+        summary["finished_at"] = time.time()
+        self.last_run = summary
+        self.warm_local(portfolio_sets)
+        return summary
+
+    def warm_local(self, portfolio_sets: Optional[List[List[str]]] = None) -> Dict[str, Any]:
+        """
+        Rebuild this process's returns statistics once per shared warm-up:
+        a no-op until the leader's marker file moves past the last one seen
+        """
+        try:
+            generation = os.path.getmtime(self.marker)
+        except OSError:
+            return {"skipped": True}
+        if not self._local_lock.acquire(blocking=False):
+            return {"skipped": True}
+        try:
+            if generation <= self._local_generation:
+                return {"skipped": True}
+            if portfolio_sets is None:
+                _, portfolio_sets = self.collect_universe()
+
+            returns_stats_service.invalidate()
+            warmed = 0
+            for held in portfolio_sets:
+                try:
+                    returns_stats_service.get(held, self.stats_period)
+                    warmed += 1
+                except Exception:
+                    pass
+            self._local_generation = generation
+            self.last_local_run = {"returns_stats": warmed, "finished_at": time.time()}
+            return self.last_local_run
+        finally:
+            self._local_lock.release()
+
+    def run_if_leader(self) -> Dict[str, Any]:
+        """Scheduled entry point: only the worker holding the leader lock warms"""
+        if not self.leader.acquire():
+            return {"skipped": True, "leader": False}
+        return self.run_once()
+
+    def start(self) -> None:
+        """
+        Warm the shared layers now (after a short delay) and then every
+        SCRAPING_INTERVAL_HOURS, and poll for this worker's local warm-up
+        """
+        if BackgroundScheduler is None or self._scheduler is not None:
+            return
+        self._scheduler = BackgroundScheduler(daemon=True)
+        self._scheduler.add_job(
+            self.run_if_leader, "interval", hours=settings.SCRAPING_INTERVAL_HOURS,
+            next_run_time=datetime.now() + timedelta(seconds=settings.WARMER_START_DELAY_SECONDS),
+            max_instances=1, coalesce=True, id="market_data_warmer"
+        )
+        self._scheduler.add_job(
+            self.warm_local, "interval", seconds=settings.WARMER_LOCAL_POLL_SECONDS,
+            max_instances=1, coalesce=True, id="market_data_warmer_local"
+        )
+        self._scheduler.start()
+
+    def stop(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        self.leader.release()
+
+
+market_data_warmer = MarketDataWarmer()
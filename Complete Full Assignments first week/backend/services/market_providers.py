@@ -0,0 +1,298 @@
+"""
+Market data providers
+
+MarketDataService talks to upstream data through a provider so analytics
+can run against yfinance in production and against local files offline
+(benchmarks, load tests, CI). Select one with MARKET_DATA_PROVIDER.
+"""
+import json
+import os
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+from backend.services.price_store import slice_period
+
+
+class MarketDataProvider(ABC):
+    """Source of bars, quotes and fundamentals"""
+
+    name = "base"
+    # Local providers already read from disk, so the price store is bypassed
+    is_local = False
+
+    @abstractmethod
+    def history(self, ticker: str, period: Optional[str] = None, interval: str = "1d",
+                start: Optional[str] = None) -> pd.DataFrame:
+        """OHLCV bars for one ticker, for a period or from a start date"""
+
+    def download(self, tickers: List[str], interval: str = "1d", period: Optional[str] = None,
+                 start: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """Bars for several tickers; providers with a batch endpoint override this"""
+        return {
+            ticker: self.history(ticker, period=period, interval=interval, start=start)
+            for ticker in tickers
+        }
+
+    @abstractmethod
+    def info(self, ticker: str) -> Dict[str, Any]:
+        """Raw quote/profile fields using yfinance key names"""
+
+    def dividends(self, ticker: str) -> pd.Series:
+        return pd.Series(dtype=float)
+
+    def financials(self, ticker: str) -> Dict[str, pd.DataFrame]:
+        return {
+            "income_statement": pd.DataFrame(),
+            "balance_sheet": pd.DataFrame(),
+            "cash_flow": pd.DataFrame()
+        }
+
+    def recommendations(self, ticker: str) -> pd.DataFrame:
+        return pd.DataFrame()
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance"""
+
+    name = "yfinance"
+
+    def __init__(self):
+        import yfinance as yf
+        self.yf = yf
+
+    def history(self, ticker: str, period: Optional[str] = None, interval: str = "1d",
+                start: Optional[str] = None) -> pd.DataFrame:
+        stock = self.yf.Ticker(ticker)
+        if start is not None:
+            return stock.history(start=start, interval=interval)
+        return stock.history(period=period or "1y", interval=interval)
+
+    def download(self, tickers: List[str], interval: str = "1d", period: Optional[str] = None,
+                 start: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """One batched upstream download, split back into per-ticker bars"""
+        kwargs = {"start": start} if start is not None else {"period": period or "1y"}
+        data = self.yf.download(tickers, interval=interval, group_by='ticker', auto_adjust=True,
+                                actions=True, ignore_tz=False, progress=False, **kwargs)
+        if len(tickers) == 1 and not isinstance(data.columns, pd.MultiIndex):
+            return {tickers[0]: data.dropna(how='all')}
+        return {
+            ticker: data[ticker].dropna(how='all')
+            for ticker in tickers
+            if ticker in data.columns.get_level_values(0)
+        }
+
+    def info(self, ticker: str) -> Dict[str, Any]:
+        return self.yf.Ticker(ticker).info
+
+    def dividends(self, ticker: str) -> pd.Series:
+        return self.yf.Ticker(ticker).dividends
+
+    def financials(self, ticker: str) -> Dict[str, pd.DataFrame]:
+        stock = self.yf.Ticker(ticker)
+        return {
+            "income_statement": stock.financials,
+            "balance_sheet": stock.balance_sheet,
+            "cash_flow": stock.cashflow
+        }
+
+    def recommendations(self, ticker: str) -> pd.DataFrame:
+        return self.yf.Ticker(ticker).recommendations
+
+
+class LocalReplayProvider(MarketDataProvider):
+    """
+    Deterministic offline data.
+
+    Recorded bars are read from <root>/<interval>/<TICKER>.csv (a date index
+    column followed by OHLCV columns), and periods are measured back from the
+    last recorded bar so old recordings replay the same way on any day. Tickers
+    without a recording get a synthetic random walk seeded from the ticker
+    name, so the same ticker always yields the same prices for a given date.
+    """
+
+    name = "replay"
+    is_local = True
+
+    SYNTHETIC_START = "2000-01-03"
+    SYNTHETIC_TZ = "America/New_York"
+    INTRADAY_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30,
+                        "60m": 60, "90m": 90, "1h": 60}
+    INTRADAY_SESSIONS = 30
+    RESAMPLE_RULES = {"5d": "5B", "1wk": "W-FRI", "1mo": "MS", "3mo": "QS"}
+
+    def __init__(self, root: str, synthetic: bool = True):
+        self.root = root
+        self.synthetic = synthetic
+        self._daily_cache: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def history(self, ticker: str, period: Optional[str] = None, interval: str = "1d",
+                start: Optional[str] = None) -> pd.DataFrame:
+        bars = self._load_recorded(ticker, interval)
+        if bars is None:
+            if not self.synthetic:
+                return pd.DataFrame()
+            bars = self._synthetic_bars(ticker, interval)
+
+        if start is not None:
+            start_ts = pd.Timestamp(start)
+            if bars.index.tz is not None:
+                start_ts = start_ts.tz_localize(bars.index.tz)
+            return bars[bars.index >= start_ts]
+        return self._slice_from_end(bars, period or "1y")
+
+    def info(self, ticker: str) -> Dict[str, Any]:
+        path = os.path.join(self.root, "info", f"{ticker.upper()}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+
+        bars = self.history(ticker, period="1y")
+        if bars.empty:
+            raise ValueError(f"No replay data for {ticker}")
+        close = bars["Close"]
+        return {
+            "longName": ticker.upper(),
+            "sector": "",
+            "industry": "",
+            "currentPrice": float(close.iloc[-1]),
+            "marketCap": None,
+            "trailingPE": None,
+            "dividendYield": None,
+            "fiftyTwoWeekHigh": float(close.max()),
+            "fiftyTwoWeekLow": float(close.min())
+        }
+
+    def _load_recorded(self, ticker: str, interval: str) -> Optional[pd.DataFrame]:
+        path = os.path.join(self.root, interval, f"{ticker.upper()}.csv")
+        if not os.path.exists(path):
+            return None
+        bars = pd.read_csv(path, index_col=0)
+        bars.index = pd.to_datetime(bars.index, utc=True).tz_convert(self.SYNTHETIC_TZ)
+        return bars.sort_index()
+
+    @staticmethod
+    def _slice_from_end(bars: pd.DataFrame, period: str) -> pd.DataFrame:
+        """Apply a period relative to the last bar rather than to today"""
+        if bars.empty:
+            return bars
+        end = bars.index[-1]
+        now = pd.Timestamp.now(tz=end.tz) if end.tz is not None else pd.Timestamp.now()
+        shifted = bars.set_axis(bars.index + (now.normalize() - end.normalize()))
+        return bars.iloc[len(bars) - len(slice_period(shifted, period)):]
+
+    @staticmethod
+    def _seed(*parts: str) -> int:
+        return zlib.crc32(":".join(parts).encode())
+
+    def _synthetic_daily(self, ticker: str) -> pd.DataFrame:
+        """Business-day random walk from SYNTHETIC_START through today"""
+        ticker = ticker.upper()
+        today = pd.Timestamp.now(tz=self.SYNTHETIC_TZ).normalize()
+        with self._lock:
+            cached = self._daily_cache.get(ticker)
+            if cached is not None and cached.index[-1] >= today:
+                return cached
+
+        # Weekdays via numpy; pandas' business-day offset generation is a Python loop
+        days = np.arange(np.datetime64(self.SYNTHETIC_START),
+                         np.datetime64(today.date()) + 1, dtype="datetime64[D]")
+        days = days[np.is_busday(days)]
+        dates = pd.DatetimeIndex(days.astype("datetime64[ns]")).tz_localize(self.SYNTHETIC_TZ)
+        n = len(dates)
+        # The stream is generated in date order, so earlier bars never change as days are added
+        rng = np.random.default_rng(self._seed(ticker))
+        annual_vol = rng.uniform(0.15, 0.45)
+        annual_drift = rng.uniform(-0.02, 0.15)
+        start_price = rng.uniform(20, 300)
+        shocks = rng.standard_normal((n, 4))
+
+        daily_vol = annual_vol / np.sqrt(252)
+        log_returns = (annual_drift - 0.5 * annual_vol ** 2) / 252 + daily_vol * shocks[:, 0]
+        close = start_price * np.exp(np.cumsum(log_returns))
+        prev_close = np.concatenate(([start_price], close[:-1]))
+        open_ = prev_close * np.exp(0.25 * daily_vol * shocks[:, 1])
+        high = np.maximum(open_, close) * (1 + 0.5 * daily_vol * np.abs(shocks[:, 2]))
+        low = np.minimum(open_, close) * (1 - 0.5 * daily_vol * np.abs(shocks[:, 3]))
+        volume = np.round(1e6 * np.exp(0.3 * shocks[:, 1]))
+
+        daily = pd.DataFrame({
+            "Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume,
+            "Dividends": 0.0, "Stock Splits": 0.0
+        }, index=pd.DatetimeIndex(dates, name="Date"))
+        with self._lock:
+            self._daily_cache[ticker] = daily
+        return daily
+
+    def _synthetic_bars(self, ticker: str, interval: str) -> pd.DataFrame:
+        daily = self._synthetic_daily(ticker)
+        if interval == "1d":
+            return daily
+        if interval in self.RESAMPLE_RULES:
+            return daily.resample(self.RESAMPLE_RULES[interval]).agg({
+                "Open": "first", "High": "max", "Low": "min", "Close": "last",
+                "Volume": "sum", "Dividends": "sum", "Stock Splits": "sum"
+            }).dropna(subset=["Close"])
+        if interval not in self.INTRADAY_MINUTES:
+            raise ValueError(f"Unsupported interval: {interval}")
+
+        # Intraday bars for recent sessions, each walking from open to that day's close
+        step = self.INTRADAY_MINUTES[interval]
+        frames = []
+        for session, row in daily.iloc[-self.INTRADAY_SESSIONS:].iterrows():
+            times = pd.date_range(session + pd.Timedelta(hours=9, minutes=30),
+                                  session + pd.Timedelta(hours=16), freq=f"{step}min",
+                                  inclusive="left")
+            rng = np.random.default_rng(self._seed(ticker.upper(), interval, str(session.date())))
+            steps = rng.standard_normal(len(times))
+            # Brownian bridge from the session open to the session close
+            path = np.cumsum(steps) - np.linspace(1 / len(times), 1, len(times)) * steps.sum()
+            noise = 0.25 * np.log(row["High"] / row["Low"]) / np.sqrt(len(times))
+            drift = np.linspace(1 / len(times), 1, len(times)) * np.log(row["Close"] / row["Open"])
+            closes = row["Open"] * np.exp(drift + noise * path)
+            opens = np.concatenate(([row["Open"]], closes[:-1]))
+            frames.append(pd.DataFrame({
+                "Open": opens,
+                "High": np.maximum(opens, closes),
+                "Low": np.minimum(opens, closes),
+                "Close": closes,
+                "Volume": np.full(len(times), round(row["Volume"] / len(times))),
+                "Dividends": 0.0,
+                "Stock Splits": 0.0
+            }, index=pd.DatetimeIndex(times, name="Datetime")))
+        return pd.concat(frames)
+
+
+_provider: Optional[MarketDataProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> MarketDataProvider:
+    """The configured provider (created on first use)"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_provider(settings.MARKET_DATA_PROVIDER)
+        return _provider
+
+
+def set_provider(provider: MarketDataProvider) -> None:
+    """Swap the active provider, e.g. to run a benchmark against replay data"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def create_provider(name: str) -> MarketDataProvider:
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "replay":
+        return LocalReplayProvider(settings.MARKET_DATA_REPLAY_PATH,
+                                   synthetic=settings.MARKET_DATA_REPLAY_SYNTHETIC)
+    raise ValueError(f"Unknown market data provider: {name}")
@@ -0,0 +1,455 @@
+"""
+N-asset correlated Monte Carlo VaR engine
+
+Simulates multivariate normal asset returns from a mean vector and a
+covariance factor (Cholesky, or an eigen decomposition when the covariance
+is only positive semi-definite) and aggregates them into portfolio returns.
+A portfolio return is linear in the normals, w' (mu h + sqrt(h) A z), so
+paths are generated in fixed-size chunks of z and reduced with the single
+vector A' w; asset returns are never formed for the whole run. Only the
+worst portfolio returns and their path numbers are carried between chunks.
+Attribution then replays the seeded streams and rebuilds asset returns for
+just the tail paths it averages over. Memory is chunk_size x assets for the
+normals plus about (1 - confidence) x num_simulations tail values.
+Both run methods can also hand back the first `sample` portfolio returns
+they simulated, e.g. for a histogram of the distribution the VaR came from.
+
+run_adaptive adds variance reduction: antithetic pairs, randomized
+quasi-Monte Carlo (scrambled Sobol/Halton) and a batch control variate:
+each batch's normal (parametric) VaR/ES, whose true values are known in
+closed form from the weights and covariance. Independent batches
+give a standard error, and the run can stop once it is below a tolerance.
+
+Runs can be split across a process pool. Every run derives one child
+SeedSequence per worker, and each worker returns only its own worst
+portfolio returns plus running sums, so the merged tail is exact and a
+given (seed, workers) pair always reproduces the same result. Attribution
+sends each worker its tail path numbers back and receives two
+assets-length sums.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import stats
+from scipy.stats import qmc
+
+from backend.config import settings
+
+
+SAMPLING_METHODS = ["pseudo", "antithetic", "sobol", "halton"]
+# Largest run_adaptive batch; smaller runs are split so they still get min_batches
+MAX_BATCH_SIZE = 2 ** 14
+# z-score for the order-statistic standard error (95% band / 2 / 1.96)
+_Z95 = 1.959963984540054
+
+
+def normal_chunks(seed_sequence: np.random.SeedSequence, dimension: int,
+                  num_simulations: int, chunk_size: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """(first path number, standard normals) for each chunk of one seeded stream"""
+    rng = np.random.default_rng(seed_sequence)
+    for start in range(0, num_simulations, chunk_size):
+        yield start, rng.standard_normal((min(chunk_size, num_simulations - start), dimension))
+
+
+def simulate_tail(mean: np.ndarray, factor: np.ndarray, weights: np.ndarray,
+                  num_simulations: int, keep: int, chunk_size: int, horizon: int,
+                  seed_sequence: np.random.SeedSequence, sample: int = 0):
+    """
+    Simulate num_simulations paths in chunks and return the `keep` worst
+    portfolio returns with their path numbers, sum and sum of squares of
+    all portfolio returns, and the first `sample` of them. Module level so
+    process pools can pickle it.
+    """
+    drift = float(mean @ weights) * horizon
+    loading = (factor.T @ weights) * math.sqrt(horizon)
+    tail_portfolio = np.empty(0)
+    tail_rows = np.empty(0, dtype=np.int64)
+    head = []
+    total = total_sq = 0.0
+    for start, z in normal_chunks(seed_sequence, len(mean), num_simulations, chunk_size):
+        portfolio = drift + z @ loading
+        total += portfolio.sum()
+        total_sq += portfolio @ portfolio
+        if start < sample:
+            head.append(portfolio[:sample - start])
+        tail_portfolio, tail_rows = merge_tails(
+            [tail_portfolio, portfolio], [tail_rows, start + np.arange(len(z))], keep
+        )
+    return tail_portfolio, tail_rows, total, total_sq, np.concatenate(head) if head else np.empty(0)
+
+
+def merge_tails(portfolios: List[np.ndarray], rows: List[np.ndarray], keep: int):
+    """The `keep` lowest portfolio returns (and their path numbers) across several partial tails"""
+    candidates = np.concatenate(portfolios)
+    paths = np.concatenate(rows)
+    if len(candidates) > keep:
+        worst = np.sort(np.argpartition(candidates, keep - 1)[:keep])
+        return candidates[worst], paths[worst]
+    return candidates, paths
+
+
+def row_contributions(chunks: Iterator[Tuple[int, np.ndarray]], mean: np.ndarray,
+                      factor: np.ndarray, weights: np.ndarray, horizon: int,
+                      row_sets: List[np.ndarray]) -> np.ndarray:
+    """
+    Summed weighted asset returns over each set of path numbers. The chunks
+    are regenerated from their seed, and asset returns are rebuilt only for
+    the requested paths.
+    """
+    sums = np.zeros((len(row_sets), len(weights)))
+    wanted = reduce(np.union1d, row_sets, np.empty(0, dtype=np.int64))
+    if len(wanted) == 0:
+        return sums
+    for start, z in chunks:
+        if start > wanted[-1]:
+            break
+        rows = wanted[(wanted >= start) & (wanted < start + len(z))]
+        if len(rows) == 0:
+            continue
+        weighted = (mean * horizon + (z[rows - start] @ factor.T) * math.sqrt(horizon)) * weights
+        for k, selected in enumerate(row_sets):
+            sums[k] += weighted[np.isin(rows, selected)].sum(axis=0)
+    return sums
+
+
+def stream_contributions(mean: np.ndarray, factor: np.ndarray, weights: np.ndarray,
+                         num_simulations: int, chunk_size: int, horizon: int,
+                         seed_sequence: np.random.SeedSequence,
+                         row_sets: List[np.ndarray]) -> np.ndarray:
+    """row_contributions for one simulate_tail stream (module level for the process pool)"""
+    chunks = normal_chunks(seed_sequence, len(mean), num_simulations, chunk_size)
+    return row_contributions(chunks, mean, factor, weights, horizon, row_sets)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for simulations and batch optimizations, created on
+    first use and replaced once broken (a worker that died, e.g. OOM-killed,
+    fails every later submit on the old pool)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and getattr(_pool, "_broken", False):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=default_workers())
+        return _pool
+
+
+def default_workers() -> int:
+    return settings.MONTE_CARLO_WORKERS or os.cpu_count() or 1
+
+
+class MonteCarloEngine:
+    """Chunked correlated-returns simulator for portfolio VaR/ES"""
+
+    def __init__(self, mean_returns, cov_matrix, chunk_size: int = None,
+                 factorization: str = "auto", seed: Optional[int] = None):
+        self.mean = np.asarray(mean_returns, dtype=float)
+        self.cov = np.asarray(cov_matrix, dtype=float)
+        if self.cov.shape != (len(self.mean), len(self.mean)):
+            raise ValueError("Covariance must be square and match the mean vector")
+        self.chunk_size = chunk_size or settings.MONTE_CARLO_CHUNK_SIZE
+        self.factor, self.factorization = self.factorize(self.cov, factorization)
+        self.rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def factorize(cov: np.ndarray, method: str = "auto"):
+        """
+        Matrix A with A @ A.T == cov. "auto" tries Cholesky and falls back to
+        the eigen decomposition (negative eigenvalues clipped to zero).
+        """
+        if method in ("auto", "cholesky"):
+            try:
+                return np.linalg.cholesky(cov), "cholesky"
+            except np.linalg.LinAlgError:
+                if method == "cholesky":
+                    raise
+        elif method != "eigen":
+            raise ValueError(f"Unknown factorization: {method}")
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None)), "eigen"
+
+    def simulate_chunk(self, size: int, horizon: int = 1) -> np.ndarray:
+        """size x assets simulated returns over horizon days"""
+        z = self.rng.standard_normal((size, len(self.mean)))
+        return self.mean * horizon + (z @ self.factor.T) * math.sqrt(horizon)
+
+    def _portfolio_paths(self, z: np.ndarray, w: np.ndarray, horizon: int) -> np.ndarray:
+        """Portfolio returns of a chunk of normals, without forming asset returns"""
+        return float(self.mean @ w) * horizon + z @ ((self.factor.T @ w) * math.sqrt(horizon))
+
+    def run(self, weights: List[float], confidence_level: float = 0.95,
+            num_simulations: int = 100_000, horizon: int = 1,
+            workers: int = 1, seed: Optional[int] = None, sample: int = 0) -> Dict[str, Any]:
+        """
+        Portfolio VaR/ES with per-asset contributions.
+
+        VaR uses the same linear interpolation as np.percentile. ES
+        contributions are each asset's average weighted return over the tail
+        scenarios (they sum to ES); VaR contributions average the scenarios
+        ranked around the VaR quantile and are scaled to sum to VaR.
+
+        With workers > 1 the paths are split across the shared process pool;
+        workers is capped at the pool size. Passing a seed makes the result
+        repeatable for that worker count. With sample > 0 the result's
+        "sample" holds that many of the simulated portfolio returns.
+        """
+        w = np.asarray(weights, dtype=float)
+        if len(w) != len(self.mean):
+            raise ValueError("Weights must match the number of assets")
+
+        var_rank = int(math.floor((1 - confidence_level) * (num_simulations - 1)))
+        band = self._tail_band(confidence_level, num_simulations)
+        keep = min(num_simulations, var_rank + band + 2)
+
+        workers = max(1, min(workers or default_workers(), default_workers(), num_simulations))
+        if seed is None:
+            seed = int(self.rng.integers(2 ** 63))
+        streams = np.random.SeedSequence(seed).spawn(workers)
+        sizes = [num_simulations // workers + (i < num_simulations % workers) for i in range(workers)]
+        args = [(self.mean, self.factor, w, size, min(keep, size), self.chunk_size, horizon, stream, sample)
+                for size, stream in zip(sizes, streams)]
+        if workers == 1:
+            partials = [simulate_tail(*args[0])]
+        else:
+            partials = list(get_pool().map(simulate_tail, *zip(*args)))
+
+        # Path numbers run across streams: stream k owns [offsets[k], offsets[k] + sizes[k])
+        offsets = np.cumsum([0] + sizes[:-1])
+        tail_portfolio, tail_rows = merge_tails(
+            [p[0] for p in partials], [p[1] + offset for p, offset in zip(partials, offsets)], keep
+        )
+        total = sum(p[2] for p in partials)
+        total_sq = sum(p[3] for p in partials)
+
+        def contributions(row_sets: List[np.ndarray]) -> np.ndarray:
+            per_stream = [[rows[(rows >= lo) & (rows < lo + size)] - lo for rows in row_sets]
+                          for lo, size in zip(offsets, sizes)]
+            replay = [(self.mean, self.factor, w, size, self.chunk_size, horizon, stream, sets)
+                      for size, stream, sets in zip(sizes, streams, per_stream)]
+            if workers == 1:
+                return stream_contributions(*replay[0])
+            return sum(get_pool().map(stream_contributions, *zip(*replay)))
+
+        result = self._summarize(tail_portfolio, tail_rows, contributions, w, confidence_level,
+                                 num_simulations, total, total_sq, band)
+        result.update({"horizon": horizon, "workers": workers, "seed": seed,
+                       "sampling": "pseudo", "control_variate": False})
+        if sample:
+            result["sample"] = np.concatenate([p[4] for p in partials])[:sample].tolist()
+        return result
+
+    @staticmethod
+    def _tail_band(confidence_level: float, num_simulations: int) -> int:
+        """
+        Scenarios kept either side of the VaR rank: enough for the VaR
+        contributions and for the order-statistic standard error band
+        """
+        p = 1 - confidence_level
+        error_band = math.ceil(_Z95 * math.sqrt(num_simulations * p * (1 - p))) + 1
+        return max(1, int(0.0005 * num_simulations), error_band)
+
+    def _summarize(self, tail_portfolio: np.ndarray, tail_rows: np.ndarray,
+                   contributions: Callable[[List[np.ndarray]], np.ndarray], w: np.ndarray,
+                   confidence_level: float, num_simulations: int, total: float,
+                   total_sq: float, band: int) -> Dict[str, Any]:
+        """
+        VaR, ES, contributions and moments from the merged worst scenarios.
+        contributions sums the weighted asset returns of given path numbers.
+        """
+        p = 1 - confidence_level
+        position = p * (num_simulations - 1)
+        var_rank = int(math.floor(position))
+
+        order = np.argsort(tail_portfolio, kind="stable")
+        tail_portfolio, tail_rows = tail_portfolio[order], tail_rows[order]
+
+        upper = min(var_rank + 1, len(tail_portfolio) - 1)
+        var = tail_portfolio[var_rank] + (position - var_rank) * (tail_portfolio[upper] - tail_portfolio[var_rank])
+
+        in_tail = tail_portfolio <= var
+        if not in_tail.any():
+            in_tail[0] = True
+        es = tail_portfolio[in_tail].mean()
+
+        near = slice(max(0, var_rank - band), min(len(tail_portfolio), var_rank + band + 1))
+        sums = contributions([tail_rows[in_tail], tail_rows[near]])
+        es_contributions = sums[0] / in_tail.sum()
+        near_contributions = sums[1] / len(tail_rows[near])
+        near_total = near_contributions.sum()
+        var_contributions = near_contributions * (var / near_total) if near_total else near_contributions
+
+        # Distribution-free standard error from the binomial band of order statistics
+        m = math.ceil(_Z95 * math.sqrt(num_simulations * p * (1 - p)))
+        lo, hi = max(0, var_rank - m), min(len(tail_portfolio) - 1, var_rank + m + 1)
+        standard_error = (tail_portfolio[hi] - tail_portfolio[lo]) / (2 * _Z95)
+
+        mean = total / num_simulations
+        std = math.sqrt(max(total_sq / num_simulations - mean ** 2, 0.0) * num_simulations / max(num_simulations - 1, 1))
+        return {
+            "var": float(var),
+            "expected_shortfall": float(es),
+            "standard_error": float(standard_error),
+            "mean": float(mean),
+            "std": float(std),
+            "simulations": num_simulations,
+            "factorization": self.factorization,
+            "var_contributions": var_contributions.tolist(),
+            "es_contributions": es_contributions.tolist()
+        }
+
+    def _normals(self, size: int, sampling: str, rng: np.random.Generator) -> np.ndarray:
+        """size x assets standard normals for one batch"""
+        d = len(self.mean)
+        if sampling == "pseudo":
+            return rng.standard_normal((size, d))
+        if sampling == "antithetic":
+            half = rng.standard_normal((size - size // 2, d))
+            return np.vstack([half, -half[:size // 2]])
+        if sampling in ("sobol", "halton"):
+            # A freshly scrambled sequence per batch keeps batches independent
+            engine = qmc.Sobol(d, scramble=True, seed=rng) if sampling == "sobol" else qmc.Halton(d, scramble=True, seed=rng)
+            u = engine.random(size)
+            return stats.norm.ppf(np.clip(u, 1e-12, 1 - 1e-12))
+        raise ValueError(f"Unknown sampling method: {sampling}")
+
+    def _batches(self, seed: int, batch_size: int, sampling: str,
+                 count: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """(first path number, normals) for each batch; replaying a seed repeats them exactly"""
+        rng = np.random.default_rng(np.random.SeedSequence(seed))
+        for n in range(count):
+            yield n * batch_size, self._normals(batch_size, sampling, rng)
+
+    def run_adaptive(self, weights: List[float], confidence_level: float = 0.95,
+                     max_simulations: int = 1_000_000, sampling: str = "pseudo",
+                     control_variate: bool = False, tolerance: Optional[float] = None,
+                     batch_size: Optional[int] = None, min_batches: int = 8, horizon: int = 1,
+                     seed: Optional[int] = None, sample: int = 0) -> Dict[str, Any]:
+        """
+        Variance-reduced VaR/ES in independent batches of batch_size paths.
+
+        The standard error comes from the spread of the batch estimates
+        (after the control-variate adjustment when enabled), so every run has
+        at least min_batches of them. By default batches are
+        max_simulations // min_batches paths, up to MAX_BATCH_SIZE, and
+        Sobol batches are rounded down to a power of two. With a tolerance
+        the run stops as soon as the standard error of VaR is at or below it,
+        otherwise after max_simulations paths. Raises ValueError when
+        max_simulations cannot form min_batches batches with at least one
+        tail scenario each. sample works as in run().
+        """
+        w = np.asarray(weights, dtype=float)
+        if len(w) != len(self.mean):
+            raise ValueError("Weights must match the number of assets")
+        if sampling not in SAMPLING_METHODS:
+            raise ValueError(f"Unknown sampling method: {sampling}")
+
+        p = 1 - confidence_level
+        min_batches = max(min_batches, 3 if control_variate else 2)
+        if batch_size is None:
+            batch_size = min(MAX_BATCH_SIZE, max_simulations // min_batches)
+        if sampling == "sobol" and batch_size >= 1:
+            batch_size = 2 ** int(math.log2(batch_size))
+        max_batches = max_simulations // batch_size if batch_size >= 1 else 0
+        if max_batches < min_batches or batch_size * p < 1:
+            raise ValueError(
+                f"num_simulations must allow {min_batches} batches of at least "
+                f"{math.ceil(1 / p)} paths at this confidence level"
+            )
+        band = self._tail_band(confidence_level, max_batches * batch_size)
+        keep = min(max_batches * batch_size, int(p * max_batches * batch_size) + band + 2)
+        z_p = stats.norm.ppf(p)
+        known_mean = float(w @ self.mean) * horizon
+        known_std = math.sqrt(max(float(w @ self.cov @ w), 0.0) * horizon)
+        known_var, known_es = known_mean + z_p * known_std, known_mean - known_std * stats.norm.pdf(z_p) / p
+
+        if seed is None:
+            seed = int(self.rng.integers(2 ** 63))
+        batch_rank = p * (batch_size - 1)
+
+        tail_portfolio, tail_rows = np.empty(0), np.empty(0, dtype=np.int64)
+        head = []
+        total = total_sq = 0.0
+        batch_stats, controls = [], []
+        standard_error = None
+        for n, (start, z) in enumerate(self._batches(seed, batch_size, sampling, max_batches), 1):
+            portfolio = self._portfolio_paths(z, w, horizon)
+            total += portfolio.sum()
+            total_sq += portfolio @ portfolio
+            if start < sample:
+                head.append(portfolio[:sample - start])
+            tail_portfolio, tail_rows = merge_tails(
+                [tail_portfolio, portfolio], [tail_rows, start + np.arange(batch_size)], keep
+            )
+
+            lo = int(math.floor(batch_rank))
+            part = np.partition(portfolio, [lo, min(lo + 1, batch_size - 1)])
+            batch_var = part[lo] + (batch_rank - lo) * (part[min(lo + 1, batch_size - 1)] - part[lo])
+            batch_es = portfolio[portfolio <= batch_var].mean()
+            batch_stats.append((batch_var, batch_es))
+            batch_mean, batch_std = portfolio.mean(), portfolio.std(ddof=1)
+            controls.append((batch_mean + z_p * batch_std - known_var,
+                             batch_mean - batch_std * stats.norm.pdf(z_p) / p - known_es))
+
+            if n >= 2:
+                adjustment, errors = self._batch_errors(np.array(batch_stats), np.array(controls), control_variate)
+                standard_error = errors[0]
+                if tolerance is not None and n >= min_batches and standard_error <= tolerance:
+                    break
+
+        simulations = n * batch_size
+        result = self._summarize(
+            tail_portfolio, tail_rows,
+            lambda row_sets: row_contributions(self._batches(seed, batch_size, sampling, n),
+                                               self.mean, self.factor, w, horizon, row_sets),
+            w, confidence_level, simulations, total, total_sq, band
+        )
+        if n >= 2:
+            result["var"] -= float(adjustment[0])
+            result["expected_shortfall"] -= float(adjustment[1])
+            result["standard_error"] = float(standard_error)
+            result["es_standard_error"] = float(errors[1])
+        result.update({
+            "horizon": horizon,
+            "workers": 1,
+            "seed": seed,
+            "sampling": sampling,
+            "control_variate": control_variate,
+            "batches": n,
+            "batch_size": batch_size,
+            "tolerance": tolerance,
+            "converged": tolerance is not None and standard_error is not None and standard_error <= tolerance
+        })
+        if sample:
+            result["sample"] = np.concatenate(head).tolist()
+        return result
+
+    @staticmethod
+    def _batch_errors(batch_stats: np.ndarray, controls: np.ndarray, control_variate: bool):
+        """
+        Control-variate adjustment to subtract from the pooled (VaR, ES) and
+        their standard errors, from independent batch estimates. Each
+        statistic has one control with known mean zero.
+        """
+        n = len(batch_stats)
+        plain = batch_stats.std(axis=0, ddof=1) / math.sqrt(n)
+        if not control_variate or n < 3:
+            return np.zeros(2), plain
+        centered = controls - controls.mean(axis=0)
+        spread = (centered ** 2).sum(axis=0)
+        beta = np.divide((centered * (batch_stats - batch_stats.mean(axis=0))).sum(axis=0), spread,
+                         out=np.zeros(2), where=spread > 0)
+        adjustment = beta * controls.mean(axis=0)
+        residuals = batch_stats - beta * controls
+        return adjustment, np.where(spread > 0, residuals.std(axis=0, ddof=2) / math.sqrt(n), plain)
@@ -0,0 +1,303 @@
+"""
+Long-only mean-variance solvers
+
+Minimum variance and maximum Sharpe are convex quadratic programs once
+max-Sharpe is rewritten in the standard way: minimize y' Sigma y subject to
+(mu - rf)' y = 1, y >= 0, then normalize w = y / sum(y). Both are solved by
+accelerated projected gradient (FISTA with adaptive restart). Each step is
+one covariance-vector product plus an exact projection onto
+{x >= 0, a' x = 1}, an O(N log N) sort over the breakpoints. The iterates
+identify which weights sit at a bound long before they converge, so once
+that active set has held for a few steps the solver solves the equality
+constrained problem on the free weights exactly (one small KKT system) and
+stops if the result satisfies the full problem's optimality conditions.
+
+mean_variance solves the risk-aversion form, max mu' w - (gamma / 2) w' Sigma w,
+under per-asset weight bounds. The projection onto
+{lower <= x <= upper, sum x = 1} is also exact, from one sort.
+solve_spec is the module-level entry point the batch optimizer sends
+to the process pool.
+
+sharpe_objective gives negative Sharpe and its analytic gradient for
+general-purpose solvers such as SLSQP.
+"""
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse.linalg import eigsh
+
+# Steps the active set must hold unchanged before an exact solve is tried
+ACTIVE_SET_STABLE_STEPS = 5
+# Largest free set solved exactly; bigger ones keep iterating
+MAX_ACTIVE_SET = 1500
+
+
+def project_budget(v: np.ndarray, a: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Euclidean projection of v onto {x >= 0, a' x = 1}; with a = 1 this is
+    the probability simplex. The projection is max(v - tau a, 0) for the
+    tau where a' x = 1, found on the piecewise-linear path between the
+    sorted breakpoints v_i / a_i.
+    """
+    if a is None:
+        a = np.ones_like(v)
+    moving = a != 0
+    av, aa = a[moving] * v[moving], a[moving] ** 2
+    breakpoints = v[moving] / a[moving]
+    order = np.argsort(breakpoints)
+    breakpoints, av, aa = breakpoints[order], av[order], aa[order]
+    positive = a[moving][order] > 0
+    if not positive.any():
+        raise ValueError("Budget constraint is infeasible: no positive coefficient")
+
+    # Left of every breakpoint only the positive-a coordinates are active;
+    # crossing a breakpoint drops a positive one or adds a negative one
+    sign = np.where(positive, -1.0, 1.0)
+    slope_sum = aa[positive].sum() + np.concatenate(([0.0], np.cumsum(sign * aa)))
+    level_sum = av[positive].sum() + np.concatenate(([0.0], np.cumsum(sign * av)))
+    # budget(tau) = level_sum - tau * slope_sum is non-increasing in tau
+    at_breakpoints = level_sum[:-1] - breakpoints * slope_sum[:-1]
+    k = int(np.searchsorted(-at_breakpoints, -1.0))
+    tau = (level_sum[k] - 1.0) / slope_sum[k]
+    return np.maximum(v - tau * a, 0.0)
+
+
+def project_box_budget(v: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Euclidean projection of v onto {lower <= x <= upper, sum x = 1}:
+    x = clip(v - tau, lower, upper), with tau found between the sorted
+    breakpoints v - upper (x_i leaves its cap) and v - lower (x_i reaches its floor)
+    """
+    at_upper, at_lower = v - upper, v - lower
+    order_u, order_l = np.argsort(at_upper), np.argsort(at_lower)
+    sorted_u, sorted_l = at_upper[order_u], at_lower[order_l]
+    cum_upper = np.concatenate(([0.0], np.cumsum(upper[order_u])))
+    cum_v_u = np.concatenate(([0.0], np.cumsum(v[order_u])))
+    cum_lower = np.concatenate(([0.0], np.cumsum(lower[order_l])))
+    cum_v_l = np.concatenate(([0.0], np.cumsum(v[order_l])))
+
+    # total(tau) = sum of caps still binding + floors reached + v_i - tau in between;
+    # it is piecewise linear and non-increasing, so evaluate it at every breakpoint
+    taus = np.sort(np.concatenate((at_upper, at_lower)))
+    left_u = np.searchsorted(sorted_u, taus, side="left")
+    left_l = np.searchsorted(sorted_l, taus, side="left")
+    totals = ((cum_upper[-1] - cum_upper[left_u]) + cum_lower[left_l]
+              + (cum_v_u[left_u] - cum_v_l[left_l]) - taus * (left_u - left_l))
+    k = int(np.searchsorted(-totals, -1.0))
+    if k == 0:
+        tau = taus[0]
+    elif k == len(taus):
+        tau = taus[-1]
+    else:
+        span = totals[k - 1] - totals[k]
+        tau = taus[k - 1] + ((totals[k - 1] - 1.0) / span * (taus[k] - taus[k - 1]) if span > 0 else 0.0)
+    return np.clip(v - tau, lower, upper)
+
+
+def largest_eigenvalue(matrix: np.ndarray) -> float:
+    if len(matrix) <= 64:
+        return float(np.linalg.eigvalsh(matrix)[-1])
+    return float(eigsh(matrix, k=1, which="LA", return_eigenvectors=False, tol=1e-6)[0])
+
+
+def solve_active_set(quadratic: np.ndarray, linear: np.ndarray, a: np.ndarray,
+                     lower: np.ndarray, upper: np.ndarray, x: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Minimizer of x' Q x - c' x subject to a' x = 1 with the weights that sit
+    at a bound in x held there, or None unless it is strictly inside the
+    bounds on the free weights and meets the KKT conditions of the problem
+    over lower <= x <= upper
+    """
+    at_lower, at_upper = x <= lower, x >= upper
+    free = ~(at_lower | at_upper)
+    k = int(free.sum())
+    if k == 0 or k > MAX_ACTIVE_SET:
+        return None
+    fixed = np.where(at_lower, lower, np.where(at_upper, upper, 0.0))
+
+    # 2 Q_FF x_F - nu a_F = c_F - 2 Q_FB x_B,  a_F' x_F = 1 - a_B' x_B
+    kkt = np.zeros((k + 1, k + 1))
+    kkt[:k, :k] = 2.0 * quadratic[np.ix_(free, free)]
+    kkt[:k, k] = -a[free]
+    kkt[k, :k] = a[free]
+    rhs = np.empty(k + 1)
+    rhs[:k] = linear[free] - 2.0 * (quadratic[free] @ fixed)
+    rhs[k] = 1.0 - a[~free] @ fixed[~free]
+    try:
+        solution = np.linalg.solve(kkt, rhs)
+    except np.linalg.LinAlgError:
+        return None
+    # A (nearly) singular block gives no trustworthy solution
+    if not np.all(np.isfinite(solution)) or \
+            np.max(np.abs(kkt @ solution - rhs)) > 1e-9 * max(1.0, np.max(np.abs(rhs))):
+        return None
+
+    candidate = fixed.copy()
+    candidate[free] = solution[:k]
+    if (candidate[free] <= lower[free]).any() or (candidate[free] >= upper[free]).any():
+        return None
+    # Multipliers of the bound weights must push them against their bounds
+    gradient = 2.0 * (quadratic @ candidate) - linear - solution[k] * a
+    slack = 1e-9 * max(1.0, np.max(np.abs(linear)), abs(solution[k]) * np.max(np.abs(a)))
+    if (gradient[at_lower] < -slack).any() or (gradient[at_upper] > slack).any():
+        return None
+    return candidate
+
+
+def projected_gradient(quadratic: np.ndarray, linear: np.ndarray,
+                       project: Callable[[np.ndarray], np.ndarray], x0: np.ndarray,
+                       max_iter: int = 20000, tol: float = 1e-10,
+                       lipschitz: Optional[float] = None,
+                       constraint: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+                       ) -> Tuple[np.ndarray, int, bool]:
+    """
+    Minimize x' Q x - c' x over a convex set by FISTA, restarting the
+    momentum whenever it points uphill. Stops once a step moves no
+    coordinate by more than tol (relative to the iterate's scale). When the
+    set is {a' x = 1, lower <= x <= upper}, given as constraint=(a, lower,
+    upper), it also stops at the exact solution on a stable active set.
+    """
+    step = 1.0 / (2.0 * (lipschitz if lipschitz is not None else largest_eigenvalue(quadratic)) * 1.01)
+    x = project(x0)
+    y, t = x.copy(), 1.0
+    status, stable = None, 0
+    for iteration in range(1, max_iter + 1):
+        gradient = 2.0 * (quadratic @ y) - linear
+        x_next = project(y - step * gradient)
+        change = x_next - x
+        if np.max(np.abs(change)) <= tol * max(1.0, np.max(np.abs(x_next))):
+            return x_next, iteration, True
+        if constraint is not None:
+            a, lower, upper = constraint
+            next_status = (x_next >= upper).astype(np.int8) - (x_next <= lower)
+            stable = stable + 1 if status is not None and np.array_equal(next_status, status) else 0
+            status = next_status
+            if stable == ACTIVE_SET_STABLE_STEPS:
+                exact = solve_active_set(quadratic, linear, a, lower, upper, x_next)
+                if exact is not None:
+                    return exact, iteration, True
+        if gradient @ change > 0:
+            t = 1.0
+            y = x_next
+        else:
+            t_next = (1.0 + math.sqrt(1.0 + 4.0 * t * t)) / 2.0
+            y = x_next + ((t - 1.0) / t_next) * change
+            t = t_next
+        x = x_next
+    return x, max_iter, False
+
+
+def min_variance(cov: np.ndarray, x0: Optional[np.ndarray] = None, **kwargs) -> Dict[str, Any]:
+    """Long-only fully invested minimum-variance weights"""
+    started = time.perf_counter()
+    n = len(cov)
+    x0 = x0 if x0 is not None else np.full(n, 1.0 / n)
+    weights, iterations, converged = projected_gradient(
+        cov, np.zeros(n), project_budget, x0,
+        constraint=(np.ones(n), np.zeros(n), np.full(n, np.inf)), **kwargs
+    )
+    return {
+        "weights": weights,
+        "iterations": iterations,
+        "converged": converged,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+
+def max_sharpe(mean: np.ndarray, cov: np.ndarray, risk_free_rate: float = 0.0,
+               x0: Optional[np.ndarray] = None, **kwargs) -> Dict[str, Any]:
+    """
+    Long-only maximum-Sharpe weights via the convex reformulation. Needs at
+    least one asset with an expected return above the risk-free rate.
+    """
+    started = time.perf_counter()
+    excess = np.asarray(mean, dtype=float) - risk_free_rate
+    if not (excess > 0).any():
+        raise ValueError("No asset has an expected return above the risk-free rate")
+
+    n = len(cov)
+    start = x0 if x0 is not None else np.full(n, 1.0 / n)
+    # Scale the start onto the constraint set when it has positive excess return
+    scale = excess @ start
+    start = start / scale if scale > 0 else start
+    y, iterations, converged = projected_gradient(
+        cov, np.zeros(n), lambda v: project_budget(v, excess), start,
+        constraint=(excess, np.zeros(n), np.full(n, np.inf)), **kwargs
+    )
+    return {
+        "weights": y / y.sum(),
+        "iterations": iterations,
+        "converged": converged,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+
+def mean_variance(mean: np.ndarray, cov: np.ndarray, risk_aversion: float,
+                  lower: Optional[np.ndarray] = None, upper: Optional[np.ndarray] = None,
+                  x0: Optional[np.ndarray] = None, **kwargs) -> Dict[str, Any]:
+    """Fully invested weights maximizing mu' w - (risk_aversion / 2) w' Sigma w within bounds"""
+    started = time.perf_counter()
+    if risk_aversion <= 0:
+        raise ValueError("risk_aversion must be positive")
+    n = len(cov)
+    lower = np.zeros(n) if lower is None else np.asarray(lower, dtype=float)
+    upper = np.ones(n) if upper is None else np.asarray(upper, dtype=float)
+    if (lower > upper).any() or lower.sum() > 1.0 + 1e-12 or upper.sum() < 1.0 - 1e-12:
+        raise ValueError("Weight bounds are infeasible: they must allow weights summing to 1")
+    x0 = x0 if x0 is not None else np.full(n, 1.0 / n)
+    weights, iterations, converged = projected_gradient(
+        0.5 * risk_aversion * np.asarray(cov, dtype=float), np.asarray(mean, dtype=float),
+        lambda v: project_box_budget(v, lower, upper), x0,
+        constraint=(np.ones(n), lower, upper), **kwargs
+    )
+    return {
+        "weights": weights,
+        "iterations": iterations,
+        "converged": converged,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+
+def solve_spec(spec_id: str, tickers: List[str], mean: np.ndarray, cov: np.ndarray,
+               risk_aversion: float, lower: np.ndarray, upper: np.ndarray,
+               risk_free_rate: float = 0.0) -> Dict[str, Any]:
+    """
+    One batch optimization, summarized like PortfolioService.optimize_portfolio.
+    Module level so process pools can pickle it; errors come back as results.
+    """
+    try:
+        result = mean_variance(mean, cov, risk_aversion, lower, upper)
+    except ValueError as e:
+        return {"id": spec_id, "status": "error", "detail": str(e)}
+    weights = result["weights"]
+    expected_return = float(mean @ weights)
+    volatility = float(math.sqrt(max(float(weights @ cov @ weights), 0.0)))
+    return {
+        "id": spec_id,
+        "status": "success",
+        "allocation": {ticker: float(weight) for ticker, weight in zip(tickers, weights)},
+        "expected_return": expected_return,
+        "volatility": volatility,
+        "sharpe_ratio": (expected_return - risk_free_rate) / volatility if volatility > 0 else 0.0,
+        "risk_aversion": risk_aversion,
+        "solver": {"method": "projected_gradient", "iterations": result["iterations"],
+                   "converged": result["converged"], "elapsed_ms": result["elapsed_ms"]}
+    }
+
+
+def sharpe_objective(mean: np.ndarray, cov: np.ndarray,
+                     risk_free_rate: float = 0.0) -> Callable[[np.ndarray], Tuple[float, np.ndarray]]:
+    """Negative Sharpe ratio and its gradient, for minimize(..., jac=True)"""
+    mean = np.asarray(mean, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+
+    def objective(weights: np.ndarray) -> Tuple[float, np.ndarray]:
+        cov_w = cov @ weights
+        volatility = math.sqrt(max(float(weights @ cov_w), 1e-18))
+        excess = float(mean @ weights) - risk_free_rate
+        gradient = mean / volatility - excess * cov_w / volatility ** 3
+        return -excess / volatility, -gradient
+
+    return objective
@@ -3,9 +3,24 @@ Portfolio management service
 """
 import pandas as pd
 import numpy as np
+import time
+from concurrent.futures import Future
 from scipy.optimize import minimize
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from backend.config import settings
+from backend.services import portfolio_optimizer
+from backend.services.efficient_frontier import downsample, exact_frontier, random_cloud
 from backend.services.market_data import MarketDataService
+from backend.services.monte_carlo_engine import get_pool
+from backend.services.returns_stats import returns_stats_service
+from backend.services.var_calculator import VaRCalculator
+
+
+OBJECTIVES = ["max_sharpe", "min_variance"]
+SOLVERS = ["qp", "slsqp"]
+FRONTIER_OUTPUTS = ["records", "arrays"]
+FRONTIER_MODES = ["random", "exact"]
+EXACT_FRONTIER_MAX_POINTS = 1000
 
 
 class PortfolioService:
@@ -13,6 +28,7 @@ class PortfolioService:
     
     def __init__(self):
         self.market_data = MarketDataService()
+        self.returns_stats = returns_stats_service
     
     def calculate_portfolio_return(self, holdings: List[Dict[str, Any]]) -> float:
         """
@@ -20,54 +36,49 @@ class PortfolioService:
         
         Holdings format: [{'ticker': 'AAPL', 'quantity': 10, 'purchase_price': 150}]
         """
-        total_return = 0
-        total_investment = 0
+        if not holdings:
+            return 0.0
         
-        for holding in holdings:
-            ticker = holding['ticker']
-            quantity = holding['quantity']
-            purchase_price = holding['purchase_price']
-            
-            # Get current price
-            current_price = self.market_data.get_stock_info(ticker)['current_price']
-            
-            investment = quantity * purchase_price
-            current_value = quantity * current_price
-            
-            total_investment += investment
-            total_return += (current_value - investment)
+        tickers = [holding['ticker'] for holding in holdings]
+        quantities = np.array([holding['quantity'] for holding in holdings], dtype=float)
+        purchase_prices = np.array([holding['purchase_price'] for holding in holdings], dtype=float)
+        
+        # Get current prices in one batch
+        current_prices = self._current_prices(tickers)
+        
+        investment = quantities * purchase_prices
+        total_investment = investment.sum()
+        total_return = (quantities * current_prices - investment).sum()
         
         return_pct = (total_return / total_investment * 100) if total_investment > 0 else 0
         
         return float(return_pct)
     
+    def _current_prices(self, tickers: List[str]) -> np.ndarray:
+        """Current prices aligned with tickers; raises if any quote is missing"""
+        prices = self.market_data.get_quotes(tickers)['current_price'].reindex(tickers)
+        missing = prices[prices.isna()].index.unique().tolist()
+        if missing:
+            raise ValueError(f"No current price available for: {', '.join(missing)}")
+        return prices.to_numpy(dtype=float)
+    
     def calculate_sharpe_ratio(self, returns: pd.Series, risk_free_rate: float = 0.02) -> float:
         """Calculate Sharpe ratio"""
         excess_returns = returns.mean() - risk_free_rate / 252  # Daily risk-free rate
         return float(excess_returns / returns.std()) if returns.std() > 0 else 0
     
     def portfolio_metrics(self, tickers: List[str], weights: List[float], 
-                         period: str = "1y") -> Dict[str, float]:
-        """Calculate portfolio metrics given weights"""
-        # Get historical data
-        data = self.market_data.get_multiple_stocks(tickers, period)
-        
-        # Extract close prices
-        if len(tickers) == 1:
-            prices = data['Close'].to_frame()
-            prices.columns = tickers
-        else:
-            prices = pd.DataFrame({ticker: data[ticker]['Close'] for ticker in tickers})
-        
-        # Calculate returns
-        returns = prices.pct_change().dropna()
+                         period: str = "1y", cov_method: str = "sample") -> Dict[str, float]:
+        """Calculate portfolio metrics given weights; repeated tickers are one combined holding"""
+        tickers, weights = VaRCalculator.combine_holdings(tickers, weights)
+        stats = self.returns_stats.get(tickers, period, cov_method)
+        weights = np.asarray(weights, dtype=float)
         
-        # Calculate portfolio return
-        portfolio_return = np.sum(returns.mean() * weights) * 252  # Annualized
+        # Calculate portfolio return (annualized)
+        portfolio_return = stats.mean_array @ weights
         
-        # Calculate portfolio volatility
-        cov_matrix = returns.cov() * 252  # Annualized
-        portfolio_variance = np.dot(weights, np.dot(cov_matrix, weights))
+        # Calculate portfolio volatility (annualized covariance)
+        portfolio_variance = weights @ stats.cov_array @ weights
         portfolio_std = np.sqrt(portfolio_variance)
         
         # Calculate Sharpe ratio
@@ -80,110 +91,232 @@ class PortfolioService:
         }
     
     def optimize_portfolio(self, tickers: List[str], period: str = "1y",
-                          risk_free_rate: float = 0.02) -> Dict[str, Any]:
+                          risk_free_rate: float = 0.02, objective: str = "max_sharpe",
+                          solver: str = "qp", cov_method: str = "sample") -> Dict[str, Any]:
         """
         Optimize portfolio using Modern Portfolio Theory (efficient frontier)
+
+        objective is "max_sharpe" or "min_variance". The "qp" solver uses the
+        projected-gradient QP path; "slsqp" runs SLSQP with analytic gradients.
+        Max-Sharpe falls back to SLSQP when no asset beats the risk-free rate.
+        cov_method picks the covariance estimator (sample, ledoit_wolf,
+        constant_correlation or ewma). Repeated tickers count once.
         """
-        # Get historical data
-        data = self.market_data.get_multiple_stocks(tickers, period)
-        
-        # Extract close prices
-        if len(tickers) == 1:
+        tickers = list(dict.fromkeys(tickers))
+        if len(tickers) < 2:
             raise ValueError("Need at least 2 assets for optimization")
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+        if solver not in SOLVERS:
+            raise ValueError(f"solver must be one of {', '.join(SOLVERS)}")
         
-        prices = pd.DataFrame({ticker: data[ticker]['Close'] for ticker in tickers})
-        returns = prices.pct_change().dropna()
+        # Expected returns and covariance (shared, annualized)
+        stats = self.returns_stats.get(tickers, period, cov_method)
+        mean_returns = stats.mean_array
+        cov_matrix = stats.cov_array
         
-        # Calculate expected returns and covariance
-        mean_returns = returns.mean() * 252
-        cov_matrix = returns.cov() * 252
+        if solver == "qp" and (objective == "min_variance" or (mean_returns > risk_free_rate).any()):
+            if objective == "min_variance":
+                result = portfolio_optimizer.min_variance(cov_matrix)
+            else:
+                result = portfolio_optimizer.max_sharpe(mean_returns, cov_matrix, risk_free_rate)
+            optimal_weights = result["weights"]
+            solver_info = {"method": "projected_gradient", "iterations": result["iterations"],
+                           "converged": result["converged"], "elapsed_ms": result["elapsed_ms"]}
+        else:
+            optimal_weights, solver_info = self._slsqp(mean_returns, cov_matrix, risk_free_rate, objective)
         
-        num_assets = len(tickers)
+        portfolio_return = float(mean_returns @ optimal_weights)
+        portfolio_std = float(np.sqrt(optimal_weights @ cov_matrix @ optimal_weights))
+        sharpe = (portfolio_return - risk_free_rate) / portfolio_std if portfolio_std > 0 else 0.0
         
-        # Optimization function
-        def portfolio_stats(weights):
-            portfolio_return = np.sum(mean_returns * weights)
-            portfolio_std = np.sqrt(np.dot(weights, np.dot(cov_matrix, weights)))
-            sharpe = (portfolio_return - risk_free_rate) / portfolio_std
-            return np.array([portfolio_return, portfolio_std, sharpe])
+        # Create allocation dictionary
+        allocation = {ticker: float(weight) for ticker, weight in zip(stats.tickers, optimal_weights)}
         
-        # Negative Sharpe ratio for minimization
-        def neg_sharpe(weights):
-            return -portfolio_stats(weights)[2]
+        return {
+            "allocation": allocation,
+            "expected_return": portfolio_return,
+            "volatility": portfolio_std,
+            "sharpe_ratio": float(sharpe),
+            "tickers": stats.tickers,
+            "objective": objective,
+            "cov_method": cov_method,
+            "solver": solver_info
+        }
+    
+    @staticmethod
+    def _slsqp(mean_returns: np.ndarray, cov_matrix: np.ndarray, risk_free_rate: float,
+               objective: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """SLSQP on NumPy arrays with analytic objective and constraint gradients"""
+        started = time.perf_counter()
+        num_assets = len(mean_returns)
+        
+        if objective == "min_variance":
+            def fun(weights):
+                cov_w = cov_matrix @ weights
+                return float(weights @ cov_w), 2 * cov_w
+        else:
+            fun = portfolio_optimizer.sharpe_objective(mean_returns, cov_matrix, risk_free_rate)
         
         # Constraints: weights sum to 1
-        constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
+        constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1,
+                        'jac': lambda x: np.ones_like(x)})
         
         # Bounds: 0 <= weight <= 1
         bounds = tuple((0, 1) for _ in range(num_assets))
         
         # Initial guess: equal weights
-        init_guess = num_assets * [1. / num_assets]
+        init_guess = np.full(num_assets, 1. / num_assets)
         
-        # Optimize
-        opt_result = minimize(neg_sharpe, init_guess, method='SLSQP',
-                            bounds=bounds, constraints=constraints)
+        opt_result = minimize(fun, init_guess, jac=True, method='SLSQP',
+                              bounds=bounds, constraints=constraints,
+                              options={'maxiter': 1000})
         
-        optimal_weights = opt_result.x
-        stats = portfolio_stats(optimal_weights)
-        
-        # Create allocation dictionary
-        allocation = {ticker: float(weight) for ticker, weight in zip(tickers, optimal_weights)}
-        
-        return {
-            "allocation": allocation,
-            "expected_return": float(stats[0]),
-            "volatility": float(stats[1]),
-            "sharpe_ratio": float(stats[2]),
-            "tickers": tickers
+        return opt_result.x, {
+            "method": "slsqp",
+            "iterations": int(opt_result.nit),
+            "converged": bool(opt_result.success),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
         }
     
     def efficient_frontier(self, tickers: List[str], period: str = "1y",
-                          num_portfolios: int = 100) -> Dict[str, List]:
-        """Generate efficient frontier"""
-        # Get data
-        data = self.market_data.get_multiple_stocks(tickers, period)
-        prices = pd.DataFrame({ticker: data[ticker]['Close'] for ticker in tickers})
-        returns = prices.pct_change().dropna()
-        
-        mean_returns = returns.mean() * 252
-        cov_matrix = returns.cov() * 252
+                          num_portfolios: int = 100, max_points: Optional[int] = None,
+                          output: str = "records", seed: Optional[int] = None,
+                          mode: str = "random", cov_method: str = "sample") -> Dict[str, Any]:
+        """
+        Generate efficient frontier
+
+        mode "random" scores a cloud of random long-only portfolios in
+        memory-bounded blocks (up to FRONTIER_MAX_PORTFOLIOS); max_points
+        thins it on a volatility x return grid. Without max_points, clouds
+        above FRONTIER_MAX_RECORDS are thinned to that many points, and
+        output "records" never returns more. mode "exact" returns
+        num_portfolios points on the true frontier at evenly spaced target
+        returns, each with its weights. output "arrays" returns parallel
+        lists instead of one record per portfolio. cov_method picks the
+        covariance estimator. Repeated tickers count once.
+        """
+        if mode not in FRONTIER_MODES:
+            raise ValueError(f"mode must be one of {', '.join(FRONTIER_MODES)}")
+        limit = EXACT_FRONTIER_MAX_POINTS if mode == "exact" else settings.FRONTIER_MAX_PORTFOLIOS
+        if num_portfolios < 1 or num_portfolios > limit:
+            raise ValueError(f"num_portfolios must be between 1 and {limit}")
+        if max_points is not None and max_points < 1:
+            raise ValueError("max_points must be positive")
+        if output not in FRONTIER_OUTPUTS:
+            raise ValueError(f"output must be one of {', '.join(FRONTIER_OUTPUTS)}")
+        if output == "records" and max_points is not None and max_points > settings.FRONTIER_MAX_RECORDS:
+            raise ValueError(f"output=records returns at most {settings.FRONTIER_MAX_RECORDS} points; "
+                             f"use output=arrays for more")
+        if mode == "random" and max_points is None and num_portfolios > settings.FRONTIER_MAX_RECORDS:
+            max_points = settings.FRONTIER_MAX_RECORDS
         
-        results = []
+        # Expected returns and covariance (shared, annualized)
+        stats = self.returns_stats.get(tickers, period, cov_method)
+        weights = None
+        if mode == "exact":
+            frontier = exact_frontier(stats.mean_array, stats.cov_array, num_portfolios)
+            returns, volatility, weights = frontier["returns"], frontier["volatility"], frontier["weights"]
+            sharpe = np.divide(returns, volatility, out=np.zeros_like(returns), where=volatility > 0)
+            best_weights, least_volatile_weights = weights[np.argmax(sharpe)], weights[np.argmin(volatility)]
+            extra = {"solver": {"method": "critical_line", "corners": frontier["corners"],
+                                "solves": frontier["solves"], "elapsed_ms": frontier["elapsed_ms"]}}
+        else:
+            cloud = random_cloud(stats.mean_array, stats.cov_array, num_portfolios, seed=seed)
+            returns, volatility, sharpe = cloud["returns"], cloud["volatility"], cloud["sharpe"]
+            best_weights, least_volatile_weights = cloud["max_sharpe_weights"], cloud["min_volatility_weights"]
+            if max_points is not None:
+                keep = downsample(volatility, returns, sharpe, max_points)
+                returns, volatility, sharpe = returns[keep], volatility[keep], sharpe[keep]
+            extra = {}
         
-        for _ in range(num_portfolios):
-            # Random weights
-            weights = np.random.random(len(tickers))
-            weights /= np.sum(weights)
-            
-            # Calculate metrics
-            portfolio_return = np.sum(mean_returns * weights)
-            portfolio_std = np.sqrt(np.dot(weights, np.dot(cov_matrix, weights)))
-            sharpe = portfolio_return / portfolio_std if portfolio_std > 0 else 0
-            
-            results.append({
-                'return': float(portfolio_return),
-                'volatility': float(portfolio_std),
-                'sharpe': float(sharpe)
-            })
+        if output == "arrays":
+            points = {"portfolios": {
+                "return": returns.tolist(),
+                "volatility": volatility.tolist(),
+                "sharpe": sharpe.tolist()
+            }}
+            if weights is not None:
+                points["portfolios"]["weights"] = weights.tolist()
+        else:
+            points = {"portfolios": [
+                {'return': r, 'volatility': v, 'sharpe': s}
+                for r, v, s in zip(returns.tolist(), volatility.tolist(), sharpe.tolist())
+            ]}
+            if weights is not None:
+                for point, row in zip(points["portfolios"], weights.tolist()):
+                    point["weights"] = row
         
         return {
-            "portfolios": results,
-            "count": len(results)
+            **points,
+            "mode": mode,
+            "cov_method": cov_method,
+            "tickers": stats.tickers,
+            "count": num_portfolios,
+            "returned": len(returns),
+            "max_sharpe_allocation": dict(zip(stats.tickers, best_weights.tolist())),
+            "min_volatility_allocation": dict(zip(stats.tickers, least_volatile_weights.tolist())),
+            **extra
         }
     
+    def batch_problems(self, specs: List[Dict[str, Any]], period: str = "1y",
+                       cov_method: str = "sample",
+                       risk_free_rate: float = 0.02) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Statistics once for the union of every spec's tickers, then one
+        solve_spec argument set per spec (its slice of the shared mean and
+        covariance, and its weight bounds)
+        """
+        universe = list(dict.fromkeys(ticker for spec in specs for ticker in spec["tickers"]))
+        stats = self.returns_stats.get(universe, period, cov_method)
+        mean_returns, cov_matrix = stats.mean_array, stats.cov_array
+        column = {ticker: j for j, ticker in enumerate(stats.tickers)}
+        
+        problems = []
+        for n, spec in enumerate(specs):
+            spec_id = spec.get("id") or str(n)
+            tickers = list(dict.fromkeys(spec["tickers"]))
+            position = {ticker: j for j, ticker in enumerate(tickers)}
+            lower = np.full(len(tickers), float(spec.get("min_weight", 0.0)))
+            upper = np.full(len(tickers), float(spec.get("max_weight", 1.0)))
+            for ticker, (low, high) in (spec.get("bounds") or {}).items():
+                if ticker not in position:
+                    raise ValueError(f"Spec {spec_id}: bounds given for {ticker}, which is not in its tickers")
+                lower[position[ticker]], upper[position[ticker]] = low, high
+            
+            idx = np.array([column[ticker] for ticker in tickers])
+            problems.append({
+                "spec_id": spec_id,
+                "tickers": tickers,
+                "mean": mean_returns[idx],
+                "cov": cov_matrix[np.ix_(idx, idx)],
+                "risk_aversion": float(spec.get("risk_aversion", 1.0)),
+                "lower": lower,
+                "upper": upper,
+                "risk_free_rate": risk_free_rate
+            })
+        return universe, problems
+    
+    @staticmethod
+    def submit_problem(problem: Dict[str, Any]) -> Future:
+        """Solve one batch_problems entry on the shared process pool"""
+        return get_pool().submit(portfolio_optimizer.solve_spec, **problem)
+    
     def rebalance_portfolio(self, current_holdings: Dict[str, float],
                            target_allocation: Dict[str, float],
                            total_value: float) -> Dict[str, Any]:
         """Calculate rebalancing trades"""
         trades = {}
         
+        # Get current prices in one batch
+        tickers = list(target_allocation.keys())
+        current_prices = dict(zip(tickers, self._current_prices(tickers)))
+        
         for ticker, target_weight in target_allocation.items():
             current_weight = current_holdings.get(ticker, 0)
             weight_diff = target_weight - current_weight
             
-            # Get current price
-            current_price = self.market_data.get_stock_info(ticker)['current_price']
+            current_price = current_prices[ticker]
             
             # Calculate shares to buy/sell
             target_value = total_value * target_weight
@@ -222,15 +355,12 @@ class PortfolioService:
             total_cost = 0
             tickers = df['symbol'].tolist()
             
-            # Get latest market data
-            market_data = {}
-            for ticker in tickers:
-                try:
-                    info = self.market_data.get_stock_info(ticker)
-                    market_data[ticker] = info
-                except Exception:
-                    # Fallback or skip if ticker not found
-                    market_data[ticker] = None
+            # Get latest market data in one batch; unknown tickers come back as NaN
+            symbols = [str(ticker).upper() for ticker in tickers]
+            try:
+                quoted_prices = self.market_data.get_quotes(symbols)['current_price']
+            except Exception:
+                quoted_prices = pd.Series(dtype=float)
             
             for _, row in df.iterrows():
                 symbol = str(row['symbol']).upper()
@@ -239,8 +369,9 @@ class PortfolioService:
                 
                 # Use current price from market data, or from CSV if provided, or fallback to purchase price
                 current_price = purchase_price
-                if market_data.get(symbol) and market_data[symbol].get('current_price'):
-                    current_price = market_data[symbol]['current_price']
+                quoted_price = quoted_prices.get(symbol)
+                if quoted_price is not None and not pd.isna(quoted_price) and quoted_price:
+                    current_price = float(quoted_price)
                 elif 'current_price' in df.columns and not pd.isna(row['current_price']):
                     current_price = float(row['current_price'])
                 
@@ -0,0 +1,190 @@
+"""
+Memory-mapped universe price panel
+
+A dense date x ticker float64 matrix of daily closes, written once (e.g. by
+the nightly warmer) and opened read-only with np.memmap by every worker.
+All processes share the same page-cache pages, and because the matrix is
+stored column-major each ticker's history is one contiguous block that can
+be sliced without copying.
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+from backend.services.market_data import MarketDataService
+from backend.services.price_store import SESSION_PERIODS, period_start
+
+
+class PricePanel:
+    """Read-only view of a panel directory written by PricePanel.build"""
+
+    DATA_FILE = "prices.f64"
+    DATES_FILE = "dates.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, self.META_FILE)) as f:
+            meta = json.load(f)
+        self.tickers: List[str] = meta["tickers"]
+        self.built_at: float = meta["built_at"]
+        self.ticker_index: Dict[str, int] = {t: i for i, t in enumerate(self.tickers)}
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(root, self.DATES_FILE)).astype("datetime64[ns]"))
+        # Column-major, so prices[:, j] is a contiguous view of one ticker
+        self.prices = np.memmap(os.path.join(root, self.DATA_FILE), dtype=np.float64, mode="r",
+                                shape=(len(self.dates), len(self.tickers)), order="F")
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        return self.dates[-1]
+
+    def has(self, tickers: List[str]) -> bool:
+        return all(ticker in self.ticker_index for ticker in tickers)
+
+    def covers(self, period: str) -> bool:
+        """Whether the panel reaches back far enough for period"""
+        if period in SESSION_PERIODS:
+            return True
+        start = period_start(period)
+        # A few days of slack for weekends/holidays at the start of the build period
+        return start is not None and start >= self.dates[0] - pd.Timedelta(days=7)
+
+    def start_row(self, period: str) -> int:
+        """First row inside period, counted back from today like yfinance"""
+        if period in SESSION_PERIODS:
+            return max(0, len(self.dates) - SESSION_PERIODS[period])
+        start = period_start(period)
+        return 0 if start is None else int(self.dates.searchsorted(start))
+
+    def column(self, ticker: str, start_row: int = 0) -> np.ndarray:
+        """One ticker's closes as a zero-copy view"""
+        return self.prices[start_row:, self.ticker_index[ticker]]
+
+    def block(self, tickers: List[str], start_row: int = 0) -> np.ndarray:
+        """
+        Closes for several tickers. A view when the tickers are adjacent in
+        the panel, otherwise a gathered copy of just those columns.
+        """
+        cols = [self.ticker_index[ticker] for ticker in tickers]
+        if cols == list(range(cols[0], cols[0] + len(cols))):
+            return self.prices[start_row:, cols[0]:cols[0] + len(cols)]
+        return self.prices[start_row:, cols]
+
+    def frame(self, tickers: List[str], period: str = "1y") -> pd.DataFrame:
+        """Close prices as a DataFrame, same shape as MarketDataService.get_close_prices"""
+        start = self.start_row(period)
+        return pd.DataFrame(self.block(tickers, start), index=self.dates[start:], columns=tickers)
+
+    def weighted_returns(self, tickers: List[str], weights: List[float],
+                         period: str = "1y") -> np.ndarray:
+        """
+        Daily portfolio returns accumulated column by column from views, so
+        the ticker block is never materialized. Days where any holding has no
+        price are dropped, matching pct_change().dropna().
+        """
+        start = self.start_row(period)
+        total = np.zeros(len(self.dates) - start - 1)
+        valid = np.ones_like(total, dtype=bool)
+        for ticker, weight in zip(tickers, weights):
+            col = self.column(ticker, start)
+            asset_returns = col[1:] / col[:-1] - 1
+            valid &= np.isfinite(asset_returns)
+            total += weight * np.nan_to_num(asset_returns)
+        return total[valid]
+
+    @classmethod
+    def build(cls, root: str, tickers: List[str], period: str = "5y",
+              batch_size: int = 200, pause_seconds: float = 0.0) -> "PricePanel":
+        """
+        Fetch closes for the universe in batches (through the price store) and
+        write a new panel. The directory is swapped in atomically, so workers
+        with the old panel open keep reading their mapped copy.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        series = {}
+        for i in range(0, len(tickers), batch_size):
+            batch = tickers[i:i + batch_size]
+            closes = MarketDataService.get_close_prices(batch, period)
+            for ticker in batch:
+                s = closes[ticker].dropna()
+                if s.empty:
+                    continue
+                if s.index.tz is not None:
+                    s.index = s.index.tz_localize(None)
+                s.index = s.index.normalize()
+                series[ticker] = s[~s.index.duplicated(keep="last")]
+            if pause_seconds and i + batch_size < len(tickers):
+                time.sleep(pause_seconds)
+
+        if not series:
+            raise ValueError("No price data available to build the panel")
+
+        names = list(series.keys())
+        dates = pd.DatetimeIndex(sorted(set().union(*(s.index for s in series.values()))))
+        tmp_root = f"{root}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_root, exist_ok=True)
+
+        prices = np.memmap(os.path.join(tmp_root, cls.DATA_FILE), dtype=np.float64, mode="w+",
+                           shape=(len(dates), len(names)), order="F")
+        for j, ticker in enumerate(names):
+            prices[:, j] = series[ticker].reindex(dates).to_numpy(dtype=np.float64)
+        prices.flush()
+        del prices
+
+        np.save(os.path.join(tmp_root, cls.DATES_FILE), dates.values.astype("datetime64[ns]"))
+        with open(os.path.join(tmp_root, cls.META_FILE), "w") as f:
+            json.dump({"tickers": names, "period": period, "built_at": time.time()}, f)
+
+        old_root = f"{root}.old-{os.getpid()}-{threading.get_ident()}"
+        if os.path.exists(root):
+            os.rename(root, old_root)
+        os.rename(tmp_root, root)
+        shutil.rmtree(old_root, ignore_errors=True)
+        return cls(root)
+
+
+_panel: Optional[PricePanel] = None
+_panel_lock = threading.Lock()
+
+
+def get_panel() -> Optional[PricePanel]:
+    """
+    The current panel if one exists and is recent enough, else None.
+    Re-opened automatically after a rebuild.
+    """
+    global _panel
+    if not settings.PRICE_PANEL_ENABLED:
+        return None
+    meta_path = os.path.join(settings.PRICE_PANEL_PATH, PricePanel.META_FILE)
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+
+    with _panel_lock:
+        if _panel is None or _panel.built_at < mtime - 1:
+            try:
+                _panel = PricePanel(settings.PRICE_PANEL_PATH)
+            except (OSError, ValueError):
+                return None
+        panel = _panel
+
+    age_days = (pd.Timestamp.now().normalize() - panel.last_date).days
+    return panel if age_days <= settings.PRICE_PANEL_MAX_AGE_DAYS else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the universe price panel")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--period", default="5y")
+    args = parser.parse_args()
+    panel = PricePanel.build(settings.PRICE_PANEL_PATH, args.tickers, args.period)
+    print(f"✅ Built price panel: {len(panel.dates)} dates x {len(panel.tickers)} tickers")
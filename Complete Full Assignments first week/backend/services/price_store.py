@@ -0,0 +1,245 @@
+"""
+Persistent local OHLCV store
+
+Bars are kept on disk as one NumPy file per column, in a directory per
+ticker and interval. Files are opened memory-mapped so reads never touch
+the network and only page in what is used.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Calendar offsets for yfinance-style periods; "Nd" periods count sessions
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+SESSION_PERIODS = {"1d": 1, "5d": 5}
+
+# Upstream only serves recent history at these intervals (about 7 days of 1m bars)
+INTRADAY_INTERVALS = {"1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"}
+
+# Longest stretch without sessions (a holiday weekend) that is not missing history
+MARKET_CLOSED_GAP = pd.Timedelta(days=4)
+
+
+def period_start(period: str, now: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    """
+    Convert a yfinance period string into a naive UTC start timestamp.
+    Returns None for "max" (and for session-counted periods such as "5d").
+    """
+    now = now if now is not None else pd.Timestamp.now(tz="UTC").tz_localize(None)
+    if period == "max" or period in SESSION_PERIODS:
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1)
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period: {period}")
+    return (now - PERIOD_OFFSETS[period]).normalize()
+
+
+def slice_period(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Trim a bar frame to the requested period"""
+    if df.empty or period == "max":
+        return df
+    if period in SESSION_PERIODS:
+        # Keep the last N trading sessions, like yfinance does
+        sessions = df.index.normalize().unique()
+        first_session = sessions[-SESSION_PERIODS[period]:][0]
+        return df[df.index >= first_session]
+    start = period_start(period)
+    if df.index.tz is not None:
+        start = start.tz_localize("UTC").tz_convert(df.index.tz)
+    return df[df.index >= start]
+
+
+class PriceStore:
+    """Columnar on-disk store of OHLCV bars keyed by (ticker, interval)"""
+
+    INDEX_FILE = "index.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, ticker: str, interval: str) -> str:
+        return os.path.join(self.root, interval, ticker.upper().replace("/", "_"))
+
+    def read_meta(self, ticker: str, interval: str) -> Optional[dict]:
+        """Return stored metadata, or None if nothing is stored"""
+        meta_path = os.path.join(self._path(ticker, interval), self.META_FILE)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read(self, ticker: str, interval: str) -> Optional[pd.DataFrame]:
+        """Load all stored bars for a ticker, or None if nothing is stored"""
+        path = self._path(ticker, interval)
+        meta = self.read_meta(ticker, interval)
+        if meta is None:
+            return None
+
+        try:
+            index = np.load(os.path.join(path, self.INDEX_FILE), mmap_mode="r")
+            columns = {
+                col: np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r")
+                for i, col in enumerate(meta["columns"])
+            }
+        except (OSError, ValueError):
+            return None
+
+        idx = pd.DatetimeIndex(np.asarray(index, dtype="datetime64[ns]")).tz_localize("UTC")
+        if meta.get("tz"):
+            idx = idx.tz_convert(meta["tz"])
+        else:
+            idx = idx.tz_localize(None)
+        idx.name = meta.get("index_name")
+        return pd.DataFrame(columns, index=idx)
+
+    def write(self, ticker: str, interval: str, df: pd.DataFrame,
+              fetched_from: Optional[str] = None) -> None:
+        """
+        Replace the stored bars for a ticker.
+        fetched_from is the earliest date the upstream was asked for
+        (None means full history), used to decide whether a period is covered.
+        """
+        df = df.select_dtypes(include=[np.number])
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+
+        tz = str(df.index.tz) if df.index.tz is not None else None
+        index = df.index.tz_convert("UTC").tz_localize(None) if tz else df.index
+        meta = {
+            "columns": list(df.columns),
+            "tz": tz,
+            "index_name": df.index.name,
+            "rows": len(df),
+            "fetched_from": fetched_from,
+            "refreshed_at": time.time(),
+        }
+
+        path = self._path(ticker, interval)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, self.INDEX_FILE),
+                index.values.astype("datetime64[ns]").view("int64"))
+        for i, col in enumerate(df.columns):
+            np.save(os.path.join(tmp_path, f"{i}.npy"), df[col].to_numpy(dtype=np.float64))
+        with open(os.path.join(tmp_path, self.META_FILE), "w") as f:
+            json.dump(meta, f)
+
+        # Swap the new directory in; readers that race the swap just miss the store
+        with self._lock:
+            old_path = f"{path}.old-{os.getpid()}-{threading.get_ident()}"
+            if os.path.exists(path):
+                os.rename(path, old_path)
+            os.rename(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+
+    def extend(self, ticker: str, interval: str, bars: pd.DataFrame,
+               fetched_from: Optional[str] = None) -> None:
+        """
+        Store a full fetch, keeping stored bars older than its first bar.
+        At intraday intervals upstream has already dropped those, so this is
+        how the store accumulates more minutes than a single fetch returns.
+        """
+        stored = self.read(ticker, interval)
+        if stored is not None and not stored.empty and not bars.empty:
+            if stored.index.tz is not None and bars.index.tz is not None:
+                stored = stored.tz_convert(bars.index.tz)
+            older = stored[stored.index < bars.index[0]]
+            if not older.empty:
+                bars = pd.concat([older, bars])
+                stored_from = (self.read_meta(ticker, interval) or {}).get("fetched_from")
+                fetched_from = None if stored_from is None or fetched_from is None \
+                    else min(stored_from, fetched_from)
+        self.write(ticker, interval, bars, fetched_from=fetched_from)
+
+    def append(self, ticker: str, interval: str, new_bars: pd.DataFrame) -> pd.DataFrame:
+        """
+        Merge freshly fetched bars into the store. Stored bars at or after the
+        first new bar are replaced, since the last stored bar may have been partial.
+        """
+        stored = self.read(ticker, interval)
+        meta = self.read_meta(ticker, interval) or {}
+        if stored is None or stored.empty:
+            merged = new_bars
+        elif new_bars.empty:
+            merged = stored
+        else:
+            if stored.index.tz is not None and new_bars.index.tz is not None:
+                new_bars = new_bars.tz_convert(stored.index.tz)
+            merged = pd.concat([stored[stored.index < new_bars.index[0]], new_bars])
+        self.write(ticker, interval, merged, fetched_from=meta.get("fetched_from"))
+        return self.read(ticker, interval)
+
+    def touch(self, ticker: str, interval: str) -> None:
+        """Mark stored bars as just refreshed when upstream had nothing new"""
+        meta = self.read_meta(ticker, interval)
+        if meta is None:
+            return
+        meta["refreshed_at"] = time.time()
+        meta_path = os.path.join(self._path(ticker, interval), self.META_FILE)
+        tmp_meta = f"{meta_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            with open(tmp_meta, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+        except OSError:
+            pass
+
+    def covers(self, ticker: str, interval: str, period: str) -> bool:
+        """Whether stored history reaches back far enough for the period"""
+        meta = self.read_meta(ticker, interval)
+        if meta is None or meta.get("rows", 0) == 0:
+            return False
+        fetched_from = meta.get("fetched_from")
+        if fetched_from is None:
+            return True
+        if period == "max":
+            return False
+        start = period_start(period)
+        if start is None:
+            return True
+        return pd.Timestamp(fetched_from) <= start
+
+    def is_fresh(self, ticker: str, interval: str, max_age_seconds: float) -> bool:
+        """Whether the stored bars were refreshed recently enough to skip upstream"""
+        meta = self.read_meta(ticker, interval)
+        if meta is None:
+            return False
+        return time.time() - meta.get("refreshed_at", 0) < max_age_seconds
+
+    @staticmethod
+    def coverage_start(period: str, bars: pd.DataFrame, interval: str = "1d") -> Optional[str]:
+        """
+        Earliest date a full fetch of the period is known to cover. Intraday
+        fetches cover only from their first bar, since upstream truncates
+        them; a first bar just after the period start is a market holiday.
+        """
+        if period == "max":
+            return None
+        start = period_start(period)
+        if not bars.empty:
+            first = bars.index[0]
+            first = (first.tz_convert("UTC").tz_localize(None) if first.tz is not None else first).normalize()
+            if start is None or (interval in INTRADAY_INTERVALS and first - start > MARKET_CLOSED_GAP):
+                start = first
+        if start is None:
+            return None
+        return start.strftime("%Y-%m-%d")
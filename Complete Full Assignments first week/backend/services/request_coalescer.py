@@ -0,0 +1,80 @@
+"""
+Single-flight request coalescing
+
+Concurrent calls with the same key share one execution of the underlying
+function. A just-finished result can optionally be reused for a short
+window so requests that arrive right after the fetch also skip it.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class RequestCoalescer:
+    """Share one in-flight call between concurrent identical requests"""
+
+    def __init__(self, result_ttl: float = 0.0):
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._recent: Dict[Hashable, Tuple[float, Any]] = {}
+        self._stats = {"hits": 0, "coalesced": 0, "misses": 0, "errors": 0}
+
+    def run(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call func(*args, **kwargs) unless an identical call is already running,
+        in which case wait for it and return its result (or raise its error)
+        """
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None and recent[0] > now:
+                self._stats["hits"] += 1
+                return recent[1]
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._stats["errors"] += 1
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if self.result_ttl > 0:
+                self._purge_expired(time.monotonic())
+                self._recent[key] = (time.monotonic() + self.result_ttl, result)
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, (expires, _) in self._recent.items() if expires <= now]
+        for key in expired:
+            del self._recent[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for hits (recent result reused), coalesced waits and misses"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._inflight)
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
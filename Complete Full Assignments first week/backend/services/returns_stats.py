@@ -0,0 +1,149 @@
+"""
+Shared returns statistics
+
+Portfolio metrics, optimization, the efficient frontier and VaR all need
+the same aligned daily returns matrix, annualized mean vector and
+covariance. They are built once per (ticker set, period, as-of date) and
+reused from an in-process cache. When the shared universe price panel holds
+every ticker, prices are sliced from it instead of fetched.
+
+The covariance can also be a shrinkage or EWMA estimate (see covariance.py),
+chosen per call with cov_method. Each estimate is memoized on the cached
+statistics. The estimator behind it is kept per (ticker set, period,
+method) and rolled forward as the window moves, so a new day is an
+incremental update rather than a refit.
+"""
+import threading
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+from backend.services.cache import MISSING, TTLCache
+from backend.services.covariance import COV_METHODS, CovarianceEstimator
+from backend.services.market_data import MarketDataService
+from backend.services.price_panel import get_panel
+from backend.services.request_coalescer import RequestCoalescer
+
+
+TRADING_DAYS = 252
+
+
+class ReturnsStatistics:
+    """Aligned daily returns with annualized mean returns and covariance"""
+
+    def __init__(self, returns: pd.DataFrame, period: str, as_of: date):
+        self.returns = returns
+        self.period = period
+        self.as_of = as_of
+        self.tickers = list(returns.columns)
+        self.mean_returns = returns.mean() * TRADING_DAYS
+        self.cov_matrix = returns.cov() * TRADING_DAYS
+        self.cov_method = "sample"
+        # Annualized estimator covariances by method, filled on first use
+        self.estimates: Dict[str, pd.DataFrame] = {}
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held, used by the cache's byte bound"""
+        return int(self.returns.memory_usage(deep=True).sum() + self.cov_matrix.memory_usage().sum())
+
+    @property
+    def returns_array(self) -> np.ndarray:
+        return self.returns.to_numpy()
+
+    @property
+    def mean_array(self) -> np.ndarray:
+        return self.mean_returns.to_numpy()
+
+    @property
+    def cov_array(self) -> np.ndarray:
+        return self.cov_matrix.to_numpy()
+
+    def select(self, tickers: List[str], cov_method: str = "sample") -> "ReturnsStatistics":
+        """
+        Same statistics restricted to / reordered as tickers (no recomputation),
+        with cov_matrix taken from an already computed estimate when given
+        """
+        if tickers == self.tickers and cov_method == self.cov_method:
+            return self
+        cov_matrix = self.cov_matrix if cov_method == "sample" else self.estimates[cov_method]
+        selected = ReturnsStatistics.__new__(ReturnsStatistics)
+        selected.returns = self.returns[tickers]
+        selected.period = self.period
+        selected.as_of = self.as_of
+        selected.tickers = list(tickers)
+        selected.mean_returns = self.mean_returns[tickers]
+        selected.cov_matrix = cov_matrix.loc[tickers, tickers]
+        selected.cov_method = cov_method
+        selected.estimates = {}
+        return selected
+
+
+class ReturnsStatsService:
+    """Builds and caches ReturnsStatistics"""
+
+    def __init__(self, market_data: Optional[MarketDataService] = None):
+        self.market_data = market_data or MarketDataService()
+        self._cache = TTLCache(settings.RETURNS_STATS_CACHE_ENTRIES, settings.CACHE_MAX_BYTES)
+        self._coalescer = RequestCoalescer()
+        # Survive invalidate(): rolling forward is checked against the new window
+        self._estimators = TTLCache(settings.RETURNS_STATS_CACHE_ENTRIES, settings.CACHE_MAX_BYTES)
+        self._estimators_lock = threading.Lock()
+
+    def get(self, tickers: List[str], period: str = "1y",
+            cov_method: str = "sample") -> ReturnsStatistics:
+        """Statistics for tickers over period, in the order the tickers were given"""
+        if cov_method not in COV_METHODS:
+            raise ValueError(f"cov_method must be one of {', '.join(COV_METHODS)}")
+        tickers = list(dict.fromkeys(tickers))
+        key = (tuple(sorted(tickers)), period, date.today())
+
+        stats = self._cache.get(key)
+        if stats is MISSING:
+            stats = self._coalescer.run(key, self._build, key, list(key[0]), period)
+        if cov_method != "sample" and cov_method not in stats.estimates:
+            self._coalescer.run(key + (cov_method, id(stats)), self._estimate, stats, cov_method)
+        return stats.select(tickers, cov_method)
+
+    def _estimate(self, stats: ReturnsStatistics, cov_method: str) -> None:
+        """Roll the estimator for this ticker set forward to the window and memoize its estimate"""
+        estimator_key = (tuple(sorted(stats.tickers)), stats.period, cov_method)
+        with self._estimators_lock:
+            estimator = self._estimators.get(estimator_key)
+            if estimator is MISSING:
+                estimator = CovarianceEstimator(cov_method)
+        with estimator.lock:
+            estimator.roll(stats.returns)
+            cov = estimator.covariance() * TRADING_DAYS
+        with self._estimators_lock:
+            self._estimators.set(estimator_key, estimator, settings.RETURNS_STATS_TTL_SECONDS * 7)
+        stats.estimates[cov_method] = pd.DataFrame(cov, index=stats.tickers, columns=stats.tickers)
+
+    def _build(self, key, tickers: List[str], period: str) -> ReturnsStatistics:
+        panel = get_panel()
+        if panel is not None and panel.has(tickers) and panel.covers(period):
+            prices = panel.frame(tickers, period)
+        else:
+            prices = self.close_prices(tickers, period)
+        # One ticker without any data would otherwise empty the aligned window
+        empty = [ticker for ticker in tickers if prices[ticker].isna().all()]
+        if empty:
+            raise ValueError(f"No price data available for: {', '.join(empty)}")
+        returns = prices.pct_change().dropna()
+        stats = ReturnsStatistics(returns, period, key[2])
+        self._cache.set(key, stats, settings.RETURNS_STATS_TTL_SECONDS)
+        return stats
+
+    def close_prices(self, tickers: List[str], period: str = "1y") -> pd.DataFrame:
+        """Close prices with one column per ticker"""
+        return self.market_data.get_close_prices(tickers, period)
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+
+# Shared so every service reuses the same statistics
+returns_stats_service = ReturnsStatsService()
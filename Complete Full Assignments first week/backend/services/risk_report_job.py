@@ -0,0 +1,270 @@
+"""
+Nightly risk report materialization
+
+Computes VaR/ES for every portfolio in one pass and upserts the results
+as RiskReport rows (unique per portfolio, date and method), so
+GET /risk/report only reads them back. Every worker schedules the job but
+only the one holding its leader lock runs it.
+Holdings become a portfolios x tickers dollar-exposure matrix W, daily
+returns for the union of held tickers a dates x tickers matrix R (from the
+shared price panel when it has them), and R @ W.T gives the daily P&L of
+every portfolio at once; quantiles and tail means are then taken column-wise.
+A portfolio holding a ticker with no price history at all (delisted or
+unknown) is skipped and logged rather than failing the whole run; its
+existing reports are left in place.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from backend.config import settings
+from backend.database.connection import SessionLocal
+from backend.services.leader_lock import LeaderLock
+from backend.services.market_data import MarketDataService
+from backend.services.price_panel import get_panel
+
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+except ImportError:  # scheduling is optional; run_once still works
+    BackgroundScheduler = None
+
+
+logger = logging.getLogger(__name__)
+
+METHODS = ["historical_simulation", "parametric"]
+REPORT_KEY = ["portfolio_id", "report_date", "method"]
+REPORT_VALUES = ["var_95", "var_99", "expected_shortfall", "timeframe", "created_at"]
+
+
+def portfolio_risk(pnl: np.ndarray) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    95%/99% VaR and 95% ES for each column of a dates x portfolios P&L
+    matrix, per method
+    """
+    var_95, var_99 = np.percentile(pnl, [5, 1], axis=0)
+    tail = pnl <= var_95
+    es_95 = np.where(tail, pnl, 0.0).sum(axis=0) / np.maximum(tail.sum(axis=0), 1)
+
+    mean, std = pnl.mean(axis=0), pnl.std(axis=0, ddof=1)
+    z_95, z_99 = stats.norm.ppf(0.05), stats.norm.ppf(0.01)
+    return {
+        "historical_simulation": {"var_95": var_95, "var_99": var_99, "expected_shortfall": es_95},
+        "parametric": {
+            "var_95": mean + z_95 * std,
+            "var_99": mean + z_99 * std,
+            "expected_shortfall": mean - std * stats.norm.pdf(z_95) / 0.05
+        }
+    }
+
+
+class RiskReportJob:
+    """Batch VaR/ES for all portfolios, scheduled nightly"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.period = settings.RISK_REPORT_PERIOD
+        self._scheduler = None
+        self._run_lock = threading.Lock()
+        self.leader = LeaderLock("risk_report_job")
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def load_holdings(self, db) -> pd.DataFrame:
+        """Every holding as (portfolio_id, ticker, quantity, current_value) in one query"""
+        from backend.models import PortfolioHolding, Stock
+
+        rows = (
+            db.query(PortfolioHolding.portfolio_id, Stock.ticker_symbol,
+                     PortfolioHolding.quantity, PortfolioHolding.current_value)
+            .join(Stock, PortfolioHolding.stock_id == Stock.id)
+            .all()
+        )
+        holdings = pd.DataFrame(rows, columns=["portfolio_id", "ticker", "quantity", "current_value"])
+        holdings["quantity"] = pd.to_numeric(holdings["quantity"], errors="coerce").fillna(0.0)
+        holdings["current_value"] = pd.to_numeric(holdings["current_value"], errors="coerce")
+        return holdings
+
+    def close_prices(self, tickers) -> pd.DataFrame:
+        """One column per ticker, all NaN for a ticker without price history"""
+        panel = get_panel()
+        if panel is not None and panel.has(tickers) and panel.covers(self.period):
+            return panel.frame(tickers, self.period)
+        try:
+            prices = MarketDataService.get_close_prices(tickers, self.period)
+        except ValueError:
+            # The batch failed as a whole; fetch ticker by ticker so one bad symbol costs only itself
+            columns = {}
+            for ticker in tickers:
+                try:
+                    columns[ticker] = MarketDataService.get_close_prices([ticker], self.period)[ticker]
+                except ValueError:
+                    pass
+            prices = pd.DataFrame(columns)
+        return prices.reindex(columns=tickers)
+
+    @staticmethod
+    def drop_unpriced(holdings: pd.DataFrame,
+                      prices: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[int, List[str]]]:
+        """Holdings of portfolios whose every ticker has prices, and the unpriced tickers of the rest"""
+        unpriced = holdings["ticker"].isin(prices.columns[prices.isna().all()])
+        skipped = {
+            int(portfolio_id): sorted(group["ticker"].unique())
+            for portfolio_id, group in holdings[unpriced].groupby("portfolio_id")
+        }
+        for portfolio_id, tickers in skipped.items():
+            logger.warning("Risk report skipped for portfolio %s: no price history for %s",
+                           portfolio_id, ", ".join(tickers))
+        return holdings[~holdings["portfolio_id"].isin(list(skipped))], skipped
+
+    def compute(self, holdings: pd.DataFrame, prices: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """One row per (portfolio, method) with dollar VaR/ES"""
+        tickers = sorted(holdings["ticker"].unique())
+        prices = self.close_prices(tickers) if prices is None else prices[tickers]
+        returns = prices.pct_change().iloc[1:]
+        # A missing close contributes no move that day rather than dropping the day for everyone
+        returns = returns.dropna(how="all").fillna(0.0)
+
+        # Dollar exposure: quantity x latest close, else the stored holding value
+        last_close = prices.ffill().iloc[-1].reindex(holdings["ticker"]).to_numpy()
+        exposure = holdings["quantity"].to_numpy() * last_close
+        exposure = np.where(np.isfinite(exposure), exposure, holdings["current_value"].fillna(0.0).to_numpy())
+
+        portfolio_ids = np.sort(holdings["portfolio_id"].unique())
+        rows = np.searchsorted(portfolio_ids, holdings["portfolio_id"].to_numpy())
+        cols = np.searchsorted(tickers, holdings["ticker"].to_numpy())
+        weights = np.zeros((len(portfolio_ids), len(tickers)))
+        np.add.at(weights, (rows, cols), exposure)
+
+        pnl = returns.reindex(columns=tickers, fill_value=0.0).to_numpy() @ weights.T
+        risk = portfolio_risk(pnl)
+
+        frames = []
+        for method in METHODS:
+            frames.append(pd.DataFrame({
+                "portfolio_id": portfolio_ids,
+                "method": method,
+                **{name: values for name, values in risk[method].items()}
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def run_once(self, report_date: Optional[date] = None) -> Dict[str, Any]:
+        """Materialize today's reports; concurrent calls are skipped, not queued"""
+        if not self._run_lock.acquire(blocking=False):
+            return {"skipped": True}
+        try:
+            return self._run(report_date or date.today())
+        finally:
+            self._run_lock.release()
+
+    def _run(self, report_date: date) -> Dict[str, Any]:
+        from backend.models import RiskReport
+
+        started = time.time()
+        db = self.session_factory()
+        try:
+            holdings = self.load_holdings(db)
+            summary = {"report_date": str(report_date), "holdings": len(holdings), "reports": 0}
+            if holdings.empty:
+                self.last_run = summary
+                return summary
+
+            prices = self.close_prices(sorted(holdings["ticker"].unique()))
+            holdings, skipped = self.drop_unpriced(holdings, prices)
+            summary["skipped_portfolios"] = skipped
+            if holdings.empty:
+                self.last_run = summary
+                return summary
+
+            reports = self.compute(holdings, prices)
+            created_at = datetime.utcnow()
+            records = [
+                {
+                    "portfolio_id": int(row.portfolio_id),
+                    "report_date": report_date,
+                    "var_95": round(float(row.var_95), 2),
+                    "var_99": round(float(row.var_99), 2),
+                    "expected_shortfall": round(float(row.expected_shortfall), 2),
+                    "method": row.method,
+                    "timeframe": self.period,
+                    "created_at": created_at
+                }
+                for row in reports.itertuples(index=False)
+            ]
+
+            # Re-running for the same date replaces that date's reports: portfolios
+            # without holdings any more lose theirs, skipped ones keep theirs and
+            # the rest are upserted
+            portfolio_ids = [int(pid) for pid in reports["portfolio_id"].unique()] + list(skipped)
+            db.query(RiskReport).filter(
+                RiskReport.report_date == report_date, RiskReport.portfolio_id.notin_(portfolio_ids)
+            ).delete(synchronize_session=False)
+            self.upsert(db, RiskReport.__table__, records)
+            db.commit()
+            summary["reports"] = len(records)
+            summary["portfolios"] = int(reports["portfolio_id"].nunique())
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        summary["elapsed_seconds"] = round(time.time() - started, 2)
+        self.last_run = summary
+        return summary
+
+    @staticmethod
+    def upsert(db, table, records) -> None:
+        """Insert reports, overwriting any row with the same portfolio, date and method"""
+        dialect = db.bind.dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table)
+            stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in REPORT_VALUES})
+        elif dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=REPORT_KEY, set_={column: stmt.excluded[column] for column in REPORT_VALUES}
+            )
+        else:
+            raise ValueError(f"Risk report upsert is not supported on {dialect}")
+        db.execute(stmt, records)
+
+    def run_if_leader(self) -> Dict[str, Any]:
+        """Scheduled entry point: only the worker holding the leader lock runs the reports"""
+        if not self.leader.acquire():
+            return {"skipped": True, "leader": False}
+        return self.run_once()
+
+    def start(self) -> None:
+        """Run every night at RISK_REPORT_HOUR (server time)"""
+        if BackgroundScheduler is None or self._scheduler is not None:
+            return
+        self._scheduler = BackgroundScheduler(daemon=True)
+        self._scheduler.add_job(
+            self.run_if_leader, "cron", hour=settings.RISK_REPORT_HOUR, minute=0,
+            max_instances=1, coalesce=True, id="risk_report_job"
+        )
+        self._scheduler.start()
+
+    def stop(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        self.leader.release()
+
+
+risk_report_job = RiskReportJob()
+
+
+if __name__ == "__main__":
+    result = risk_report_job.run_once()
+    print(f"✅ Risk reports: {result}")
@@ -0,0 +1,180 @@
+"""
+Streaming historical VaR
+
+Keeps a sliding window of returns split across two heaps at the VaR order
+statistic (the lower tail in a max-heap, the rest in a min-heap), so each
+new return is an O(log w) insert plus eviction and VaR/ES are read off the
+heap tops without re-sorting the window. Evicted values are removed lazily.
+Results match VaRCalculator.historical_simulation / expected_shortfall over
+the same window.
+"""
+import heapq
+import math
+from collections import Counter, deque
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class _LazyHeap:
+    """Min-heap with lazy deletion; values are negated for a max-heap"""
+
+    def __init__(self, sign: int):
+        self.sign = sign
+        self.heap = []
+        self.counts = Counter()
+        self.delayed = Counter()
+        self.size = 0
+        self.total = 0.0
+
+    def push(self, value: float) -> None:
+        heapq.heappush(self.heap, self.sign * value)
+        self.counts[value] += 1
+        self.size += 1
+        self.total += value
+
+    def top(self) -> float:
+        self._prune()
+        return self.sign * self.heap[0]
+
+    def pop(self) -> float:
+        self._prune()
+        value = self.sign * heapq.heappop(self.heap)
+        self._forget(value)
+        return value
+
+    def remove(self, value: float) -> None:
+        self._forget(value)
+        self.delayed[value] += 1
+        self._prune()
+        # Keep stale entries from piling up when they never reach the top
+        if len(self.heap) > 2 * self.size + 64:
+            self.heap = [self.sign * v for v, n in self.counts.items() for _ in range(n)]
+            heapq.heapify(self.heap)
+            self.delayed.clear()
+
+    def _forget(self, value: float) -> None:
+        self.counts[value] -= 1
+        if not self.counts[value]:
+            del self.counts[value]
+        self.size -= 1
+        self.total -= value
+
+    def _prune(self) -> None:
+        while self.heap:
+            value = self.sign * self.heap[0]
+            if not self.delayed[value]:
+                break
+            heapq.heappop(self.heap)
+            self.delayed[value] -= 1
+            if not self.delayed[value]:
+                del self.delayed[value]
+
+
+class StreamingVaR:
+    """Historical VaR/ES over the last `window` returns, updated one return at a time"""
+
+    def __init__(self, window: int = 250, confidence_level: float = 0.95):
+        if window < 2:
+            raise ValueError("Window must hold at least two returns")
+        self.window = window
+        self.confidence_level = confidence_level
+        self.values = deque()
+        self.lower = _LazyHeap(-1)   # smallest values, max at the top
+        self.upper = _LazyHeap(1)    # the rest, min at the top
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def update(self, value: float) -> bool:
+        """
+        Add a return, evicting the oldest once the window is full. A
+        non-finite value is not added and False is returned, so callers
+        keeping outputs aligned with their inputs can tell.
+        """
+        value = float(value)
+        if not math.isfinite(value):
+            return False
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        if self.lower.size and value <= self.lower.top():
+            self.lower.push(value)
+        else:
+            self.upper.push(value)
+        self._rebalance()
+        return True
+
+    def _remove(self, value: float) -> None:
+        if self.lower.counts[value]:
+            self.lower.remove(value)
+        else:
+            self.upper.remove(value)
+
+    def _position(self):
+        position = (1 - self.confidence_level) * (len(self.values) - 1)
+        return position, int(math.floor(position))
+
+    def _rebalance(self) -> None:
+        # The lower heap holds exactly the order statistics up to the VaR rank
+        target = self._position()[1] + 1 if self.values else 0
+        while self.lower.size > target:
+            self.upper.push(self.lower.pop())
+        while self.lower.size < target and self.upper.size:
+            self.lower.push(self.upper.pop())
+
+    def var(self) -> Optional[float]:
+        """VaR with np.percentile's linear interpolation"""
+        if not self.values:
+            return None
+        position, rank = self._position()
+        low = self.lower.top()
+        if not self.upper.size:
+            return low
+        return low + (position - rank) * (self.upper.top() - low)
+
+    def expected_shortfall(self) -> Optional[float]:
+        """Mean of the window's returns at or below VaR"""
+        var = self.var()
+        if var is None:
+            return None
+        total, count = self.lower.total, self.lower.size
+        # Ties with the next order statistic also sit at the VaR level
+        if self.upper.size and self.upper.top() <= var:
+            ties = self.upper.counts.get(self.upper.top(), 0)
+            total += ties * self.upper.top()
+            count += ties
+        return total / count
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        return {
+            "var": self.var(),
+            "expected_shortfall": self.expected_shortfall(),
+            "observations": len(self.values),
+            "window": self.window,
+            "confidence_level": self.confidence_level
+        }
+
+    @classmethod
+    def rolling_series(cls, returns: pd.Series, window: int = 250,
+                       confidence_level: float = 0.95) -> pd.DataFrame:
+        """
+        Rolling VaR and ES for every full window of returns, in O(n log w)
+        instead of a percentile per window. Indexed by each window's last date.
+        Non-finite returns (NaN, inf) are dropped with their dates first.
+        """
+        values = returns.to_numpy(dtype=float)
+        finite = np.isfinite(values)
+        returns, values = returns[finite], values[finite]
+        stream = cls(window, confidence_level)
+        n = len(returns)
+        var = np.full(n, np.nan)
+        es = np.full(n, np.nan)
+        for i, value in enumerate(values):
+            stream.update(value)
+            if len(stream) == window:
+                var[i] = stream.var()
+                es[i] = stream.expected_shortfall()
+        return pd.DataFrame({"var": var, "expected_shortfall": es},
+                            index=returns.index).iloc[window - 1:]
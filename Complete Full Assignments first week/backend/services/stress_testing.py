@@ -0,0 +1,261 @@
+"""
+Stress testing
+
+A library of named scenarios and an engine that revalues many portfolios
+under all of them at once. Historical scenarios replay each ticker's move
+between two dates (tickers without history over the window, or without
+any price data at all, fall back to the benchmark's move); hypothetical scenarios are shock vectors built from
+a market-wide move plus optional sector and ticker overrides.
+
+Every scenario becomes a row of a scenarios x tickers shock matrix and every
+portfolio a row of a portfolios x tickers dollar-exposure matrix, so the
+P&L for all pairs is a single matrix product.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services.market_data import MarketDataService
+
+
+BENCHMARK = "SPY"
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "dotcom_crash": {
+        "type": "historical", "start": "2000-03-24", "end": "2002-10-09",
+        "description": "Dot-com bust, S&P 500 peak to trough"
+    },
+    "financial_crisis_2008": {
+        "type": "historical", "start": "2008-09-12", "end": "2009-03-09",
+        "description": "Lehman collapse to the March 2009 low"
+    },
+    "flash_crash_2010": {
+        "type": "historical", "start": "2010-04-23", "end": "2010-07-02",
+        "description": "May 2010 flash crash and the summer sell-off"
+    },
+    "taper_tantrum_2013": {
+        "type": "historical", "start": "2013-05-21", "end": "2013-06-24",
+        "description": "Fed taper signal and bond sell-off"
+    },
+    "volmageddon_2018": {
+        "type": "historical", "start": "2018-01-26", "end": "2018-02-08",
+        "description": "February 2018 volatility spike"
+    },
+    "covid_crash_2020": {
+        "type": "historical", "start": "2020-02-19", "end": "2020-03-23",
+        "description": "COVID-19 crash, S&P 500 peak to trough"
+    },
+    "rate_shock_2022": {
+        "type": "historical", "start": "2022-01-03", "end": "2022-10-12",
+        "description": "2022 Fed hiking cycle drawdown"
+    },
+    "equity_crash_20": {
+        "type": "hypothetical", "market": -0.20,
+        "description": "Broad equity sell-off of 20%"
+    },
+    "equity_crash_40": {
+        "type": "hypothetical", "market": -0.40,
+        "description": "Severe equity sell-off of 40%"
+    },
+    "rates_up_200bp": {
+        "type": "hypothetical", "market": -0.08,
+        "sectors": {
+            "Technology": -0.15, "Communication Services": -0.12, "Real Estate": -0.18,
+            "Utilities": -0.12, "Consumer Cyclical": -0.10, "Financial Services": 0.03,
+            "Energy": -0.02
+        },
+        "description": "Parallel +200bp rate shock; long-duration sectors hit hardest"
+    },
+    "oil_spike": {
+        "type": "hypothetical", "market": -0.05,
+        "sectors": {
+            "Energy": 0.25, "Industrials": -0.08, "Consumer Cyclical": -0.12,
+            "Consumer Defensive": -0.04
+        },
+        "description": "Oil price up 50% on a supply shock"
+    },
+    "tech_selloff": {
+        "type": "hypothetical", "market": -0.07,
+        "sectors": {"Technology": -0.30, "Communication Services": -0.22},
+        "description": "Technology de-rating of 30%"
+    }
+}
+
+
+class StressTester:
+    """Revalues portfolios under stress scenarios"""
+
+    def __init__(self, market_data: Optional[MarketDataService] = None):
+        self.market_data = market_data or MarketDataService()
+        # Historical moves never change, so they are kept per (scenario, ticker),
+        # and the benchmark's per scenario
+        self._historical_shocks: Dict[tuple, float] = {}
+        self._benchmark_moves: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def list_scenarios() -> List[Dict[str, Any]]:
+        return [{"name": name, **scenario} for name, scenario in SCENARIOS.items()]
+
+    def shock_matrix(self, tickers: List[str], scenarios: Dict[str, Dict[str, Any]],
+                     sectors: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        """scenarios x tickers matrix of simple returns"""
+        historical = [name for name, s in scenarios.items() if s["type"] == "historical"]
+        historical_shocks = self.historical_shocks(tickers, {n: scenarios[n] for n in historical})
+
+        if sectors is None and any(s.get("sectors") for s in scenarios.values()):
+            sectors = self.sectors(tickers)
+
+        rows = []
+        for name, scenario in scenarios.items():
+            if scenario["type"] == "historical":
+                rows.append(historical_shocks.loc[name].to_numpy())
+            else:
+                rows.append(self.hypothetical_shocks(tickers, scenario, sectors or {}))
+        return pd.DataFrame(np.vstack(rows) if rows else np.empty((0, len(tickers))),
+                            index=list(scenarios), columns=tickers)
+
+    @staticmethod
+    def hypothetical_shocks(tickers: List[str], scenario: Dict[str, Any],
+                            sectors: Dict[str, str]) -> np.ndarray:
+        """Ticker override, else sector shock, else the market-wide move"""
+        market = scenario.get("market", 0.0)
+        sector_shocks = scenario.get("sectors", {})
+        ticker_shocks = scenario.get("tickers", {})
+        return np.array([
+            ticker_shocks.get(ticker, sector_shocks.get(sectors.get(ticker), market))
+            for ticker in tickers
+        ], dtype=float)
+
+    def historical_shocks(self, tickers: List[str],
+                          scenarios: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+        """Each ticker's close-to-close move over each scenario window"""
+        names = list(scenarios)
+        with self._lock:
+            shocks = np.array([[self._historical_shocks.get((name, ticker), np.nan) for ticker in tickers]
+                               for name in names], dtype=float).reshape(len(names), len(tickers))
+
+        missing = [tickers[j] for j in np.flatnonzero(np.isnan(shocks).any(axis=0))]
+        if missing:
+            with self._lock:
+                benchmark_cached = all(name in self._benchmark_moves for name in names)
+            fetch = missing if benchmark_cached else list(dict.fromkeys(missing + [BENCHMARK]))
+            prices = self.market_data.get_close_prices(fetch, "max").reindex(columns=fetch)
+            # An all-empty fetch comes back without a date index
+            prices.index = pd.DatetimeIndex(prices.index)
+            if prices.index.tz is not None:
+                prices.index = prices.index.tz_localize(None)
+            # A ticker with no price data at all is not cached: it may be a transient upstream gap
+            priced = set(prices.columns[prices.notna().any()])
+            columns = [tickers.index(ticker) for ticker in missing]
+            for i, name in enumerate(names):
+                moves = self._window_moves(prices, scenarios[name]["start"], scenarios[name]["end"])
+                with self._lock:
+                    if name not in self._benchmark_moves and BENCHMARK in moves:
+                        self._benchmark_moves[name] = float(moves[BENCHMARK])
+                    benchmark = self._benchmark_moves.get(name, np.nan)
+                # Tickers that did not trade through the window take the benchmark's move
+                found = moves.reindex(missing).to_numpy(dtype=float)
+                found = np.where(np.isnan(found), benchmark, found)
+                with self._lock:
+                    for ticker, move in zip(missing, found):
+                        if ticker in priced and not np.isnan(move):
+                            self._historical_shocks[(name, ticker)] = float(move)
+                shocks[i, columns] = found
+        return pd.DataFrame(np.nan_to_num(shocks), index=names, columns=tickers)
+
+    @staticmethod
+    def _window_moves(prices: pd.DataFrame, start: str, end: str) -> pd.Series:
+        """Return from the last close on/before start to the last close on/before end"""
+        window = prices.loc[:pd.Timestamp(end)]
+        before = window.loc[:pd.Timestamp(start)]
+        if before.empty or window.empty:
+            return pd.Series(dtype=float)
+        # NaN unless the ticker had traded by the window start
+        first = before.ffill().iloc[-1]
+        last = window.ffill().iloc[-1]
+        return (last / first - 1).dropna()
+
+    def sectors(self, tickers: List[str]) -> Dict[str, str]:
+        quotes = self.market_data.get_quotes(tickers)
+        return {t: s for t, s in quotes["sector"].items() if isinstance(s, str) and s}
+
+    @staticmethod
+    def exposure_matrix(portfolios: Dict[Any, Dict[str, float]], tickers: List[str]) -> np.ndarray:
+        """portfolios x tickers dollar exposures"""
+        column = {ticker: j for j, ticker in enumerate(tickers)}
+        entries = [(i, column[ticker], amount)
+                   for i, holdings in enumerate(portfolios.values())
+                   for ticker, amount in holdings.items()]
+        exposures = np.zeros((len(portfolios), len(tickers)))
+        if entries:
+            rows, cols, amounts = zip(*entries)
+            np.add.at(exposures, (np.array(rows), np.array(cols)), np.array(amounts, dtype=float))
+        return exposures
+
+    @staticmethod
+    def revalue(exposures: np.ndarray, shocks: np.ndarray) -> np.ndarray:
+        """P&L for every portfolio under every scenario (portfolios x scenarios)"""
+        return exposures @ shocks.T
+
+    def run(self, portfolios: Dict[Any, Dict[str, float]], scenario_names: Optional[List[str]] = None,
+            custom_scenarios: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Stress every portfolio (name -> {ticker: dollar exposure}) under the
+        chosen library scenarios plus any custom ones
+        """
+        names = scenario_names or list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {', '.join(unknown)}")
+        scenarios = {name: SCENARIOS[name] for name in names}
+        clashing = [name for name in (custom_scenarios or {}) if name in SCENARIOS]
+        if clashing:
+            raise ValueError(f"Custom scenario names clash with library scenarios: {', '.join(clashing)}")
+        for name, scenario in (custom_scenarios or {}).items():
+            scenarios[name] = {"type": "hypothetical", **scenario}
+
+        tickers = sorted({ticker for holdings in portfolios.values() for ticker in holdings})
+        shocks = self.shock_matrix(tickers, scenarios)
+        exposures = self.exposure_matrix(portfolios, tickers)
+        pnl = pd.DataFrame(self.revalue(exposures, shocks.to_numpy()),
+                           index=list(portfolios), columns=shocks.index)
+        values = exposures.sum(axis=1)
+        return {
+            "pnl": pnl,
+            "pnl_pct": pnl.div(np.where(values != 0, values, np.nan), axis=0) * 100,
+            "shocks": shocks,
+            "values": pd.Series(values, index=list(portfolios))
+        }
+
+    @staticmethod
+    def portfolios_from_db(db, user_id: int) -> Dict[str, Dict[str, float]]:
+        """A user's portfolios as dollar exposures (quantity x latest price)"""
+        from backend.models import Portfolio, PortfolioHolding, Stock
+
+        rows = (
+            db.query(Portfolio.id, Portfolio.name, Stock.ticker_symbol,
+                     PortfolioHolding.quantity, PortfolioHolding.current_value)
+            .join(PortfolioHolding, PortfolioHolding.portfolio_id == Portfolio.id)
+            .join(Stock, PortfolioHolding.stock_id == Stock.id)
+            .filter(Portfolio.user_id == user_id)
+            .all()
+        )
+        tickers = sorted({row.ticker_symbol for row in rows})
+        prices = MarketDataService.get_quotes(tickers)["current_price"] if tickers else pd.Series(dtype=float)
+
+        portfolios: Dict[str, Dict[str, float]] = {}
+        for row in rows:
+            price = prices.get(row.ticker_symbol)
+            if price is not None and not pd.isna(price):
+                amount = float(row.quantity) * float(price)
+            else:
+                amount = float(row.current_value or 0)
+            holdings = portfolios.setdefault(f"{row.id}: {row.name}", {})
+            holdings[row.ticker_symbol] = holdings.get(row.ticker_symbol, 0.0) + amount
+        return portfolios
+
+
+stress_tester = StressTester()
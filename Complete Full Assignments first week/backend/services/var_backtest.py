@@ -0,0 +1,207 @@
+"""
+VaR backtesting
+
+Rolling one-day-ahead VaR forecasts for each VaRCalculator method, computed
+for a whole returns matrix (dates x tickers) with array operations:
+
+- historical simulation: partitioned sliding windows, processed in chunks
+- parametric: rolling mean/std from prefix sums
+- monte carlo: one set of standard normal draws shared by every window
+  (common random numbers), so each forecast is mean + std * simulated quantile
+
+Exceptions are scored with Kupiec's unconditional coverage (POF) test and
+Christoffersen's independence and conditional coverage tests.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import stats
+from scipy.special import xlogy
+
+
+METHODS = ["historical_simulation", "parametric", "monte_carlo"]
+
+# Elements per chunk of sliding windows (dates x tickers x window)
+CHUNK_ELEMENTS = 8_000_000
+
+
+def _window_valid(returns: np.ndarray, window: int) -> np.ndarray:
+    """True where a window (and the day after it) has no missing returns"""
+    missing = np.vstack([np.zeros((1, returns.shape[1])), np.cumsum(np.isnan(returns), axis=0)])
+    window_missing = missing[window:-1] - missing[:-window - 1]
+    return (window_missing == 0) & ~np.isnan(returns[window:])
+
+
+def historical_forecasts(returns: np.ndarray, window: int, confidence_level: float) -> np.ndarray:
+    """Rolling np.percentile-style quantile of the previous `window` returns"""
+    position = (1 - confidence_level) * (window - 1)
+    rank = int(np.floor(position))
+    upper = min(rank + 1, window - 1)
+    filled = np.nan_to_num(returns[:-1])
+    # views shaped (windows, tickers, window); the last window has no next-day return
+    windows = sliding_window_view(filled, window, axis=0)
+
+    n_windows, n_tickers = windows.shape[:2]
+    step = max(1, CHUNK_ELEMENTS // max(1, n_tickers * window))
+    forecasts = np.empty((n_windows, n_tickers))
+    for start in range(0, n_windows, step):
+        block = np.partition(windows[start:start + step], [rank, upper], axis=-1)
+        low = block[..., rank]
+        forecasts[start:start + step] = low + (position - rank) * (block[..., upper] - low)
+    return forecasts
+
+
+def _rolling_moments(returns: np.ndarray, window: int):
+    """Rolling mean and sample std (ddof=1) of the previous `window` returns"""
+    filled = np.nan_to_num(returns[:-1])
+    # Centre first so the prefix sums of squares stay well conditioned
+    filled = filled - filled.mean(axis=0)
+    zero = np.zeros((1, filled.shape[1]))
+    s1 = np.vstack([zero, np.cumsum(filled, axis=0)])
+    s2 = np.vstack([zero, np.cumsum(filled ** 2, axis=0)])
+    total = s1[window:] - s1[:-window]
+    total_sq = s2[window:] - s2[:-window]
+    mean = total / window
+    var = np.clip((total_sq - total * mean) / (window - 1), 0, None)
+    offset = np.nan_to_num(returns[:-1]).mean(axis=0)
+    return mean + offset, np.sqrt(var)
+
+
+def parametric_forecasts(returns: np.ndarray, window: int, confidence_level: float) -> np.ndarray:
+    mean, std = _rolling_moments(returns, window)
+    return mean + stats.norm.ppf(1 - confidence_level) * std
+
+
+def monte_carlo_forecasts(returns: np.ndarray, window: int, confidence_level: float,
+                          num_simulations: int = 10000, seed: Optional[int] = None) -> np.ndarray:
+    mean, std = _rolling_moments(returns, window)
+    draws = np.random.default_rng(seed).standard_normal(num_simulations)
+    quantile = np.percentile(draws, (1 - confidence_level) * 100)
+    return mean + quantile * std
+
+
+def kupiec_pof(exceptions: np.ndarray, observations: np.ndarray, confidence_level: float):
+    """Unconditional coverage likelihood ratio and p-value (chi-squared, 1 dof)"""
+    p = 1 - confidence_level
+    x = exceptions.astype(float)
+    n = observations.astype(float)
+    rate = np.divide(x, n, out=np.zeros_like(x), where=n > 0)
+    log_null = xlogy(n - x, 1 - p) + xlogy(x, p)
+    log_alt = xlogy(n - x, 1 - rate) + xlogy(x, rate)
+    lr = np.clip(-2 * (log_null - log_alt), 0, None)
+    return lr, stats.chi2.sf(lr, 1)
+
+
+def christoffersen(hits: np.ndarray, valid: np.ndarray):
+    """
+    Independence likelihood ratio (chi-squared, 1 dof) from exception
+    transitions along axis 0. Transitions touching a missing day are skipped.
+    """
+    pair = valid[1:] & valid[:-1]
+    prev, curr = hits[:-1], hits[1:]
+    n00 = (pair & ~prev & ~curr).sum(axis=0).astype(float)
+    n01 = (pair & ~prev & curr).sum(axis=0).astype(float)
+    n10 = (pair & prev & ~curr).sum(axis=0).astype(float)
+    n11 = (pair & prev & curr).sum(axis=0).astype(float)
+
+    def ratio(a, b):
+        return np.divide(a, a + b, out=np.zeros_like(a), where=(a + b) > 0)
+
+    pi01, pi11, pi = ratio(n01, n00), ratio(n11, n10), ratio(n01 + n11, n00 + n10)
+    log_null = xlogy(n00 + n10, 1 - pi) + xlogy(n01 + n11, pi)
+    log_alt = xlogy(n00, 1 - pi01) + xlogy(n01, pi01) + xlogy(n10, 1 - pi11) + xlogy(n11, pi11)
+    lr = np.clip(-2 * (log_null - log_alt), 0, None)
+    return lr, stats.chi2.sf(lr, 1)
+
+
+class VaRBacktester:
+    """Rolling VaR forecasts and coverage tests across many tickers at once"""
+
+    @staticmethod
+    def forecasts(returns: pd.DataFrame, window: int = 250, confidence_level: float = 0.99,
+                  methods: List[str] = None, num_simulations: int = 10000,
+                  seed: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Forecast for each date made from the `window` returns before it.
+        Dates whose window has missing returns are NaN.
+        """
+        methods = methods or METHODS
+        values = returns.to_numpy(dtype=float)
+        if len(values) <= window:
+            raise ValueError(f"Need more than {window} returns to backtest a {window}-day window")
+        valid = _window_valid(values, window)
+
+        result = {}
+        for method in methods:
+            if method == "historical_simulation":
+                forecast = historical_forecasts(values, window, confidence_level)
+            elif method == "parametric":
+                forecast = parametric_forecasts(values, window, confidence_level)
+            elif method == "monte_carlo":
+                forecast = monte_carlo_forecasts(values, window, confidence_level, num_simulations, seed)
+            else:
+                raise ValueError(f"Unknown VaR method: {method}")
+            result[method] = pd.DataFrame(np.where(valid, forecast, np.nan),
+                                          index=returns.index[window:], columns=returns.columns)
+        return result
+
+    @staticmethod
+    def run(returns: pd.DataFrame, window: int = 250, confidence_level: float = 0.99,
+            methods: List[str] = None, significance: float = 0.05,
+            num_simulations: int = 10000, seed: Optional[int] = None) -> pd.DataFrame:
+        """Scorecard with one row per (method, ticker)"""
+        forecasts = VaRBacktester.forecasts(returns, window, confidence_level, methods,
+                                            num_simulations, seed)
+        realized = returns.to_numpy(dtype=float)[window:]
+
+        frames = []
+        for method, forecast in forecasts.items():
+            var = forecast.to_numpy()
+            valid = ~np.isnan(var)
+            hits = valid & (realized < var)
+            observations = valid.sum(axis=0)
+            exceptions = hits.sum(axis=0)
+
+            pof_lr, pof_p = kupiec_pof(exceptions, observations, confidence_level)
+            ind_lr, ind_p = christoffersen(hits, valid)
+            cc_lr = pof_lr + ind_lr
+            cc_p = stats.chi2.sf(cc_lr, 2)
+
+            frames.append(pd.DataFrame({
+                "method": method,
+                "ticker": returns.columns,
+                "observations": observations,
+                "exceptions": exceptions,
+                "expected_exceptions": observations * (1 - confidence_level),
+                "exception_rate": np.divide(exceptions, observations, out=np.zeros(len(observations)),
+                                            where=observations > 0),
+                "kupiec_lr": pof_lr,
+                "kupiec_pvalue": pof_p,
+                "independence_lr": ind_lr,
+                "independence_pvalue": ind_p,
+                "conditional_coverage_lr": cc_lr,
+                "conditional_coverage_pvalue": cc_p,
+                "passed": (pof_p >= significance) & (cc_p >= significance)
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def run_universe(tickers: List[str], period: str = "5y", window: int = 250,
+                     confidence_level: float = 0.99, methods: List[str] = None,
+                     significance: float = 0.05) -> pd.DataFrame:
+        """Backtest daily closes for tickers, from the price panel when it has them"""
+        from backend.services.price_panel import get_panel
+        from backend.services.market_data import MarketDataService
+
+        tickers = list(dict.fromkeys(tickers))
+        panel = get_panel()
+        if panel is not None and panel.has(tickers) and panel.covers(period):
+            prices = panel.frame(tickers, period)
+        else:
+            prices = MarketDataService.get_close_prices(tickers, period)
+        # No forward fill: a gap must stay missing, not become a zero return.
+        # Dates missing for only some tickers stay, masked per ticker by forecasts()
+        returns = prices.pct_change(fill_method=None).dropna(how="all")
+        return VaRBacktester.run(returns, window, confidence_level, methods, significance)
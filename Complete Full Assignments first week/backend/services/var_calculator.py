@@ -3,13 +3,19 @@ Value at Risk (VaR) calculator
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from scipy import stats
+from backend.services.risk_attribution import RiskAttribution
 
 
 class VaRCalculator:
     """Service for calculating Value at Risk using multiple methods"""
     
+    # Default grid for risk reports
+    GRID_CONFIDENCE_LEVELS = [0.90, 0.95, 0.975, 0.99, 0.999]
+    GRID_HORIZONS = [1, 5, 10]
+    GRID_METHODS = ["historical_simulation", "parametric", "monte_carlo"]
+    
     @staticmethod
     def historical_simulation(returns: pd.Series, confidence_level: float = 0.95) -> float:
         """
@@ -36,26 +42,111 @@ class VaRCalculator:
     
     @staticmethod
     def monte_carlo_var(returns: pd.Series, confidence_level: float = 0.95,
-                       num_simulations: int = 10000) -> Dict[str, Any]:
+                       num_simulations: int = 10000, workers: int = 1,
+                       seed: Optional[int] = None, sampling: str = "pseudo",
+                       control_variate: bool = False,
+                       tolerance: Optional[float] = None) -> Dict[str, Any]:
         """
         Calculate VaR using Monte Carlo simulation
+        
+        Runs on the Monte Carlo engine, repeatable for a given seed and worker
+        count. Variance-reduced sampling ("antithetic", "sobol", "halton"),
+        the control variate or a standard-error tolerance switch to the
+        engine's batched mode, where num_simulations is the upper bound.
+        simulated_returns is the first 1,000 of the engine's own simulated
+        returns, so a chart shows the distribution the VaR was taken from.
         """
         mean = returns.mean()
         std = returns.std()
         
-        # Generate random returns
-        simulated_returns = np.random.normal(mean, std, num_simulations)
-        
-        # Calculate VaR
-        var_percentile = (1 - confidence_level) * 100
-        var = np.percentile(simulated_returns, var_percentile)
+        from backend.services.monte_carlo_engine import MonteCarloEngine
+        engine = MonteCarloEngine([mean], [[std ** 2]], seed=seed)
+        if sampling != "pseudo" or control_variate or tolerance is not None:
+            result = engine.run_adaptive(
+                [1.0], confidence_level, num_simulations, sampling, control_variate,
+                tolerance, seed=seed, sample=1000
+            )
+        else:
+            result = engine.run([1.0], confidence_level, num_simulations, workers=workers,
+                                seed=seed, sample=1000)
         
         return {
-            "var": float(var),
+            "var": result["var"],
+            "standard_error": result["standard_error"],
             "mean": float(mean),
             "std": float(std),
-            "simulations": num_simulations,
-            "simulated_returns": simulated_returns[:1000].tolist()  # Return first 1000
+            "simulations": result["simulations"],
+            "workers": result["workers"],
+            "seed": result["seed"],
+            "sampling": result["sampling"],
+            "control_variate": result["control_variate"],
+            "converged": result.get("converged"),
+            "simulated_returns": result["sample"]
+        }
+    
+    @staticmethod
+    def filtered_historical_simulation(returns: pd.Series, confidence_level: float = 0.95,
+                                       model: str = "garch", ticker: Optional[str] = None,
+                                       observations: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Calculate VaR using filtered historical simulation
+        Standardized residuals from an EWMA/GARCH(1,1) fit are rescaled to
+        the current volatility forecast before taking the quantile. Fits for
+        a ticker come from the shared cache and are updated incrementally.
+        """
+        from backend.services.volatility_models import fit, volatility_model_service
+        
+        returns = returns.dropna()
+        if ticker:
+            fitted = volatility_model_service.get(ticker, returns, model)
+        else:
+            fitted = fit(model, returns)
+        
+        scaled = np.sort(fitted.scaled_returns(observations or len(returns)))
+        var, es = VaRCalculator._sorted_tail_stats(scaled, np.array([1 - confidence_level]))
+        
+        return {
+            "var": float(var[0]),
+            "expected_shortfall": float(es[0]),
+            "volatility_model": fitted.summary(),
+            "observations": len(scaled)
+        }
+    
+    @staticmethod
+    def filtered_var_for_ticker(ticker: str, confidence_level: float = 0.95,
+                                model: str = "garch", period: str = "2y",
+                                portfolio_value: float = 100000) -> Dict[str, Any]:
+        """
+        Filtered historical simulation VaR for one ticker, next to the
+        unfiltered historical figure for comparison
+        """
+        from backend.services.market_data import MarketDataService
+        
+        prices = MarketDataService.get_historical_data(ticker, period)
+        if prices.empty:
+            raise ValueError(f"No price data for {ticker}")
+        returns = prices['Close'].pct_change().dropna()
+        
+        fhs = VaRCalculator.filtered_historical_simulation(returns, confidence_level, model, ticker)
+        hist_var = VaRCalculator.historical_simulation(returns, confidence_level)
+        
+        return {
+            "ticker": ticker.upper(),
+            "confidence_level": confidence_level,
+            "portfolio_value": portfolio_value,
+            "filtered_historical_simulation": {
+                "var_pct": fhs["var"] * 100,
+                "var_dollar": fhs["var"] * portfolio_value,
+                "es_pct": fhs["expected_shortfall"] * 100,
+                "es_dollar": fhs["expected_shortfall"] * portfolio_value,
+                "description": "Historical shocks rescaled to current volatility"
+            },
+            "historical_simulation": {
+                "var_pct": hist_var * 100,
+                "var_dollar": hist_var * portfolio_value,
+                "description": "Based on actual historical returns distribution"
+            },
+            "volatility_model": fhs["volatility_model"]
         }
     
     @staticmethod
@@ -115,6 +206,101 @@ class VaRCalculator:
         es = tail_returns.mean()
         return float(es)
     
+    @staticmethod
+    def rolling_var(returns: pd.Series, window: int = 250,
+                    confidence_level: float = 0.95) -> pd.DataFrame:
+        """
+        Rolling historical VaR and Expected Shortfall over a sliding window
+        """
+        from backend.services.streaming_var import StreamingVaR
+        return StreamingVaR.rolling_series(returns, window, confidence_level)
+    
+    @staticmethod
+    def _sorted_tail_stats(sorted_returns: np.ndarray, tail_probs: np.ndarray):
+        """
+        VaR (np.percentile-style linear interpolation) and ES for many tail
+        probabilities from one sorted sample
+        """
+        n = len(sorted_returns)
+        pos = tail_probs * (n - 1)
+        lo = np.floor(pos).astype(int)
+        hi = np.minimum(lo + 1, n - 1)
+        var = sorted_returns[lo] + (pos - lo) * (sorted_returns[hi] - sorted_returns[lo])
+        
+        # ES: mean of returns at or below VaR, via a prefix sum of the sorted sample
+        counts = np.maximum(np.searchsorted(sorted_returns, var, side="right"), 1)
+        es = np.cumsum(sorted_returns)[counts - 1] / counts
+        return var, es
+    
+    @staticmethod
+    def var_grid(returns: pd.Series, confidence_levels: List[float] = None,
+                 horizons: List[int] = None, methods: List[str] = None,
+                 num_simulations: int = 10000, seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        VaR and Expected Shortfall for every (method, confidence, horizon) in one pass
+        
+        Returns are sorted once per method and all quantiles are read off that
+        sorted sample. Multi-day horizons scale the drift with h and the
+        deviation from it with sqrt(h): mean * h + (x - mean) * sqrt(h),
+        as the Monte Carlo engine does. "var" and "es" are arrays of shape (methods, confidence levels, horizons).
+        The Monte Carlo draw is repeatable for a given seed; one is drawn and
+        reported when none is passed.
+        """
+        confidence_levels = np.asarray(confidence_levels or VaRCalculator.GRID_CONFIDENCE_LEVELS, dtype=float)
+        horizons = np.asarray(horizons or VaRCalculator.GRID_HORIZONS, dtype=float)
+        methods = methods or VaRCalculator.GRID_METHODS
+        if not ((confidence_levels > 0) & (confidence_levels < 1)).all():
+            raise ValueError("Confidence levels must be between 0 and 1")
+        if not ((horizons >= 1) & (horizons == np.floor(horizons))).all():
+            raise ValueError("Horizons must be whole numbers of days, at least 1")
+        if num_simulations < 1:
+            raise ValueError("num_simulations must be positive")
+        
+        sample = np.asarray(returns, dtype=float)
+        sample = sample[np.isfinite(sample)]
+        if len(sample) < 2:
+            raise ValueError("Need at least 2 returns")
+        if seed is None:
+            seed = int(np.random.default_rng().integers(2 ** 63))
+        tail_probs = 1 - confidence_levels
+        mean, std = sample.mean(), sample.std(ddof=1)
+        
+        one_day_var = np.empty((len(methods), len(confidence_levels)))
+        one_day_es = np.empty_like(one_day_var)
+        for i, method in enumerate(methods):
+            if method == "historical_simulation":
+                var, es = VaRCalculator._sorted_tail_stats(np.sort(sample), tail_probs)
+            elif method == "parametric":
+                z = stats.norm.ppf(tail_probs)
+                var = mean + z * std
+                es = mean - std * stats.norm.pdf(z) / tail_probs
+            elif method == "monte_carlo":
+                simulated = np.sort(np.random.default_rng(seed).normal(mean, std, num_simulations))
+                var, es = VaRCalculator._sorted_tail_stats(simulated, tail_probs)
+            else:
+                raise ValueError(f"Unknown VaR method: {method}")
+            one_day_var[i], one_day_es[i] = var, es
+        
+        drift, scale = mean * horizons, np.sqrt(horizons)
+        return {
+            "methods": list(methods),
+            "confidence_levels": confidence_levels.tolist(),
+            "horizons": horizons.astype(int).tolist(),
+            "seed": seed,
+            "var": drift + (one_day_var[:, :, None] - mean) * scale,
+            "es": drift + (one_day_es[:, :, None] - mean) * scale
+        }
+    
+    @staticmethod
+    def combine_holdings(tickers: List[str], weights: List[float]) -> Tuple[List[str], List[float]]:
+        """Sum the weights of repeated tickers, keeping first-seen order"""
+        if len(tickers) != len(weights):
+            raise ValueError("Number of tickers must match number of weights")
+        combined: Dict[str, float] = {}
+        for ticker, weight in zip(tickers, weights):
+            combined[ticker] = combined.get(ticker, 0.0) + float(weight)
+        return list(combined), list(combined.values())
+    
     @staticmethod
     def dual_stock_var(ticker1: str, ticker2: str, weights: List[float],
                       confidence_level: float = 0.95, period: str = "1y",
@@ -122,22 +308,18 @@ class VaRCalculator:
         """
         Calculate VaR for a two-stock portfolio
         """
-        from backend.services.market_data import MarketDataService
+        from backend.services.returns_stats import TRADING_DAYS, returns_stats_service
         
-        market_data = MarketDataService()
+        # The same ticker twice is one holding with the combined weight
+        tickers, holding_weights = VaRCalculator.combine_holdings([ticker1, ticker2], weights)
         
-        # Get historical data
-        data = market_data.get_multiple_stocks([ticker1, ticker2], period)
-        
-        # Calculate returns
-        prices1 = data[ticker1]['Close']
-        prices2 = data[ticker2]['Close']
-        
-        returns1 = prices1.pct_change().dropna()
-        returns2 = prices2.pct_change().dropna()
+        # Aligned daily returns (shared with the portfolio service)
+        stats = returns_stats_service.get(tickers, period)
+        returns1 = stats.returns[ticker1]
+        returns2 = stats.returns[ticker2]
         
         # Portfolio returns
-        portfolio_returns = weights[0] * returns1 + weights[1] * returns2
+        portfolio_returns = stats.returns[tickers] @ np.asarray(holding_weights, dtype=float)
         
         # Calculate VaR using all methods
         var_results = VaRCalculator.calculate_all_methods(
@@ -158,4 +340,106 @@ class VaRCalculator:
             "correlation": float(returns1.corr(returns2))
         }
         
+        # Which stock drives the risk (parametric decomposition)
+        attribution = RiskAttribution.parametric(
+            holding_weights, stats.mean_array / TRADING_DAYS, stats.cov_array / TRADING_DAYS, confidence_level
+        )
+        var_results["attribution"] = RiskAttribution.table(
+            tickers, holding_weights, attribution, portfolio_value
+        )
+        
         return var_results
+    
+    @staticmethod
+    def var_attribution(tickers: List[str], weights: List[float],
+                        confidence_level: float = 0.95, period: str = "1y",
+                        portfolio_value: float = 100000,
+                        methods: List[str] = None,
+                        num_simulations: int = 100000,
+                        cov_method: str = "sample") -> Dict[str, Any]:
+        """
+        Marginal, component and incremental VaR for every holding
+        (cov_method applies to the parametric and Monte Carlo covariance)
+        """
+        from backend.services.returns_stats import TRADING_DAYS, returns_stats_service
+        
+        tickers, weights = VaRCalculator.combine_holdings(tickers, weights)
+        methods = methods or ["parametric", "historical_simulation"]
+        
+        stats = returns_stats_service.get(tickers, period, cov_method)
+        mean = stats.mean_array / TRADING_DAYS
+        cov = stats.cov_array / TRADING_DAYS
+        
+        results = {}
+        for method in methods:
+            if method == "parametric":
+                attribution = RiskAttribution.parametric(weights, mean, cov, confidence_level)
+            elif method == "historical_simulation":
+                attribution = RiskAttribution.historical(stats.returns_array, weights, confidence_level)
+            elif method == "monte_carlo":
+                attribution = RiskAttribution.monte_carlo(weights, mean, cov, confidence_level, num_simulations)
+            else:
+                raise ValueError(f"Unknown VaR method: {method}")
+            
+            results[method] = {
+                "var_pct": float(attribution["var"] * 100),
+                "var_dollar": float(attribution["var"] * portfolio_value),
+                "holdings": RiskAttribution.table(tickers, weights, attribution, portfolio_value)
+            }
+        
+        return {
+            "confidence_level": confidence_level,
+            "portfolio_value": portfolio_value,
+            "period": period,
+            "cov_method": cov_method,
+            **results
+        }
+    
+    @staticmethod
+    def portfolio_monte_carlo_var(tickers: List[str], weights: List[float],
+                                  confidence_level: float = 0.95, period: str = "1y",
+                                  portfolio_value: float = 100000,
+                                  num_simulations: int = 100000,
+                                  horizon: int = 1, workers: int = 1,
+                                  seed: Optional[int] = None,
+                                  cov_method: str = "sample") -> Dict[str, Any]:
+        """
+        Correlated Monte Carlo VaR/ES for a portfolio of any number of stocks
+        """
+        from backend.services.monte_carlo_engine import MonteCarloEngine
+        from backend.services.returns_stats import TRADING_DAYS, returns_stats_service
+        
+        tickers, weights = VaRCalculator.combine_holdings(tickers, weights)
+        
+        # Daily mean and covariance (shared with the portfolio service)
+        stats = returns_stats_service.get(tickers, period, cov_method)
+        engine = MonteCarloEngine(stats.mean_array / TRADING_DAYS, stats.cov_array / TRADING_DAYS)
+        result = engine.run(weights, confidence_level, num_simulations, horizon, workers, seed)
+        
+        return {
+            "confidence_level": confidence_level,
+            "portfolio_value": portfolio_value,
+            "horizon_days": horizon,
+            "cov_method": cov_method,
+            "simulations": result["simulations"],
+            "workers": result["workers"],
+            "seed": result["seed"],
+            "factorization": result["factorization"],
+            "var_pct": result["var"] * 100,
+            "var_dollar": result["var"] * portfolio_value,
+            "expected_shortfall": {
+                "es_pct": result["expected_shortfall"] * 100,
+                "es_dollar": result["expected_shortfall"] * portfolio_value
+            },
+            "contributions": [
+                {
+                    "ticker": ticker,
+                    "weight": weight,
+                    "var_dollar": var_c * portfolio_value,
+                    "es_dollar": es_c * portfolio_value
+                }
+                for ticker, weight, var_c, es_c in zip(
+                    tickers, weights, result["var_contributions"], result["es_contributions"]
+                )
+            ]
+        }
@@ -0,0 +1,192 @@
+"""
+Volatility models for filtered historical simulation
+
+EWMA (RiskMetrics) and GARCH(1,1) conditional variances. Both recursions
+run through scipy.signal.lfilter, and GARCH is fitted by Gaussian maximum
+likelihood with variance targeting (two free parameters). A fit keeps its
+standardized residuals and next-day variance forecast, and can be extended
+with new returns in O(new returns) without refitting. VolatilityModelService
+caches fits per (ticker, model, as-of date), extends the latest one as new
+returns arrive and only re-estimates parameters every VOL_MODEL_REFIT_DAYS.
+"""
+import copy
+import math
+import threading
+from datetime import date
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.signal import lfilter
+
+from backend.config import settings
+from backend.services.cache import MISSING, TTLCache
+
+
+MODELS = ["ewma", "garch"]
+EWMA_LAMBDA = 0.94
+
+
+def variance_path(returns: np.ndarray, omega: float, alpha: float, beta: float,
+                  initial_variance: float) -> np.ndarray:
+    """
+    sigma2[t] = omega + alpha * r[t-1]^2 + beta * sigma2[t-1], for t = 0..n,
+    where sigma2[0] = initial_variance and sigma2[n] is the next-day forecast
+    """
+    drive = omega + alpha * np.square(returns)
+    path, _ = lfilter([1.0], [1.0, -beta], drive, zi=[beta * initial_variance])
+    return np.concatenate(([initial_variance], path))
+
+
+class VolatilityFit:
+    """A fitted model: parameters, conditional variances and standardized residuals"""
+
+    def __init__(self, model: str, returns: pd.Series, params: Dict[str, float],
+                 fitted_on: date):
+        self.model = model
+        self.params = params
+        self.fitted_on = fitted_on
+        self.mean = float(returns.mean()) if model == "garch" else 0.0
+        centered = returns.to_numpy(dtype=float) - self.mean
+        variances = variance_path(centered, params["omega"], params["alpha"], params["beta"],
+                                  params["initial_variance"])
+        self.index = returns.index
+        self.residuals = centered / np.sqrt(variances[:-1])
+        self.forecast_variance = float(variances[-1])
+
+    @property
+    def as_of(self):
+        return self.index[-1]
+
+    @property
+    def current_volatility(self) -> float:
+        return math.sqrt(self.forecast_variance)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.residuals.nbytes + self.index.nbytes)
+
+    def extend(self, new_returns: pd.Series) -> "VolatilityFit":
+        """
+        A copy extended with the returns after as_of, keeping the fitted
+        parameters (the variance recursion only runs over the new returns)
+        """
+        new_returns = new_returns[new_returns.index > self.as_of]
+        extended = copy.copy(self)
+        if new_returns.empty:
+            return extended
+        centered = new_returns.to_numpy(dtype=float) - self.mean
+        p = self.params
+        variances = variance_path(centered, p["omega"], p["alpha"], p["beta"], self.forecast_variance)
+        extended.residuals = np.concatenate((self.residuals, centered / np.sqrt(variances[:-1])))
+        extended.index = self.index.append(new_returns.index)
+        extended.forecast_variance = float(variances[-1])
+        return extended
+
+    def scaled_returns(self, observations: Optional[int] = None) -> np.ndarray:
+        """Standardized residuals rescaled to today's volatility (the FHS sample)"""
+        residuals = self.residuals if observations is None else self.residuals[-observations:]
+        return self.mean + self.current_volatility * residuals
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "as_of": str(self.as_of),
+            "current_volatility": self.current_volatility,
+            "annualized_volatility": self.current_volatility * math.sqrt(252),
+            **{k: float(v) for k, v in self.params.items()}
+        }
+
+
+def fit_ewma(returns: pd.Series, lam: float = EWMA_LAMBDA) -> VolatilityFit:
+    values = returns.to_numpy(dtype=float)
+    seed = values[:min(len(values), 30)]
+    params = {"omega": 0.0, "alpha": 1 - lam, "beta": lam,
+              "initial_variance": float(np.mean(np.square(seed)))}
+    return VolatilityFit("ewma", returns, params, date.today())
+
+
+def fit_garch(returns: pd.Series) -> VolatilityFit:
+    """GARCH(1,1) by Gaussian MLE with variance targeting"""
+    centered = returns.to_numpy(dtype=float) - returns.mean()
+    sample_variance = float(np.var(centered))
+
+    def negative_log_likelihood(x):
+        alpha, beta = x
+        persistence = alpha + beta
+        if persistence >= 0.9999:
+            return 1e10
+        variances = variance_path(centered, sample_variance * (1 - persistence), alpha, beta,
+                                  sample_variance)[:-1]
+        variances = np.maximum(variances, 1e-12)
+        return 0.5 * np.sum(np.log(variances) + np.square(centered) / variances)
+
+    best = minimize(negative_log_likelihood, x0=[0.08, 0.9], method="L-BFGS-B",
+                    bounds=[(1e-6, 0.5), (0.0, 0.9999)])
+    alpha, beta = best.x if best.success or best.fun < 1e10 else (0.08, 0.9)
+    params = {"omega": float(sample_variance * (1 - alpha - beta)), "alpha": float(alpha),
+              "beta": float(beta), "initial_variance": sample_variance}
+    return VolatilityFit("garch", returns, params, date.today())
+
+
+def fit(model: str, returns: pd.Series) -> VolatilityFit:
+    if model == "ewma":
+        return fit_ewma(returns)
+    if model == "garch":
+        return fit_garch(returns)
+    raise ValueError(f"Unknown volatility model: {model}")
+
+
+class VolatilityModelService:
+    """Cached volatility fits per ticker, extended incrementally as returns arrive"""
+
+    def __init__(self):
+        self._cache = TTLCache(settings.VOL_MODEL_CACHE_ENTRIES, settings.CACHE_MAX_BYTES)
+        self._lock = threading.Lock()
+        # Latest as-of date fitted per (ticker, model), the base for incremental updates
+        self._latest: Dict[tuple, pd.Timestamp] = {}
+        self.stats = {"hits": 0, "updates": 0, "fits": 0}
+
+    def get(self, ticker: str, returns: pd.Series, model: str = "garch") -> VolatilityFit:
+        """
+        Fit for ticker as of the last return. Reuses the cached fit when it
+        is already current, extends it when only newer returns are missing,
+        and refits once the parameters are VOL_MODEL_REFIT_DAYS old.
+        """
+        returns = returns.dropna()
+        series = (ticker.upper(), model)
+        as_of = returns.index[-1]
+        ttl = settings.VOL_MODEL_REFIT_DAYS * 24 * 3600
+        with self._lock:
+            cached = self._cache.get(series + (as_of,))
+            latest = self._latest.get(series)
+            base = self._cache.get(series + (latest,)) if latest is not None and latest < as_of else MISSING
+
+        # A fit on a shorter history than requested cannot serve this request
+        if cached is not MISSING and cached.index[0] <= returns.index[0]:
+            with self._lock:
+                self.stats["hits"] += 1
+            return cached
+        if (base is not MISSING and base.index[0] <= returns.index[0] and base.as_of in returns.index
+                and (date.today() - base.fitted_on).days < settings.VOL_MODEL_REFIT_DAYS):
+            result = base.extend(returns)
+            counter = "updates"
+        else:
+            result = fit(model, returns)
+            counter = "fits"
+
+        with self._lock:
+            self._cache.set(series + (as_of,), result, ttl)
+            if latest is None or as_of >= latest:
+                self._latest[series] = as_of
+            self.stats[counter] += 1
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._latest.clear()
+
+
+volatility_model_service = VolatilityModelService()
@@ -141,5 +141,6 @@ CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(transaction_dat
 CREATE INDEX IF NOT EXISTS idx_portfolios_user_id ON portfolios(user_id);
 CREATE INDEX IF NOT EXISTS idx_portfolio_holdings_portfolio_id ON portfolio_holdings(portfolio_id);
 CREATE INDEX IF NOT EXISTS idx_risk_reports_portfolio_id ON risk_reports(portfolio_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_risk_reports_portfolio_date_method ON risk_reports(portfolio_id, report_date, method);
 CREATE INDEX IF NOT EXISTS idx_scraped_data_ticker ON scraped_data(ticker_symbol);
 CREATE INDEX IF NOT EXISTS idx_predictions_user_id ON predictions(user_id);
@@ -0,0 +1,12 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def asset_moments():
+    """Daily mean returns and a positive definite covariance for 6 assets"""
+    rng = np.random.default_rng(7)
+    factors = rng.normal(0, 0.01, (6, 6))
+    cov = factors @ factors.T + np.diag(rng.uniform(1e-5, 4e-4, 6))
+    mean = rng.uniform(-0.0002, 0.001, 6)
+    return mean, cov
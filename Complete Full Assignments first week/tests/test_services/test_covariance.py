@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.covariance import CovarianceEstimator, MomentAccumulator
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(13)
+    loadings = rng.normal(0, 0.01, (8, 2))
+    values = rng.standard_normal((400, 2)) @ loadings.T + rng.normal(0, 0.008, (400, 8))
+    return pd.DataFrame(values, index=pd.bdate_range("2020-01-01", periods=400),
+                        columns=[f"T{i}" for i in range(8)])
+
+
+def ledoit_wolf_reference(x: np.ndarray) -> np.ndarray:
+    """Shrinkage towards a scaled identity, straight from the 2004 paper"""
+    t, n = x.shape
+    centered = x - x.mean(axis=0)
+    sample = centered.T @ centered / t
+    target = np.trace(sample) / n * np.eye(n)
+    d2 = np.sum((sample - target) ** 2)
+    b2 = min(sum(np.sum((np.outer(row, row) - sample) ** 2) for row in centered) / t ** 2, d2)
+    return b2 / d2 * target + (1 - b2 / d2) * sample
+
+
+def constant_correlation_reference(x: np.ndarray) -> np.ndarray:
+    """Shrinkage towards constant correlation ("Honey, I Shrunk the Sample Covariance Matrix")"""
+    t, n = x.shape
+    y = x - x.mean(axis=0)
+    sample = y.T @ y / t
+    sd = np.sqrt(np.diag(sample))
+    r_bar = ((sample / np.outer(sd, sd)).sum() - n) / (n * (n - 1))
+    target = r_bar * np.outer(sd, sd)
+    np.fill_diagonal(target, np.diag(sample))
+
+    pi = np.einsum("ti,tj->ij", y ** 2, y ** 2) / t - sample ** 2
+    theta = np.einsum("ti,tj->ij", y ** 3, y) / t - np.diag(sample)[:, None] * sample
+    rho = np.trace(pi)
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                rho += r_bar / 2 * (sd[j] / sd[i] * theta[i, j] + sd[i] / sd[j] * theta[j, i])
+    kappa = (pi.sum() - rho) / np.sum((target - sample) ** 2)
+    shrinkage = max(0.0, min(1.0, kappa / t))
+    return shrinkage * target + (1 - shrinkage) * sample
+
+
+def test_shrinkage_estimators_match_the_papers(returns):
+    values = returns.to_numpy()
+    moments = MomentAccumulator(values.shape[1])
+    moments.add(values)
+    assert moments.ledoit_wolf() == pytest.approx(ledoit_wolf_reference(values), rel=1e-9)
+    assert moments.constant_correlation() == pytest.approx(constant_correlation_reference(values), rel=1e-9)
+
+
+def test_removing_rows_matches_a_fresh_accumulator(returns):
+    values = returns.to_numpy()
+    rolled = MomentAccumulator(8)
+    rolled.add(values[:250])
+    rolled.remove(values[:30])
+    rolled.add(values[250:280])
+    fresh = MomentAccumulator(8)
+    fresh.add(values[30:280])
+    for rolled_moment, fresh_moment in zip(rolled.moments(), fresh.moments()):
+        assert rolled_moment == pytest.approx(fresh_moment, rel=1e-8, abs=1e-20)
+
+
+@pytest.mark.parametrize("method", ["ledoit_wolf", "constant_correlation", "ewma"])
+def test_rolling_update_matches_a_refit(returns, method):
+    estimator = CovarianceEstimator(method)
+    assert estimator.roll(returns.iloc[:250]) == "fitted"
+    assert estimator.roll(returns.iloc[:250]) == "current"
+    for end in range(251, 300, 7):
+        assert estimator.roll(returns.iloc[end - 250:end]) == "updated"
+    expected = CovarianceEstimator(method)
+    window = returns.iloc[end - 250:end] if method != "ewma" else returns.iloc[:end]
+    assert expected.roll(window) == "fitted"
+    assert estimator.covariance() == pytest.approx(expected.covariance(), rel=1e-8)
+
+
+def test_ewma_matches_the_recursion(returns):
+    values = returns.to_numpy()[:120]
+    estimator = CovarianceEstimator("ewma", lam=0.9)
+    estimator.roll(returns.iloc[:120])
+    cov = values[:30].T @ values[:30] / 30
+    for row in values[30:]:
+        cov = 0.9 * cov + 0.1 * np.outer(row, row)
+    assert estimator.covariance() == pytest.approx(cov, rel=1e-10)
+
+
+def test_revised_history_is_refitted(returns):
+    estimator = CovarianceEstimator("ledoit_wolf")
+    estimator.roll(returns.iloc[:250])
+    revised = returns.iloc[10:260].copy()
+    revised.iloc[100, 3] += 0.01
+    assert estimator.roll(revised) == "fitted"
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        CovarianceEstimator("sample")
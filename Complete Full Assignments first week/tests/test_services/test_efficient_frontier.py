@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+
+from backend.services.efficient_frontier import exact_frontier
+
+
+@pytest.fixture
+def universe():
+    rng = np.random.default_rng(29)
+    n = 12
+    loadings = rng.normal(0, 0.01, (n, 3))
+    cov = loadings @ loadings.T + np.diag(rng.uniform(5e-5, 3e-4, n))
+    mean = rng.normal(0.0005, 0.0005, n)
+    return mean, cov
+
+
+def min_variance_at(mean, cov, target):
+    n = len(mean)
+    result = minimize(lambda w: (1e4 * w @ cov @ w, 2e4 * cov @ w), np.full(n, 1.0 / n), jac=True,
+                      method="SLSQP", bounds=[(0, 1)] * n,
+                      constraints=[{"type": "eq", "fun": lambda w: w.sum() - 1},
+                                   {"type": "eq", "fun": lambda w: 1e3 * (mean @ w - target)}],
+                      options={"ftol": 1e-12, "maxiter": 1000})
+    assert result.success
+    return np.sqrt(result.x @ cov @ result.x)
+
+
+def test_frontier_matches_slsqp(universe):
+    mean, cov = universe
+    frontier = exact_frontier(mean, cov, num_points=25)
+    weights = frontier["weights"]
+    assert weights.shape == (25, 12)
+    assert weights.sum(axis=1) == pytest.approx(np.ones(25))
+    assert (weights >= -1e-12).all()
+    assert frontier["returns"] == pytest.approx(np.sort(frontier["returns"]))
+    assert frontier["returns"][-1] == pytest.approx(mean.max())
+    for i in range(0, 25, 4):
+        expected = min_variance_at(mean, cov, frontier["returns"][i])
+        assert frontier["volatility"][i] <= expected * (1 + 1e-9)
+        assert frontier["volatility"][i] == pytest.approx(expected, rel=1e-6)
+
+
+def test_frontier_starts_at_the_min_variance_portfolio(universe):
+    mean, cov = universe
+    frontier = exact_frontier(mean, cov, num_points=10)
+    n = len(mean)
+    result = minimize(lambda w: (1e4 * w @ cov @ w, 2e4 * cov @ w), np.full(n, 1.0 / n), jac=True,
+                      method="SLSQP", bounds=[(0, 1)] * n,
+                      constraints=[{"type": "eq", "fun": lambda w: w.sum() - 1}],
+                      options={"ftol": 1e-15, "maxiter": 1000})
+    assert frontier["volatility"][0] == pytest.approx(np.sqrt(result.fun / 1e4), rel=1e-6)
+
+
+def test_tied_top_returns_start_at_their_min_variance_mix(universe):
+    mean, cov = universe
+    mean = mean.copy()
+    top = np.argsort(mean)[-2:]
+    mean[top] = mean.max()
+    frontier = exact_frontier(mean, cov, num_points=5)
+    top_weights = frontier["weights"][-1]
+    assert top_weights[top].sum() == pytest.approx(1.0)
+    sub = cov[np.ix_(top, top)]
+    mix = np.linalg.solve(sub, np.ones(2))
+    mix /= mix.sum()
+    assert (mix > 0).all()
+    assert top_weights[top] == pytest.approx(mix, abs=1e-9)
+
+
+def test_singular_covariance_is_rejected(universe):
+    mean, _ = universe
+    rng = np.random.default_rng(3)
+    short_history = rng.normal(0, 0.01, (5, len(mean)))
+    with pytest.raises(ValueError):
+        exact_frontier(mean, np.cov(short_history, rowvar=False))
@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from backend.services import monte_carlo_engine
+from backend.services.monte_carlo_engine import MonteCarloEngine
+
+
+def test_seeded_run_is_reproducible(asset_moments):
+    mean, cov = asset_moments
+    weights = np.full(6, 1 / 6)
+    first = MonteCarloEngine(mean, cov, chunk_size=5_000).run(weights, num_simulations=20_000, seed=42)
+    second = MonteCarloEngine(mean, cov, chunk_size=7_000).run(weights, num_simulations=20_000, seed=42)
+    assert first["var"] == second["var"]
+    assert first["expected_shortfall"] == second["expected_shortfall"]
+    # Paths do not depend on the chunk size; only the summation order differs
+    assert first["es_contributions"] == pytest.approx(second["es_contributions"], rel=1e-12)
+    assert first["seed"] == 42
+
+
+def test_contributions_sum_to_var_and_es(asset_moments):
+    mean, cov = asset_moments
+    weights = [0.3, 0.2, 0.1, 0.15, 0.15, 0.1]
+    result = MonteCarloEngine(mean, cov).run(weights, num_simulations=50_000, seed=1)
+    assert sum(result["es_contributions"]) == pytest.approx(result["expected_shortfall"], rel=1e-9)
+    assert sum(result["var_contributions"]) == pytest.approx(result["var"], rel=1e-9)
+    assert result["expected_shortfall"] < result["var"] < 0
+
+
+def test_var_matches_normal_quantile(asset_moments):
+    mean, cov = asset_moments
+    weights = np.full(6, 1 / 6)
+    result = MonteCarloEngine(mean, cov).run(weights, confidence_level=0.99,
+                                             num_simulations=400_000, horizon=5, seed=3)
+    mu = float(weights @ mean) * 5
+    sigma = math.sqrt(float(weights @ cov @ weights) * 5)
+    expected = mu + stats.norm.ppf(0.01) * sigma
+    assert result["var"] == pytest.approx(expected, abs=4 * result["standard_error"])
+
+
+def test_singular_covariance_falls_back_to_eigen():
+    cov = np.array([[1e-4, 1e-4], [1e-4, 1e-4]])
+    engine = MonteCarloEngine([0.0, 0.0], cov, seed=0)
+    assert engine.factorization == "eigen"
+    assert np.allclose(engine.factor @ engine.factor.T, cov)
+
+
+def test_rejects_mismatched_weights(asset_moments):
+    mean, cov = asset_moments
+    with pytest.raises(ValueError):
+        MonteCarloEngine(mean, cov).run([0.5, 0.5], num_simulations=1_000)
+
+
+@pytest.fixture
+def two_workers(monkeypatch):
+    monkeypatch.setattr(monte_carlo_engine.settings, "MONTE_CARLO_WORKERS", 2)
+    monkeypatch.setattr(monte_carlo_engine, "_pool", None)
+    yield
+    if monte_carlo_engine._pool is not None:
+        monte_carlo_engine._pool.shutdown(cancel_futures=True)
+
+
+def test_parallel_run_caps_workers_and_repeats_with_seed(asset_moments, two_workers):
+    mean, cov = asset_moments
+    weights = np.full(6, 1 / 6)
+    engine = MonteCarloEngine(mean, cov)
+    first = engine.run(weights, num_simulations=30_000, workers=8, seed=9)
+    second = engine.run(weights, num_simulations=30_000, workers=2, seed=9)
+    assert first["workers"] == second["workers"] == 2
+    assert first["var"] == second["var"]
+    assert first["es_contributions"] == second["es_contributions"]
+    assert sum(first["es_contributions"]) == pytest.approx(first["expected_shortfall"], rel=1e-9)
+
+
+def test_broken_pool_is_replaced(two_workers):
+    pool = monte_carlo_engine.get_pool()
+    assert monte_carlo_engine.get_pool() is pool
+    pool._broken = "A child process terminated abruptly"
+    replacement = monte_carlo_engine.get_pool()
+    assert replacement is not pool
+    assert replacement.submit(abs, -3).result() == 3
+
+
+@pytest.mark.parametrize("sampling", ["pseudo", "antithetic", "sobol", "halton"])
+def test_adaptive_run_has_min_batches_and_brackets_the_normal_var(asset_moments, sampling):
+    mean, cov = asset_moments
+    weights = np.full(6, 1 / 6)
+    result = MonteCarloEngine(mean, cov).run_adaptive(weights, max_simulations=80_000, sampling=sampling,
+                                                      control_variate=True, seed=4, sample=500)
+    assert result["batches"] >= 8
+    assert result["batches"] * result["batch_size"] == result["simulations"]
+    assert len(result["sample"]) == 500
+    expected = float(weights @ mean) + stats.norm.ppf(0.05) * math.sqrt(float(weights @ cov @ weights))
+    assert result["var"] == pytest.approx(expected, abs=4 * result["standard_error"] + 1e-12)
+    if sampling == "sobol":
+        assert result["batch_size"] & (result["batch_size"] - 1) == 0
+
+
+def test_adaptive_run_stops_at_tolerance(asset_moments):
+    mean, cov = asset_moments
+    result = MonteCarloEngine(mean, cov).run_adaptive(np.full(6, 1 / 6), max_simulations=1_000_000,
+                                                      batch_size=4_096, tolerance=1e-3, seed=2)
+    assert result["converged"]
+    assert result["standard_error"] <= 1e-3
+    assert result["simulations"] < 1_000_000
+
+
+def test_adaptive_run_rejects_too_few_simulations(asset_moments):
+    mean, cov = asset_moments
+    with pytest.raises(ValueError):
+        MonteCarloEngine(mean, cov).run_adaptive(np.full(6, 1 / 6), confidence_level=0.99,
+                                                 max_simulations=500)
+
+
+def test_sample_is_the_start_of_the_simulated_returns(asset_moments):
+    mean, cov = asset_moments
+    weights = np.full(6, 1 / 6)
+    engine = MonteCarloEngine(mean, cov)
+    short = engine.run(weights, num_simulations=2_000, seed=8, sample=2_000)
+    longer = engine.run(weights, num_simulations=20_000, seed=8, sample=1_000)
+    assert len(short["sample"]) == 2_000
+    assert longer["sample"] == short["sample"][:1_000]
+    assert short["var"] == pytest.approx(np.percentile(short["sample"], 5), abs=1e-15)
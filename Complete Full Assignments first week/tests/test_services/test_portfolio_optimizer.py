@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+
+from backend.services.portfolio_optimizer import (
+    max_sharpe, mean_variance, min_variance, project_box_budget, project_budget
+)
+
+
+@pytest.fixture
+def universe():
+    rng = np.random.default_rng(17)
+    n = 40
+    loadings = rng.normal(0, 0.01, (n, 4))
+    cov = loadings @ loadings.T + np.diag(rng.uniform(5e-5, 3e-4, n))
+    mean = rng.normal(0.0004, 0.0006, n)
+    return mean, cov
+
+
+def slsqp(objective, n, bounds=None, constraints=None):
+    """Reference solve; objective returns (value, gradient) in well-scaled units"""
+    result = minimize(objective, np.full(n, 1.0 / n), jac=True, method="SLSQP",
+                      bounds=bounds or [(0, 1)] * n,
+                      constraints=constraints or [{"type": "eq", "fun": lambda w: w.sum() - 1}],
+                      options={"ftol": 1e-15, "maxiter": 1000})
+    assert result.success
+    return result.x
+
+
+def test_projections_land_on_the_constraint_set():
+    v = np.array([0.7, -0.2, 0.4, 0.3])
+    projected = project_budget(v)
+    assert projected.sum() == pytest.approx(1.0)
+    assert (projected >= 0).all()
+    boxed = project_box_budget(v, np.full(4, 0.1), np.full(4, 0.4))
+    assert boxed.sum() == pytest.approx(1.0)
+    assert ((boxed >= 0.1 - 1e-12) & (boxed <= 0.4 + 1e-12)).all()
+
+
+def test_min_variance_matches_slsqp(universe):
+    _, cov = universe
+    result = min_variance(cov)
+    expected = slsqp(lambda w: (1e4 * w @ cov @ w, 2e4 * cov @ w), len(cov))
+    assert result["converged"]
+    assert result["weights"] @ cov @ result["weights"] <= expected @ cov @ expected * (1 + 1e-9)
+    assert result["weights"] == pytest.approx(expected, abs=1e-5)
+
+
+def test_max_sharpe_matches_slsqp(universe):
+    mean, cov = universe
+    result = max_sharpe(mean, cov, risk_free_rate=0.0001)
+
+    def sharpe(w):
+        return (mean @ w - 0.0001) / np.sqrt(w @ cov @ w)
+
+    def negative_sharpe(w):
+        volatility = np.sqrt(w @ cov @ w)
+        excess = mean @ w - 0.0001
+        return -sharpe(w), -(mean / volatility - excess * (cov @ w) / volatility ** 3)
+
+    expected = slsqp(negative_sharpe, len(cov))
+    assert result["converged"]
+    assert result["weights"].sum() == pytest.approx(1.0)
+    assert sharpe(result["weights"]) >= sharpe(expected) - 1e-9
+    assert result["weights"] == pytest.approx(expected, abs=1e-4)
+
+
+def test_max_sharpe_needs_a_return_above_the_risk_free_rate(universe):
+    mean, cov = universe
+    with pytest.raises(ValueError):
+        max_sharpe(mean, cov, risk_free_rate=mean.max() + 0.001)
+
+
+def test_mean_variance_with_bounds_matches_slsqp(universe):
+    mean, cov = universe
+    n = len(cov)
+    lower, upper = np.full(n, 0.005), np.full(n, 0.08)
+    result = mean_variance(mean, cov, 5.0, lower, upper)
+
+    def utility(w):
+        return mean @ w - 2.5 * w @ cov @ w
+
+    expected = slsqp(lambda w: (-1e3 * utility(w), -1e3 * (mean - 5.0 * cov @ w)), n,
+                     bounds=list(zip(lower, upper)))
+    weights = result["weights"]
+    assert result["converged"]
+    assert weights.sum() == pytest.approx(1.0)
+    assert ((weights >= lower - 1e-12) & (weights <= upper + 1e-12)).all()
+    assert utility(weights) >= utility(expected) - 1e-12
+    assert weights == pytest.approx(expected, abs=1e-5)
+
+
+def test_mean_variance_rejects_infeasible_bounds(universe):
+    mean, cov = universe
+    with pytest.raises(ValueError):
+        mean_variance(mean, cov, 5.0, upper=np.full(len(cov), 0.01))
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.streaming_var import StreamingVaR
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(11)
+    index = pd.bdate_range("2022-01-03", periods=400)
+    # Rounded so the windows contain ties
+    return pd.Series(np.round(rng.standard_t(4, 400) * 0.01, 4), index=index)
+
+
+def batch_var_es(window: np.ndarray, confidence_level: float):
+    var = np.percentile(window, (1 - confidence_level) * 100)
+    return var, window[window <= var].mean()
+
+
+@pytest.mark.parametrize("confidence_level", [0.95, 0.99])
+def test_rolling_series_matches_batch_percentile(returns, confidence_level):
+    window = 60
+    series = StreamingVaR.rolling_series(returns, window, confidence_level)
+    assert len(series) == len(returns) - window + 1
+    assert series.index[0] == returns.index[window - 1]
+    for end in range(window, len(returns) + 1, 17):
+        var, es = batch_var_es(returns.iloc[end - window:end].to_numpy(), confidence_level)
+        row = series.loc[returns.index[end - 1]]
+        assert row["var"] == pytest.approx(var, abs=1e-15)
+        assert row["expected_shortfall"] == pytest.approx(es, abs=1e-15)
+
+
+def test_rolling_series_skips_non_finite_returns_with_their_dates(returns):
+    dirty = returns.copy()
+    dirty.iloc[[5, 80, 81, 200]] = [np.nan, np.inf, -np.inf, np.nan]
+    series = StreamingVaR.rolling_series(dirty, 50)
+    expected = StreamingVaR.rolling_series(returns.drop(returns.index[[5, 80, 81, 200]]), 50)
+    pd.testing.assert_frame_equal(series, expected)
+
+
+def test_update_evicts_oldest_and_rejects_non_finite():
+    stream = StreamingVaR(window=3, confidence_level=0.5)
+    for value in [0.03, -0.01, 0.02, -0.02]:
+        assert stream.update(value)
+    assert not stream.update(float("nan"))
+    assert len(stream) == 3
+    assert stream.var() == np.percentile([-0.01, 0.02, -0.02], 50)
+
+
+def test_window_must_hold_two_returns():
+    with pytest.raises(ValueError):
+        StreamingVaR(window=1)
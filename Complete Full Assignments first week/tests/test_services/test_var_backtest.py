@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from backend.services.var_backtest import VaRBacktester, christoffersen, kupiec_pof
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(5)
+    index = pd.bdate_range("2021-01-04", periods=320)
+    return pd.DataFrame(rng.normal(0.0003, 0.012, (320, 3)), index=index, columns=["AAA", "BBB", "CCC"])
+
+
+def test_kupiec_is_zero_at_the_expected_rate():
+    lr, p_value = kupiec_pof(np.array([5]), np.array([500]), 0.99)
+    assert lr[0] == pytest.approx(0.0, abs=1e-10)
+    assert p_value[0] == pytest.approx(1.0)
+
+
+def test_kupiec_known_value():
+    lr, p_value = kupiec_pof(np.array([10, 0]), np.array([100, 250]), 0.95)
+    expected = -2 * ((90 * math.log(0.95) + 10 * math.log(0.05))
+                     - (90 * math.log(0.9) + 10 * math.log(0.1)))
+    assert lr[0] == pytest.approx(expected)
+    assert p_value[0] == pytest.approx(stats.chi2.sf(expected, 1))
+    # No exceptions at all: LR = -2 n log(1 - p)
+    assert lr[1] == pytest.approx(-2 * 250 * math.log(0.95))
+
+
+def test_christoffersen_known_value():
+    hits = np.array([0, 0, 1, 1, 0, 0, 0, 1, 0, 0, 1, 1, 1, 0, 0, 0], dtype=bool)[:, None]
+    valid = np.ones_like(hits)
+    lr, _ = christoffersen(hits, valid)
+    n00, n01, n10, n11 = 6, 3, 3, 3
+    pi01, pi11, pi = n01 / (n00 + n01), n11 / (n10 + n11), (n01 + n11) / 15
+    log_null = (n00 + n10) * math.log(1 - pi) + (n01 + n11) * math.log(pi)
+    log_alt = (n00 * math.log(1 - pi01) + n01 * math.log(pi01)
+               + n10 * math.log(1 - pi11) + n11 * math.log(pi11))
+    assert lr[0] == pytest.approx(-2 * (log_null - log_alt))
+
+
+def test_christoffersen_skips_transitions_touching_missing_days():
+    hits = np.array([1, 1, 0, 1, 0, 0], dtype=bool)[:, None]
+    valid = np.array([1, 0, 1, 1, 1, 1], dtype=bool)[:, None]
+    clustered = christoffersen(hits, valid)[0]
+    # Without day 1 the remaining transitions are 0->1, 1->0, 0->0
+    assert clustered[0] == pytest.approx(christoffersen(hits[2:], valid[2:])[0][0])
+
+
+def test_forecasts_match_windowed_calculations(returns):
+    window = 100
+    forecasts = VaRBacktester.forecasts(returns, window, 0.95, ["historical_simulation", "parametric"])
+    values = returns.to_numpy()
+    for day in [0, 57, len(values) - window - 1]:
+        past = values[day:day + window]
+        historical = forecasts["historical_simulation"].iloc[day]
+        parametric = forecasts["parametric"].iloc[day]
+        assert historical.to_numpy() == pytest.approx(np.percentile(past, 5, axis=0))
+        expected = past.mean(axis=0) + stats.norm.ppf(0.05) * past.std(axis=0, ddof=1)
+        assert parametric.to_numpy() == pytest.approx(expected, rel=1e-9)
+
+
+def test_forecasts_are_missing_where_the_window_has_gaps(returns):
+    gappy = returns.copy()
+    gappy.iloc[150, 1] = np.nan
+    forecast = VaRBacktester.forecasts(gappy, 100, 0.99, ["parametric"])["parametric"]
+    assert forecast["BBB"].iloc[50:151].isna().all()
+    assert forecast["BBB"].iloc[:50].notna().all() and forecast["BBB"].iloc[151:].notna().all()
+    assert forecast["AAA"].notna().all()
+
+
+def test_scorecard_counts_exceptions(returns):
+    card = VaRBacktester.run(returns, window=100, confidence_level=0.95, methods=["historical_simulation"])
+    forecast = VaRBacktester.forecasts(returns, 100, 0.95, ["historical_simulation"])["historical_simulation"]
+    expected = (returns.iloc[100:] < forecast).sum()
+    assert list(card["exceptions"]) == list(expected)
+    assert (card["observations"] == len(returns) - 100).all()
+
+
+def test_rejects_too_short_history(returns):
+    with pytest.raises(ValueError):
+        VaRBacktester.forecasts(returns.iloc[:100], window=100)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.var_calculator import VaRCalculator
+from backend.services.volatility_models import (
+    VolatilityModelService, fit_ewma, fit_garch, variance_path
+)
+
+
+def simulate_garch(n: int, omega: float, alpha: float, beta: float, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    variance = omega / (1 - alpha - beta)
+    values = np.empty(n)
+    for t in range(n):
+        values[t] = rng.standard_normal() * np.sqrt(variance)
+        variance = omega + alpha * values[t] ** 2 + beta * variance
+    return pd.Series(values, index=pd.bdate_range("2015-01-01", periods=n))
+
+
+@pytest.fixture
+def returns():
+    return simulate_garch(3_000, 2e-6, 0.08, 0.9, seed=21)
+
+
+def test_variance_path_matches_the_recursion():
+    rng = np.random.default_rng(0)
+    r = rng.normal(0, 0.01, 50)
+    path = variance_path(r, 1e-6, 0.1, 0.85, 2e-4)
+    expected = [2e-4]
+    for value in r:
+        expected.append(1e-6 + 0.1 * value ** 2 + 0.85 * expected[-1])
+    assert path == pytest.approx(expected, rel=1e-12)
+
+
+def test_extend_matches_a_fit_on_the_longer_history(returns):
+    base = fit_ewma(returns.iloc[:2_500])
+    extended = base.extend(returns)
+    refit = fit_ewma(returns)
+    assert extended.as_of == refit.as_of
+    assert extended.forecast_variance == pytest.approx(refit.forecast_variance, rel=1e-12)
+    assert extended.residuals == pytest.approx(refit.residuals, rel=1e-10)
+
+
+def test_garch_fit_recovers_persistence(returns):
+    fitted = fit_garch(returns)
+    assert fitted.params["alpha"] + fitted.params["beta"] == pytest.approx(0.98, abs=0.02)
+    assert np.std(fitted.residuals) == pytest.approx(1.0, abs=0.05)
+
+
+def test_service_reuses_and_extends_fits(returns):
+    service = VolatilityModelService()
+    first = service.get("aaa", returns.iloc[:2_800], "ewma")
+    assert service.get("AAA", returns.iloc[:2_800], "ewma") is first
+    extended = service.get("AAA", returns, "ewma")
+    assert service.stats == {"hits": 1, "updates": 1, "fits": 1}
+    assert extended.forecast_variance == pytest.approx(fit_ewma(returns).forecast_variance, rel=1e-12)
+
+
+def test_filtered_var_uses_the_current_volatility(returns):
+    result = VaRCalculator.filtered_historical_simulation(returns, 0.99, model="ewma")
+    fitted = fit_ewma(returns)
+    assert result["var"] == pytest.approx(np.percentile(fitted.scaled_returns(), 1))
+    assert result["expected_shortfall"] < result["var"] < 0
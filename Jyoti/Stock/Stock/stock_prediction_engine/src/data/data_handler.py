@@ -7,10 +7,13 @@ class DataHandler:
     """
     Handles downloading and preparing historical stock data.
     """
-    def __init__(self, ticker: str, period: str = "5y", interval: str = "1d"):
+    def __init__(self, ticker: str, period: str = "5y", interval: str = "1d", provider=None):
         self.ticker = ticker
         self.period = period
         self.interval = interval
+        # Optional market data provider exposing history(ticker, period=..., interval=...),
+        # e.g. an offline replay source for reproducible runs; defaults to yfinance
+        self.provider = provider
         self.data = None
 
     def download_data(self) -> pd.DataFrame:
@@ -19,8 +22,11 @@ class DataHandler:
         """
         print(f"Downloading data for {self.ticker}...")
         try:
-            ticker_obj = yf.Ticker(self.ticker)
-            self.data = ticker_obj.history(period=self.period, interval=self.interval)
+            if self.provider is not None:
+                self.data = self.provider.history(self.ticker, period=self.period, interval=self.interval)
+            else:
+                ticker_obj = yf.Ticker(self.ticker)
+                self.data = ticker_obj.history(period=self.period, interval=self.interval)
             
             if self.data.empty:
                 raise ValueError(f"No data found for ticker {self.ticker}")